@@ -1,11 +1,59 @@
 import os
+import functools
+from pathlib import Path
+import asyncio
+import json
 import logging
 import yt_dlp
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, Message, Chat
 from telegram.ext import Application, CommandHandler, MessageHandler, filters, CallbackContext, CallbackQueryHandler
-import groq
 import re
-from langdetect import detect, LangDetectException
+import time
+import itertools
+import signal
+import socket
+import uuid
+from datetime import datetime, timezone
+from yt_dlp.utils import DownloadCancelled
+from workers import run_metadata_job, run_download_job, run_audio_job, shutdown_workers
+from video_cache import MetadataCache, reusable_info
+from subtitles import Segment, pick_subtitle_track, fetch_subtitle_segments, close_http_client
+from chunking import estimate_tokens, split_transcript
+from result_cache import ResultCache
+from llm import LLMClient, create_backend
+from message_stream import StreamingMessage
+from media_store import FileIdStore, StoredMedia
+from scheduler import JobScheduler, QueueFullError
+from sessions import SessionStore, TranscriptStore
+from webhook import WebhookServer, worker_for_user
+from language import detect_language
+from workspace import DownloadWorkspace
+from media_fit import choose_video_format, choose_mp3_quality, fit_media_to_limit, probe_duration
+from progress import ProgressBoard
+from metrics import MetricsServer, StageTimer, TRANSCRIPT_TOKENS, register_collector, track_stage
+from normalize import normalize_transcript
+from retrieval import TranscriptIndex, format_excerpts
+from job_journal import DownloadJournal, work_dir_name
+from speech import SpeechClient, create_speech_backend, speech_language, plan_chunks, cut_audio_chunk, stitch_segments
+from config import (
+    METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_CACHE_DB,
+    CHUNK_TOKEN_BUDGET, CHUNK_NOTES_MAX_TOKENS,
+    RESULT_CACHE_DB, RESULT_CACHE_MAX_BYTES,
+    LLM_BACKEND, LLM_BASE_URL, LLM_CONCURRENCY, LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE, LLM_MAX_RETRIES,
+    FILE_ID_DB,
+    JOB_QUEUE_LIMIT, JOB_PER_USER_LIMIT, TEXT_JOB_CONCURRENCY, DOWNLOAD_JOB_CONCURRENCY,
+    SESSION_DB, TRANSCRIPT_STORE_MAX_BYTES,
+    WEBHOOK_URL, WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_PATH, WEBHOOK_SECRET, WEBHOOK_WORKERS,
+    DOWNLOAD_DIR, DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_SCRATCH_DIR,
+    UPLOAD_LIMIT_BYTES, MEDIA_FIT_MODE, UPLOAD_CONCURRENCY, TELEGRAM_API_SERVER,
+    METRICS_PORT, METRICS_LISTEN, PROFILER_ENABLED, TRANSCRIPT_NORMALIZE,
+    SPECULATIVE_PREFETCH, PREFETCH_CHOICE, PREFETCH_JOB_CONCURRENCY, PREFETCH_MAX_WAIT,
+    RETRIEVAL_TOP_K, RETRIEVAL_CHUNK_TOKENS,
+    BATCH_MAX_VIDEOS, BATCH_CONCURRENCY,
+    SPEECH_BACKEND, SPEECH_MODEL, SPEECH_CONCURRENCY, SPEECH_CHUNK_SECONDS, SPEECH_CHUNK_OVERLAP, SPEECH_MAX_DURATION,
+    JOB_JOURNAL_DB, JOURNAL_HEARTBEAT_SECONDS, JOURNAL_STALE_SECONDS, DRAIN_TIMEOUT,
+    QUEUE_EDITS_PER_SECOND, QUEUE_EDIT_INTERVAL,
+)
 
 # Set up logging
 logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
@@ -15,8 +63,105 @@ logger = logging.getLogger(__name__)
 TELEGRAM_TOKEN = ""
 GROQ_API_KEY = ""
 
-# Initialize Groq client
-groq_client = groq.Client(api_key=GROQ_API_KEY)
+GROQ_MODEL = "llama3-70b-8192"
+
+# Initialize the async LLM client (Groq by default, rate limited and retried)
+llm_client = LLMClient(
+    create_backend(LLM_BACKEND, api_key=GROQ_API_KEY, model=GROQ_MODEL, base_url=LLM_BASE_URL),
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    concurrency=LLM_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES
+)
+
+# Speech-to-text for videos without captions (None when the fallback is disabled)
+speech_client = SpeechClient(
+    create_speech_backend(SPEECH_BACKEND, api_key=GROQ_API_KEY, model=SPEECH_MODEL, base_url=LLM_BASE_URL),
+    concurrency=SPEECH_CONCURRENCY,
+    max_retries=LLM_MAX_RETRIES
+) if SPEECH_BACKEND else None
+
+# Bump whenever the prompts change so cached results from older prompts are not served
+PROMPT_VERSION = 1
+
+# Long transcripts are condensed at most this many times before the final prompt
+MAX_CONDENSE_PASSES = 3
+
+# Cache of yt-dlp info dicts shared by transcript lookups and downloads
+metadata_cache = MetadataCache(METADATA_CACHE_SIZE, METADATA_CACHE_TTL, METADATA_CACHE_DB or None)
+
+# Finished LLM results, shared by every user who asks for the same thing
+result_cache = ResultCache(RESULT_CACHE_DB, RESULT_CACHE_MAX_BYTES)
+
+# Telegram file_ids of uploaded downloads, so they are never uploaded twice
+file_id_store = FileIdStore(FILE_ID_DB)
+
+# All transcript, LLM and download work is admitted through this queue.
+# Text jobs are cheap and run ahead of downloads; speculative prefetches run last.
+job_scheduler = JobScheduler(
+    {'text': TEXT_JOB_CONCURRENCY, 'download': DOWNLOAD_JOB_CONCURRENCY, 'prefetch': PREFETCH_JOB_CONCURRENCY},
+    {'text': 0, 'download': 1, 'prefetch': 2},
+    max_queued=JOB_QUEUE_LIMIT,
+    per_user_limit=JOB_PER_USER_LIMIT
+)
+
+# Download directory shared by all chats, with a total size budget
+download_workspace = DownloadWorkspace(DOWNLOAD_DIR, DOWNLOAD_CACHE_MAX_BYTES, DOWNLOAD_SCRATCH_DIR)
+
+# Small per-user sessions, and transcripts stored once per video for everyone
+session_store = SessionStore(SESSION_DB)
+transcript_store = TranscriptStore(SESSION_DB, TRANSCRIPT_STORE_MAX_BYTES)
+
+# Live download progress in the status messages, throttled across all chats
+progress_board = ProgressBoard()
+
+# Queue positions get their own, slower board - they only need to look alive
+queue_board = ProgressBoard(QUEUE_EDITS_PER_SECOND, QUEUE_EDIT_INTERVAL)
+
+# Downloads stay journaled until the user gets a reply, so they survive restarts.
+# This process's entries are tagged with its own owner name.
+download_journal = DownloadJournal(JOB_JOURNAL_DB)
+journal_owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex}"
+journal_task = None
+
+# Set on SIGTERM - new downloads stop right away and stay journaled for the next process
+draining = False
+
+# Queue depths and cache counters, read whenever the metrics endpoint is scraped
+def collect_app_metrics():
+    scheduler_stats = job_scheduler.stats()
+    caches = {'metadata': metadata_cache.stats(), 'result': result_cache.stats()}
+    return {
+        'ytbot_jobs_queued': (
+            "Jobs waiting in the scheduler",
+            {(('job_class', job_class),): count for job_class, count in scheduler_stats['queued_by_class'].items()},
+            'gauge'
+        ),
+        'ytbot_jobs_running': (
+            "Jobs running in the scheduler",
+            {(('job_class', job_class),): count for job_class, count in scheduler_stats['running'].items()},
+            'gauge'
+        ),
+        'ytbot_downloads_active': ("Downloads currently reporting progress", {(): progress_board.stats()['active']}, 'gauge'),
+        'ytbot_cache_hits': (
+            "Cache hits since startup", {(('cache', name),): stats['hits'] for name, stats in caches.items()}, 'counter'
+        ),
+        'ytbot_cache_misses': (
+            "Cache misses since startup", {(('cache', name),): stats['misses'] for name, stats in caches.items()}, 'counter'
+        ),
+        'ytbot_cache_evictions': (
+            "Cache entries evicted since startup", {(('cache', name),): stats['evictions'] for name, stats in caches.items()},
+            'counter'
+        ),
+        'ytbot_cache_entries': (
+            "Entries held by each cache", {(('cache', name),): stats['entries'] for name, stats in caches.items()}, 'gauge'
+        ),
+    }
+
+register_collector(collect_app_metrics)
+
+# Started once the application is up, when METRICS_PORT is set
+metrics_server = None
 
 # Limited language support - only English and Hindi
 LANGUAGE_CODES = {
@@ -25,11 +170,198 @@ LANGUAGE_CODES = {
     'hi-en': 'Hinglish'  # Custom code for Hinglish
 }
 
+YOUTUBE_REGEX = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+
+PLAYLIST_REGEX = r'(https?://)?(www\.|m\.)?youtube\.com/playlist\?(\S*&)?list=([\w-]+)'
+
+# Extract the 11-character video ID from a YouTube URL (None if it isn't one)
+def extract_video_id(url):
+    match = re.match(YOUTUBE_REGEX, url)
+    return match.group(6) if match else None
+
 # Function to validate YouTube URL
 def is_valid_youtube_url(url):
-    youtube_regex = r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-    match = re.match(youtube_regex, url)
-    return match is not None
+    return extract_video_id(url) is not None
+
+# Find everything a message asks for in batch mode: the video IDs of all links in it
+# (in order, without repeats) and the first playlist link, if any
+def find_batch_targets(text):
+    # One word at a time - the URL pattern could otherwise run from one link into the next
+    video_ids = [extract_video_id(word) for word in text.split()]
+    video_ids = list(dict.fromkeys(video_id for video_id in video_ids if video_id))
+    playlist = re.search(PLAYLIST_REGEX, text)
+    playlist_url = f"https://www.youtube.com/playlist?list={playlist.group(4)}" if playlist else None
+    return video_ids, playlist_url
+
+# Canonical watch URL for a video ID
+def youtube_url_for(video_id):
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+# Get the session of the user who sent this update
+def get_session(update: Update):
+    return session_store.get(update.effective_user.id)
+
+# Transcript lookups return error text instead of raising - only real transcripts are worth keeping
+def is_usable_transcript(transcript):
+    return bool(transcript) and not transcript.startswith("No transcript") and not transcript.startswith("Error")
+
+# Blocking yt-dlp helpers - these always run inside the worker pool
+def _extract_info(url):
+    with track_stage('extract_info'), yt_dlp.YoutubeDL({'skip_download': True, 'quiet': True}) as ydl:
+        return ydl.sanitize_info(ydl.extract_info(url, download=False), remove_private_keys=True)
+
+def _download_with_ytdlp(url, ydl_opts, info=None):
+    with yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        if info is not None:
+            # Reuse an earlier extraction instead of hitting YouTube again, without
+            # the formats it selected
+            info = ydl.process_ie_result(reusable_info(info), download=True)
+        else:
+            info = ydl.extract_info(url, download=True)
+        return info, ydl.prepare_filename(info)
+
+# Walk a playlist page by page, passing each entry's video ID to `emit` as soon as
+# it is known, so the first videos can start while the rest is still being listed
+def _list_playlist(url, limit, emit):
+    opts = {'quiet': True, 'skip_download': True, 'extract_flat': 'in_playlist', 'lazy_playlist': True}
+    with yt_dlp.YoutubeDL(opts) as ydl:
+        info = ydl.extract_info(url, download=False, process=False)
+        for entry in itertools.islice(info.get('entries') or [], limit):
+            if entry and entry.get('id'):
+                emit(entry['id'])
+
+# Concurrent lookups for the same video share a single extraction
+_pending_extractions = {}
+
+# Get the yt-dlp info dict for a video, using the metadata cache when possible
+async def get_video_info(url):
+    video_id = extract_video_id(url)
+    if video_id is None:
+        return await run_metadata_job(_extract_info, url)
+
+    info = metadata_cache.get(video_id)
+    if info is not None:
+        return info
+
+    pending = _pending_extractions.get(video_id)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    task = asyncio.ensure_future(run_metadata_job(_extract_info, url))
+    _pending_extractions[video_id] = task
+    try:
+        info = await asyncio.shield(task)
+        metadata_cache.put(video_id, info)
+        return info
+    finally:
+        _pending_extractions.pop(video_id, None)
+
+# Download a subtitle track and flatten it to text, one sentence (or caption segment) per line.
+# Returns the text and the start time of each line.
+async def fetch_transcript_text(tracks):
+    track = pick_subtitle_track(tracks)
+    if track is None:
+        return "No transcript available for this video in a supported subtitle format", []
+    
+    with track_stage('subtitle_fetch'):
+        segments = await fetch_subtitle_segments(track['url'], track['ext'])
+    if not segments:
+        return "No transcript available for this video - the subtitle track is empty", []
+    
+    return segments_to_transcript(segments)
+
+# Flatten timed segments to transcript text, normalized when enabled.
+# Returns the text and the start time of each line.
+def segments_to_transcript(segments):
+    if TRANSCRIPT_NORMALIZE:
+        # De-duplicate rolling captions and drop markup so the prompts carry only the content
+        segments, raw_tokens, normalized_tokens = normalize_transcript(segments)
+        if not segments:
+            return "No transcript available for this video - the subtitle track has no speech", []
+        TRANSCRIPT_TOKENS.inc(raw_tokens, version='raw')
+        TRANSCRIPT_TOKENS.inc(normalized_tokens, version='normalized')
+        logger.info(
+            f"Normalized transcript from {raw_tokens} to {normalized_tokens} tokens "
+            f"({100 - 100 * normalized_tokens // max(raw_tokens, 1)}% smaller)"
+        )
+    
+    return "\n".join(segment.text for segment in segments), [segment.start for segment in segments]
+
+# Download only the audio stream (blocking, runs in the worker pool)
+def _download_audio(url, folder, info):
+    ydl_opts = {'format': 'bestaudio/best', 'outtmpl': f'{folder}/%(id)s.%(ext)s', 'quiet': True}
+    ydl_opts.update(download_workspace.ytdl_options())
+    _, filename = _download_with_ytdlp(url, ydl_opts, info)
+    return filename
+
+# Concurrent requests for the same video and language share one transcription
+_pending_transcriptions = {}
+
+# Fallback for videos without captions: transcribe the audio in overlapping chunks.
+# Chunks are cut and transcribed concurrently, so the wall-clock time is bounded by
+# SPEECH_CONCURRENCY rather than by the length of the video.
+# Returns the text and the start time of each line, like fetch_transcript_text.
+async def transcribe_audio(url, info, language=None):
+    duration = info.get('duration')
+    if duration and duration > SPEECH_MAX_DURATION:
+        return "No transcript available for this video - it is too long to transcribe", []
+    
+    video_id = extract_video_id(url) or info.get('id')
+    language = speech_language(language)
+    
+    # Transcribed before - speech-to-text is far too slow to repeat
+    cached = result_cache.get(video_id, 'speech', language or 'auto', speech_client.model, PROMPT_VERSION)
+    if cached is not None:
+        segments = [Segment(*segment) for segment in json.loads(cached)]
+    else:
+        key = (video_id, language)
+        pending = _pending_transcriptions.get(key)
+        if pending is None:
+            # Downloading and transcribing the audio is heavy, so it waits for a download
+            # slot. It is queued under the video rather than the user: the user's text job
+            # is waiting on it and may hold their last slot.
+            pending = asyncio.ensure_future(job_scheduler.submit(
+                f"speech:{video_id}", 'download', lambda: _transcribe_audio(url, info, video_id, language)
+            ))
+            _pending_transcriptions[key] = pending
+            pending.add_done_callback(lambda _: _pending_transcriptions.pop(key, None))
+        segments = await asyncio.shield(pending)
+    
+    if not segments:
+        return "No transcript available for this video - no speech was recognized", []
+    return segments_to_transcript(segments)
+
+# Download the audio into a work directory of its own, transcribe it and store the segments
+async def _transcribe_audio(url, info, video_id, language):
+    folder = download_workspace.acquire(video_id, 'speech')
+    try:
+        with track_stage('speech_download'):
+            path = await run_download_job(_download_audio, url, folder, info)
+        duration = info.get('duration') or await run_audio_job(probe_duration, path)
+        chunks = plan_chunks(duration, SPEECH_CHUNK_SECONDS, SPEECH_CHUNK_OVERLAP)
+        logger.info(f"Transcribing {video_id} from audio in {len(chunks)} chunks")
+        
+        async def transcribe_chunk(index, start, length):
+            output = os.path.join(folder, f"chunk{index:04d}.mp3")
+            await run_audio_job(cut_audio_chunk, path, output, start, length)
+            with track_stage('speech_chunk'):
+                segments = await speech_client.transcribe(output, length, language)
+            return start, length, segments
+        
+        with track_stage('speech_to_text'):
+            results = await asyncio.gather(*(
+                transcribe_chunk(index, start, length) for index, (start, length) in enumerate(chunks)
+            ))
+    finally:
+        await asyncio.to_thread(download_workspace.release, folder)
+    
+    segments = stitch_segments(results)
+    if segments:
+        result_cache.put(
+            video_id, 'speech', language or 'auto', speech_client.model, PROMPT_VERSION,
+            json.dumps([list(segment) for segment in segments], ensure_ascii=False)
+        )
+    return segments
 
 # Function to extract video info using yt-dlp with language support
 async def get_video_transcript(url, language_code='en'):
@@ -37,62 +369,362 @@ async def get_video_transcript(url, language_code='en'):
         # For Hinglish, we'll use English transcripts
         transcript_lang = 'en' if language_code == 'hi-en' else language_code
         
-        ydl_opts = {
-            'writesubtitles': True,
-            'writeautomaticsub': True,
-            'subtitleslangs': [transcript_lang],
-            'skip_download': True,
-            'quiet': True
-        }
+        # The info dict lists every subtitle language, so the fallbacks below hit the cache
+        info = await get_video_info(url)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Try to get subtitles in the specified language
-            if 'subtitles' in info and transcript_lang in info['subtitles']:
-                subtitle_url = info['subtitles'][transcript_lang][0]['url']
-                # Here you would download and parse the subtitle file
-                return f"Transcript extraction successful in {LANGUAGE_CODES.get(language_code, language_code)}", info['title'], language_code
-            
-            # If regular subtitles not available, try auto-generated ones
-            elif 'automatic_captions' in info and transcript_lang in info['automatic_captions']:
-                subtitle_url = info['automatic_captions'][transcript_lang][0]['url']
-                # Here you would download and parse the subtitle file
-                return f"Transcript extraction successful in {LANGUAGE_CODES.get(language_code, language_code)}", info['title'], language_code
-            
-            # If specified language not available, try English as fallback
-            elif transcript_lang != 'en':
-                logger.info(f"No transcript in {transcript_lang} available, trying English")
-                return await get_video_transcript(url, 'en')
-            
+        # Try to get subtitles in the specified language
+        if 'subtitles' in info and transcript_lang in info['subtitles']:
+            transcript, line_starts = await fetch_transcript_text(info['subtitles'][transcript_lang])
+            return transcript, info['title'], language_code, line_starts
+        
+        # If regular subtitles not available, try auto-generated ones
+        elif 'automatic_captions' in info and transcript_lang in info['automatic_captions']:
+            transcript, line_starts = await fetch_transcript_text(info['automatic_captions'][transcript_lang])
+            return transcript, info['title'], language_code, line_starts
+        
+        # If specified language not available, try English as fallback
+        elif transcript_lang != 'en':
+            logger.info(f"No transcript in {transcript_lang} available, trying English")
+            return await get_video_transcript(url, 'en')
+        
+        else:
+            # Try to get any available language
+            available_langs = list(info.get('subtitles', {}).keys()) + list(info.get('automatic_captions', {}).keys())
+            if available_langs:
+                first_lang = available_langs[0]
+                logger.info(f"Using available language: {first_lang}")
+                return await get_video_transcript(url, first_lang)
+            elif speech_client is not None:
+                # No captions at all - fall back to speech-to-text, letting the model
+                # detect the language unless yt-dlp knows it
+                logger.info(f"No captions for {info.get('id')}, transcribing the audio")
+                transcript, line_starts = await transcribe_audio(url, info, info.get('language'))
+                return transcript, info['title'], language_code, line_starts
             else:
-                # Try to get any available language
-                available_langs = list(info.get('subtitles', {}).keys()) + list(info.get('automatic_captions', {}).keys())
-                if available_langs:
-                    first_lang = available_langs[0]
-                    logger.info(f"Using available language: {first_lang}")
-                    return await get_video_transcript(url, first_lang)
-                else:
-                    return "No transcript available for this video in any language", info['title'], None
-    
+                return "No transcript available for this video in any language", info['title'], None, []
+
     except Exception as e:
         logger.error(f"Error extracting video info: {e}")
-        return f"Error processing video: {str(e)}", "Unknown Video", None
+        return f"Error processing video: {str(e)}", "Unknown Video", None, []
+
+# Shows a user their place in the job queue on a status message, and puts the
+# original text back once their job starts. Positions only update the latest state -
+# queue_board edits the message when it is due, so a busy queue can't flood Telegram.
+class QueueStatus:
+    def __init__(self, message, text, language_code):
+        self.message = message
+        self.text = text
+        self.language_code = language_code
+        self.progress = None
+    
+    async def report(self, position):
+        if self.progress is None:
+            template = get_localized_text('queue_position', self.language_code)
+            self.progress = queue_board.track(self.message, lambda state: template.format(**state), 'queue')
+        self.progress.state = {'position': position}
+        self.progress.dirty = True
+    
+    async def run(self, job):
+        if self.progress is not None:
+            progress, self.progress = self.progress, None
+            await queue_board.finish(progress)
+            if progress.last_edit:
+                try:
+                    await self.message.edit_text(self.text)
+                except Exception as e:
+                    logger.debug(f"Could not restore status message: {e}")
+        return await job
+
+# A speculative LLM run started when a link arrives, before the user has clicked anything
+class Prefetch:
+    def __init__(self, video_id, language_code, choice):
+        self.key = (video_id, language_code, choice)
+        self.created = time.monotonic()
+        self.started = False
+        self.task = None
+
+# The running prefetch of each user - a user only ever has one
+_prefetches = {}
+
+# Precompute the most-clicked choice at low priority. The result lands in the result
+# cache, so the click is answered from there.
+def start_prefetch(user_id, video_id, transcript, title, language_code):
+    cancel_prefetch(user_id)
+    if job_scheduler.stats()['queued'] >= JOB_QUEUE_LIMIT // 2:
+        return  # busy - speculative work would only crowd out real requests
+    
+    prefetch = Prefetch(video_id, language_code, PREFETCH_CHOICE)
+    
+    async def run():
+        if time.monotonic() - prefetch.created > PREFETCH_MAX_WAIT:
+            return None  # queued too long - the user has probably moved on
+        prefetch.started = True
+        return await process_with_groq(transcript, title, PREFETCH_CHOICE, language_code, video_id)
+    
+    def finished(task):
+        if _prefetches.get(user_id) is prefetch:
+            del _prefetches[user_id]
+        if not task.cancelled() and task.exception() is not None:
+            logger.info(f"Prefetch for {video_id} failed: {task.exception()}")
+    
+    prefetch.task = asyncio.ensure_future(job_scheduler.submit(user_id, 'prefetch', run, cancellable=True))
+    prefetch.task.add_done_callback(finished)
+    _prefetches[user_id] = prefetch
+
+def cancel_prefetch(user_id):
+    prefetch = _prefetches.pop(user_id, None)
+    if prefetch is not None:
+        prefetch.task.cancel()
+
+# Called when the user picks a choice: a matching prefetch that is already running is
+# waited for (its result is then served from the cache), anything else is cancelled
+async def wait_for_prefetch(user_id, video_id, language_code, choice):
+    prefetch = _prefetches.get(user_id)
+    if prefetch is None:
+        return
+    if prefetch.key != (video_id, language_code, choice) or not prefetch.started:
+        cancel_prefetch(user_id)
+        return
+    await asyncio.wait([prefetch.task])
+
+# Height caps of the download choices, used when picking a format that fits the upload limit
+FORMAT_MAX_HEIGHTS = {
+    'video_audio_720p': 720,
+    'video_audio_360p': 360,
+}
+
+# Identical (video, format) downloads in progress, so concurrent requests share one
+_pending_downloads = {}
+
+# Turn the message returned by send_audio/send_video into something we can re-send by file_id
+def _stored_media_from_message(message, title):
+    if message.audio:
+        return StoredMedia(message.audio.file_id, 'audio', title)
+    if message.video:
+        return StoredMedia(message.video.file_id, 'video', title)
+    if message.document:
+        return StoredMedia(message.document.file_id, 'document', title)
+    return None
+
+# Send media Telegram already has, without downloading or uploading anything
+async def send_stored_media(bot, chat_id, media_parts):
+    for media in media_parts:
+        if media.media_type == 'audio':
+            await bot.send_audio(chat_id=chat_id, audio=media.file_id, title=media.title, caption=media.title)
+        elif media.media_type == 'video':
+            await bot.send_video(chat_id=chat_id, video=media.file_id, caption=media.title)
+        else:
+            await bot.send_document(chat_id=chat_id, document=media.file_id, caption=media.title)
+
+async def _send_media(bot, chat_id, media_type, media, caption):
+    if media_type == 'audio':
+        return await bot.send_audio(chat_id=chat_id, audio=media, title=caption, caption=caption)
+    return await bot.send_video(chat_id=chat_id, video=media, caption=caption)
+
+# Upload a downloaded file to the chat. Files over the upload limit are first split
+# or transcoded, and the parts are uploaded concurrently. Returns the uploaded media
+# parts, or [] if the file could not be made small enough.
+async def upload_media_file(context: CallbackContext, chat_id, filename, media_type, title, duration, status_message, user_lang, format_id=''):
+    paths = [filename]
+    if os.path.getsize(filename) > UPLOAD_LIMIT_BYTES:
+        await status_message.edit_text(get_localized_text('fitting_file', user_lang))
+        with track_stage('fit_to_limit', format_id):
+            paths = await run_download_job(
+                fit_media_to_limit, filename, UPLOAD_LIMIT_BYTES, duration, MEDIA_FIT_MODE, media_type == 'audio'
+            )
+        if not paths:
+            file_size = os.path.getsize(filename) / (1024 * 1024)
+            await status_message.edit_text(
+                get_localized_text('file_too_large', user_lang).format(
+                    size=round(file_size, 2), limit=UPLOAD_LIMIT_BYTES // (1024 * 1024)
+                )
+            )
+            return []
+    
+    await status_message.edit_text(get_localized_text('uploading_to_telegram', user_lang))
+    upload_slots = asyncio.Semaphore(UPLOAD_CONCURRENCY)
+    
+    async def upload_part(index, path):
+        caption = title if len(paths) == 1 else f"{title} ({index + 1}/{len(paths)})"
+        async with upload_slots:
+            with track_stage('upload', format_id):
+                if TELEGRAM_API_SERVER:
+                    # A local Bot API server reads the file straight from disk - nothing is streamed through us
+                    message = await _send_media(context.bot, chat_id, media_type, Path(path).resolve(), caption)
+                else:
+                    with open(path, 'rb') as media_file:
+                        message = await _send_media(context.bot, chat_id, media_type, media_file, caption)
+        return _stored_media_from_message(message, caption)
+    
+    media_parts = await asyncio.gather(*[upload_part(index, path) for index, path in enumerate(paths)])
+    await status_message.delete()
+    return [media for media in media_parts if media is not None]
 
 # Function to download YouTube video
-# Modify the download function to catch and handle the FFmpeg error
 async def download_youtube_video(update: Update, context: CallbackContext, url, format_id):
-    user_lang = context.user_data.get('language', 'en')
+    user_lang = get_session(update).language or 'en'
+    chat_id = update.effective_chat.id
+    video_id = extract_video_id(url)
+    
+    # Already uploaded once - re-send by file_id
+    stored = file_id_store.get(video_id, format_id) if video_id else []
+    if stored:
+        try:
+            await send_stored_media(context.bot, chat_id, stored)
+            return
+        except Exception as e:
+            logger.error(f"Stored file_id for {video_id}/{format_id} no longer works: {e}")
+            file_id_store.delete(video_id, format_id)
     
     status_message = await update.callback_query.message.reply_text(
         get_localized_text('downloading_video', user_lang)
     )
     
-    chat_id = update.effective_chat.id
-    download_folder = f"downloads/{chat_id}"
-    os.makedirs(download_folder, exist_ok=True)
+    job_id = download_journal.add(
+        journal_owner, chat_id, update.effective_user.id, url, video_id, format_id, status_message.message_id, user_lang
+    )
+    await run_journaled_download(context, chat_id, update.effective_user.id, url, format_id, status_message, user_lang, job_id)
+
+# Run (or join) a download and deliver it, then drop its journal entry - unless the
+# bot is shutting down and nothing was delivered, so the next process resumes it
+async def run_journaled_download(context: CallbackContext, chat_id, user_id, url, format_id, status_message, user_lang, job_id):
+    video_id = extract_video_id(url)
+    media = []
+    try:
+        # Someone else is already downloading this exact video and format - wait for their upload
+        key = (video_id, format_id)
+        pending = _pending_downloads.get(key) if video_id else None
+        if pending is not None:
+            media = await asyncio.shield(pending)
+            if media:
+                await send_stored_media(context.bot, chat_id, media)
+                await status_message.delete()
+            elif draining:
+                await status_message.edit_text(get_localized_text('download_interrupted', user_lang))
+            else:
+                await status_message.edit_text(get_localized_text('download_failed', user_lang))
+            return
+        
+        future = asyncio.get_running_loop().create_future()
+        if video_id:
+            _pending_downloads[key] = future
+        queue_status = QueueStatus(status_message, get_localized_text('downloading_video', user_lang), user_lang)
+        try:
+            media = await job_scheduler.submit(
+                user_id, 'download',
+                lambda: queue_status.run(
+                    _download_and_send(context, chat_id, url, format_id, status_message, user_lang, job_id)
+                ),
+                on_position=queue_status.report
+            )
+        except QueueFullError:
+            await status_message.edit_text(get_localized_text('queue_full', user_lang))
+        finally:
+            future.set_result(media)
+            if _pending_downloads.get(key) is future:
+                del _pending_downloads[key]
+    finally:
+        if job_id is not None and (media or not draining):
+            download_journal.remove(job_id)
+
+# Pick up a journaled download after a restart, reporting in its original status message
+async def resume_download(application: Application, job):
+    logger.info(f"Resuming download {job.video_id}/{job.format_id} for chat {job.chat_id} (attempt {job.attempts})")
+    context = CallbackContext(application, chat_id=job.chat_id, user_id=job.user_id)
+    status_message = Message(job.status_message_id, datetime.now(timezone.utc), Chat(job.chat_id, Chat.PRIVATE))
+    status_message.set_bot(application.bot)
+    
+    # Finished by another process in the meantime
+    stored = file_id_store.get(job.video_id, job.format_id)
+    if stored:
+        try:
+            await send_stored_media(application.bot, job.chat_id, stored)
+            await status_message.delete()
+            download_journal.remove(job.job_id)
+            return
+        except Exception as e:
+            logger.error(f"Stored file_id for {job.video_id}/{job.format_id} no longer works: {e}")
+            file_id_store.delete(job.video_id, job.format_id)
     
     try:
+        await status_message.edit_text(get_localized_text('download_resuming', job.user_lang))
+    except Exception as e:
+        logger.debug(f"Could not update status message of resumed download: {e}")
+    await run_journaled_download(
+        context, job.chat_id, job.user_id, job.url, job.format_id, status_message, job.user_lang, job.job_id
+    )
+
+# A journaled download that kept getting interrupted: tell the user in its status
+# message, then drop its partial files and journal entry
+async def give_up_download(application: Application, job):
+    logger.warning(f"Giving up download {job.video_id}/{job.format_id} for chat {job.chat_id} after {job.attempts} resumes")
+    try:
+        await application.bot.edit_message_text(
+            get_localized_text('download_gave_up', job.user_lang), chat_id=job.chat_id, message_id=job.status_message_id
+        )
+    except Exception as e:
+        logger.debug(f"Could not update status message of abandoned download: {e}")
+    folder = download_workspace.acquire(job.video_id, job.format_id, work_dir_name(job.job_id))
+    await asyncio.to_thread(download_workspace.release, folder)
+    download_journal.remove(job.job_id)
+
+# Status message text for the latest yt-dlp progress of a download
+def format_download_progress(state, user_lang):
+    if state['stage'] == 'processing':
+        return get_localized_text('processing_download', user_lang).format(step=state.get('postprocessor') or 'FFmpeg')
+    
+    mb = 1024 * 1024
+    total = state.get('total')
+    percent = f"{100 * state['downloaded'] / total:.0f}%" if total else "?"
+    size = f"{state['downloaded'] / mb:.1f}/{total / mb:.1f} MB" if total else f"{state['downloaded'] / mb:.1f} MB"
+    speed = f"{state['speed'] / mb:.1f} MB/s" if state.get('speed') else "?"
+    eta = f"{int(state['eta']) // 60}:{int(state['eta']) % 60:02d}" if state.get('eta') is not None else "?"
+    return get_localized_text('download_progress', user_lang).format(percent=percent, size=size, speed=speed, eta=eta)
+
+# yt-dlp postprocessor hook timing each FFmpeg step of a download as its own stage
+def _postprocess_timing_hook(format_id):
+    timers = {}
+    
+    def hook(d):
+        if d.get('status') == 'started':
+            timers[d.get('postprocessor')] = StageTimer('postprocess', format_id)
+        elif d.get('status') == 'finished' and d.get('postprocessor') in timers:
+            timers.pop(d.get('postprocessor')).stop()
+    
+    return hook
+
+# Run a yt-dlp download in the worker pool, showing its progress in the status message
+async def download_with_progress(url, ydl_opts, info, status_message, user_lang, video_id, format_id):
+    progress = progress_board.track(
+        status_message, lambda state: format_download_progress(state, user_lang), f"{video_id}/{format_id}"
+    )
+    ydl_opts = dict(ydl_opts, **progress.ytdl_options())
+    ydl_opts['postprocessor_hooks'] = ydl_opts['postprocessor_hooks'] + [_postprocess_timing_hook(format_id)]
+    try:
+        with track_stage('download', format_id):
+            return await run_download_job(_download_with_ytdlp, url, ydl_opts, info)
+    finally:
+        await progress_board.finish(progress)
+
+# Download with yt-dlp and upload to the chat, handling the FFmpeg error.
+# Returns the uploaded media parts so identical requests can re-send them by file_id.
+async def _download_and_send(context: CallbackContext, chat_id, url, format_id, status_message, user_lang, job_id=None):
+    media = []
+    filename = None
+    finished = None  # a file of the requested format, worth keeping for the next request
+    interrupted = False
+    video_id = extract_video_id(url)
+    
+    # Finished files are kept per video and format (not per chat) so the next identical request can
+    # reuse them. Journaled jobs download into a work directory named after the job, so they find
+    # their partial files again when resumed after a restart.
+    holder = work_dir_name(job_id) if job_id is not None else None
+    download_folder = download_workspace.acquire(video_id, format_id, holder)
+    
+    try:
+        if draining:
+            raise DownloadCancelled("The bot is shutting down")
+        
         if format_id == 'audio_only':
             ydl_opts = {
                 'format': 'bestaudio/best',
@@ -127,47 +759,58 @@ async def download_youtube_video(update: Update, context: CallbackContext, url,
         if format_id != 'audio_only':
             ydl_opts['ignoreerrors'] = True
             ydl_opts['nooverwrites'] = True
+        ydl_opts.update(download_workspace.ytdl_options())
+        
+        # Reuse the extraction done when the URL was first sent (extracting now if it has expired)
+        cached_info = await get_video_info(url)
+        duration = cached_info.get('duration')
+        
+        # If the usual format would be over the upload limit, pick one that fits before downloading
+        if format_id == 'audio_only':
+            ydl_opts['postprocessors'][0]['preferredquality'] = str(choose_mp3_quality(duration, UPLOAD_LIMIT_BYTES))
+        else:
+            smaller_format = choose_video_format(cached_info, FORMAT_MAX_HEIGHTS.get(format_id), UPLOAD_LIMIT_BYTES)
+            if smaller_format:
+                ydl_opts['format'] = f"{smaller_format}/{ydl_opts['format']}"
         
         try:
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                info = ydl.extract_info(url, download=True)
-                filename = ydl.prepare_filename(info)
+            # An identical earlier download is still on disk - send that instead
+            reused = await asyncio.to_thread(
+                download_workspace.link_finished, download_folder, '.mp3' if format_id == 'audio_only' else None
+            )
+            if reused:
+                info, filename = cached_info, reused
+            else:
+                info, filename = await download_with_progress(
+                    url, ydl_opts, cached_info, status_message, user_lang, video_id, format_id
+                )
                 
                 # Handle postprocessed files (like mp3)
                 if format_id == 'audio_only':
                     base_filename = os.path.splitext(filename)[0]
                     filename = f"{base_filename}.mp3"
-                
-                # Check if the file exists
-                if os.path.exists(filename):
-                    file_size = os.path.getsize(filename) / (1024 * 1024)  # Size in MB
-                    
-                    if file_size <= 50:
-                        await status_message.edit_text(get_localized_text('uploading_to_telegram', user_lang))
-                        
-                        if format_id == 'audio_only':
-                            await context.bot.send_audio(
-                                chat_id=chat_id,
-                                audio=open(filename, 'rb'),
-                                title=info.get('title', 'YouTube Audio'),
-                                caption=f"{info.get('title', 'Downloaded Audio')}"
-                            )
-                        else:
-                            await context.bot.send_video(
-                                chat_id=chat_id,
-                                video=open(filename, 'rb'),
-                                caption=f"{info.get('title', 'Downloaded Video')}"
-                            )
-                        
-                        await status_message.delete()
-                    else:
-                        await status_message.edit_text(
-                            get_localized_text('file_too_large', user_lang).format(size=round(file_size, 2))
-                        )
+            
+            # Check if the file exists
+            if os.path.exists(filename):
+                finished = filename
+                if format_id == 'audio_only':
+                    media = await upload_media_file(
+                        context, chat_id, filename, 'audio', info.get('title', 'Downloaded Audio'),
+                        duration, status_message, user_lang, format_id
+                    )
                 else:
-                    # Try a fallback format if the file doesn't exist (possible FFmpeg error)
-                    raise Exception("File not created - FFmpeg may be missing")
-                    
+                    media = await upload_media_file(
+                        context, chat_id, filename, 'video', info.get('title', 'Downloaded Video'),
+                        duration, status_message, user_lang, format_id
+                    )
+                
+                # Remember the file_ids so the next request for this video and format skips the upload
+                if media and video_id:
+                    file_id_store.put(video_id, format_id, media)
+            else:
+                # Try a fallback format if the file doesn't exist (possible FFmpeg error)
+                raise Exception("File not created - FFmpeg may be missing")
+                
         except Exception as inner_e:
             if "ffmpeg is not installed" in str(inner_e) or "File not created" in str(inner_e):
                 # Try again with a simpler format that doesn't require FFmpeg
@@ -183,79 +826,207 @@ async def download_youtube_video(update: Update, context: CallbackContext, url,
                     'format': 'best',  # This selects the best quality combined format
                     'outtmpl': f'{download_folder}/%(title)s.%(ext)s',
                 }
+                fallback_opts.update(download_workspace.ytdl_options())
                 
-                with yt_dlp.YoutubeDL(fallback_opts) as ydl:
-                    info = ydl.extract_info(url, download=True)
-                    filename = ydl.prepare_filename(info)
-                    
-                    if os.path.exists(filename):
-                        file_size = os.path.getsize(filename) / (1024 * 1024)
-                        
-                        if file_size <= 50:
-                            await status_message.edit_text(get_localized_text('uploading_to_telegram', user_lang))
-                            
-                            await context.bot.send_video(
-                                chat_id=chat_id,
-                                video=open(filename, 'rb'),
-                                caption=f"{info.get('title', 'Downloaded Video')} (Alternative Format)"
-                            )
-                            
-                            await status_message.delete()
-                        else:
-                            await status_message.edit_text(
-                                get_localized_text('file_too_large', user_lang).format(size=round(file_size, 2))
-                            )
-                    else:
-                        await status_message.edit_text(
-                            "Failed to download video. Please install FFmpeg for better video downloads."
-                        )
+                info, filename = await download_with_progress(
+                    url, fallback_opts, cached_info, status_message, user_lang, video_id, 'fallback'
+                )
+                
+                if os.path.exists(filename):
+                    # Shared with requests waiting on this download, but not stored
+                    # since it isn't the format that was asked for
+                    media = await upload_media_file(
+                        context, chat_id, filename, 'video', f"{info.get('title', 'Downloaded Video')} (Alternative Format)",
+                        duration, status_message, user_lang, 'fallback'
+                    )
+                else:
+                    await status_message.edit_text(
+                        "Failed to download video. Please install FFmpeg for better video downloads."
+                    )
             else:
                 # Other error occurred
                 raise inner_e
+    
+    except DownloadCancelled:
+        # Shutting down - the partial files stay for the next process to resume from
+        interrupted = True
+        await status_message.edit_text(get_localized_text('download_interrupted', user_lang))
                 
-        # Clean up downloaded file
-        try:
-            if os.path.exists(filename):
-                os.remove(filename)
-        except Exception as e:
-            logger.error(f"Error removing file {filename}: {e}")
-            
     except Exception as e:
         logger.error(f"Error downloading video: {e}")
         await status_message.edit_text(
             f"Error: {str(e)}. For video downloads, please install FFmpeg."
-        ) 
-
-# Map detected language to our supported languages
-def map_to_supported_language(detected_lang):
-    if detected_lang == 'hi':
-        return 'hi'
-    # Check for Hinglish - this is simplified and may need improvement
-    # Hinglish detection is challenging as it's a mixed language
-    elif detected_lang == 'en' and False:  # Add your Hinglish detection logic here
-        return 'hi-en'
-    else:
-        return 'en'  # Default to English for all other languages
+        )
+    
+    finally:
+        # Keep only the finished file of the requested format (thumbnails, fragments, failed
+        # attempts and fallback downloads go) and evict old downloads if the workspace is over
+        # budget - off the event loop, since that walks the whole download directory
+        await asyncio.to_thread(download_workspace.release, download_folder, keep=finished, keep_partial=interrupted)
+    
+    return media
 
-# Detect language of user message and map to supported languages
-def detect_language(text):
-    try:
-        detected = detect(text)
-        return map_to_supported_language(detected)
-    except LangDetectException:
-        return 'en'  # Default to English if detection fails
+# Map-step prompts used to condense each chunk of a long transcript
+CHUNK_PROMPTS = {
+    'hi': "YouTube वीडियो '{title}' के ट्रांसक्रिप्ट का भाग {part}/{total} नीचे है। इस भाग के सभी मुख्य विचारों, तथ्यों, उदाहरणों और निष्कर्षों को विस्तृत नोट्स के रूप में लिखें:\n\n{chunk}",
+    'hi-en': "YouTube video '{title}' ke transcript ka part {part}/{total} neeche hai. Is part ke saare main ideas, facts, examples aur conclusions ko detailed notes ke roop mein likhein:\n\n{chunk}",
+    'en': "Below is part {part} of {total} of the transcript of the YouTube video titled '{title}'. Write detailed notes capturing every main idea, fact, example and conclusion in this part:\n\n{chunk}",
+}
 
-# Process the transcript with Groq based on user's choice and language
-async def process_with_groq(transcript, title, choice, language_code='en'):
-    # Prepare system message based on language
+# Condense a transcript that is too long for one prompt: summarize the chunks
+# concurrently (map) until the combined notes fit, so the normal prompt can run on them (reduce)
+async def condense_transcript(transcript, title, system_message, language_code='en'):
+    template = CHUNK_PROMPTS.get(language_code, CHUNK_PROMPTS['en'])
+    
+    for _ in range(MAX_CONDENSE_PASSES):
+        if estimate_tokens(transcript) <= CHUNK_TOKEN_BUDGET:
+            break
+        chunks = split_transcript(transcript, CHUNK_TOKEN_BUDGET)
+        logger.info(f"Condensing transcript of '{title}' in {len(chunks)} chunks")
+        notes = await asyncio.gather(*[
+            llm_client.complete(
+                system_message,
+                template.format(title=title, part=index + 1, total=len(chunks), chunk=chunk),
+                CHUNK_NOTES_MAX_TOKENS
+            )
+            for index, chunk in enumerate(chunks)
+        ])
+        transcript = "\n\n".join(notes)
+    
+    return transcript
+
+# Concurrent condensations of the same video and language share one map phase
+_pending_condensations = {}
+
+# The condensed notes don't depend on what the user picked, so they are cached per
+# (video, language) and only the final prompt runs again for each choice
+async def get_condensed_transcript(transcript, title, system_message, language_code='en', video_id=None):
+    if not video_id:
+        return await condense_transcript(transcript, title, system_message, language_code)
+    
+    cached = result_cache.get(video_id, 'condensed', language_code, llm_client.model, PROMPT_VERSION)
+    if cached is not None:
+        return cached
+    
+    key = (video_id, language_code)
+    pending = _pending_condensations.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+    
+    # Stored by the task itself, so a cancelled caller (like a dropped prefetch) doesn't lose the notes
+    async def condense_and_store():
+        notes = await condense_transcript(transcript, title, system_message, language_code)
+        result_cache.put(video_id, 'condensed', language_code, llm_client.model, PROMPT_VERSION, notes)
+        return notes
+    
+    task = asyncio.ensure_future(condense_and_store())
+    _pending_condensations[key] = task
+    task.add_done_callback(lambda _: _pending_condensations.pop(key, None))
+    return await asyncio.shield(task)
+
+# System message based on language
+def get_system_message(language_code='en'):
+    if language_code == 'hi':
+        return "आप एक सहायक हैं जो YouTube वीडियो ट्रांसक्रिप्ट को प्रोसेस करता है। हिंदी में जवाब दें।"
+    elif language_code == 'hi-en':
+        return "You are an assistant that processes YouTube video transcripts. Respond in Hinglish - a mix of Hindi and English as commonly spoken in India."
+    else:
+        return "You are an assistant that processes YouTube video transcripts. Respond in English."
+
+# Error message in appropriate language
+def get_llm_error_text(error, language_code='en'):
     if language_code == 'hi':
-        system_message = "आप एक सहायक हैं जो YouTube वीडियो ट्रांसक्रिप्ट को प्रोसेस करता है। हिंदी में जवाब दें।"
+        return f"Groq API के साथ प्रोसेसिंग में त्रुटि: {str(error)}"
     elif language_code == 'hi-en':
-        system_message = "You are an assistant that processes YouTube video transcripts. Respond in Hinglish - a mix of Hindi and English as commonly spoken in India."
+        return f"Groq API ke saath processing mein error: {str(error)}"
     else:
-        system_message = "You are an assistant that processes YouTube video transcripts. Respond in English."
+        return f"Error processing with Groq API: {str(error)}"
+
+# Run the final prompt, streaming the answer to on_text if given
+async def run_prompt(system_message, prompt, on_text=None):
+    if on_text is None:
+        return await llm_client.complete(system_message, prompt, 1024)
+    parts = []
+    async for delta in llm_client.stream(system_message, prompt, 1024):
+        parts.append(delta)
+        await on_text(delta)
+    return "".join(parts)
+
+# Process the transcript with Groq based on user's choice and language
+# If on_text is given, the final answer is streamed and each new piece of text is passed to it
+async def process_with_groq(transcript, title, choice, language_code='en', video_id=None, on_text=None):
+    # Serve repeat requests for the same video straight from the result cache
+    if video_id:
+        cached = result_cache.get(video_id, choice, language_code, llm_client.model, PROMPT_VERSION)
+        if cached is not None:
+            return cached
+    
+    system_message = get_system_message(language_code)
+    
+    try:
+        # Transcripts longer than the model context are condensed chunk by chunk first
+        if estimate_tokens(transcript) > CHUNK_TOKEN_BUDGET:
+            with track_stage('llm_condense'):
+                transcript = await get_condensed_transcript(transcript, title, system_message, language_code, video_id)
+        
+        # Call Groq API with appropriate prompt
+        prompts = build_prompts(transcript, title, language_code)
+        with track_stage('llm'):
+            result = await run_prompt(system_message, prompts[choice], on_text)
+        
+        if video_id:
+            result_cache.put(video_id, choice, language_code, llm_client.model, PROMPT_VERSION, result)
+        return result
+        
+    except Exception as e:
+        logger.error(f"Error with Groq API: {e}")
+        return get_llm_error_text(e, language_code)
+
+# Prompts for free-text questions, answered from the most relevant transcript excerpts
+QUESTION_PROMPTS = {
+    'hi': "YouTube वीडियो '{title}' के ट्रांसक्रिप्ट के कुछ अंश नीचे दिए गए हैं, हर अंश के साथ उसका समय है। केवल इन अंशों के आधार पर प्रश्न का उत्तर दें और जिन समयों का उपयोग किया उन्हें [मि:से] के रूप में बताएं। अगर उत्तर अंशों में नहीं है, तो ऐसा कहें।\n\n{excerpts}\n\nप्रश्न: {question}",
+    'hi-en': "YouTube video '{title}' ke transcript ke kuch hisse neeche hain, har hisse ke saath uska time hai. Sirf in hisson ke basis par question ka answer dein aur jo times use kiye unhe [min:sec] mein batayein. Agar answer in hisson mein nahi hai, to yeh bata dein.\n\n{excerpts}\n\nQuestion: {question}",
+    'en': "Below are excerpts from the transcript of the YouTube video titled '{title}', each with its timestamp. Answer the question using only these excerpts and cite the timestamps you used as [min:sec]. If the excerpts don't contain the answer, say so.\n\n{excerpts}\n\nQuestion: {question}",
+}
+
+# The chunk index stored with a transcript, built now if the transcript predates indexes
+def get_transcript_index(video_id, language, transcript):
+    data = transcript_store.get_index(video_id, language)
+    if data:
+        return TranscriptIndex.from_json(data)
+    index = TranscriptIndex.build(transcript.split('\n'), max_tokens=RETRIEVAL_CHUNK_TOKENS)
+    transcript_store.put_index(video_id, language, index.to_json())
+    return index
+
+# Answer a free-text question about a video. Only the top-k chunks for the question
+# are sent, so follow-up questions stay cheap however long the video is.
+async def answer_question(index, title, question, language_code='en', video_id=None, on_text=None):
+    # Same question about the same video (ignoring case and spacing) is answered once
+    cache_key = "ask:" + " ".join(question.lower().split())
+    if video_id:
+        cached = result_cache.get(video_id, cache_key, language_code, llm_client.model, PROMPT_VERSION)
+        if cached is not None:
+            return cached
+    
+    excerpts = format_excerpts(index.search(question, RETRIEVAL_TOP_K))
+    prompt = QUESTION_PROMPTS.get(language_code, QUESTION_PROMPTS['en']).format(
+        title=title, excerpts=excerpts, question=question
+    )
     
-    # Prepare prompts based on language
+    try:
+        with track_stage('llm_question'):
+            result = await run_prompt(get_system_message(language_code), prompt, on_text)
+        
+        if video_id:
+            result_cache.put(video_id, cache_key, language_code, llm_client.model, PROMPT_VERSION, result)
+        return result
+    
+    except Exception as e:
+        logger.error(f"Error with Groq API: {e}")
+        return get_llm_error_text(e, language_code)
+
+# Prepare prompts based on language
+def build_prompts(transcript, title, language_code='en'):
     if language_code == 'hi':
         prompts = {
             "summary": f"निम्नलिखित YouTube वीडियो ट्रांसक्रिप्ट का एक संक्षिप्त सारांश प्रदान करें, शीर्षक '{title}':\n\n{transcript}",
@@ -281,30 +1052,7 @@ async def process_with_groq(transcript, title, choice, language_code='en'):
             "study_notes": f"Create study notes in an organized format based on this YouTube video transcript titled '{title}':\n\n{transcript}",
         }
     
-    try:
-        # Call Groq API with appropriate prompt
-        response = groq_client.chat.completions.create(
-            model="llama3-70b-8192",  # Choose the appropriate model
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompts[choice]}
-            ],
-            temperature=0.7,
-            max_tokens=1024
-        )
-        
-        # Extract the response text
-        return response.choices[0].message.content
-        
-    except Exception as e:
-        logger.error(f"Error with Groq API: {e}")
-        # Return error message in appropriate language
-        if language_code == 'hi':
-            return f"Groq API के साथ प्रोसेसिंग में त्रुटि: {str(e)}"
-        elif language_code == 'hi-en':
-            return f"Groq API ke saath processing mein error: {str(e)}"
-        else:
-            return f"Error processing with Groq API: {str(e)}"
+    return prompts
 
 # Helper function to get text in the appropriate language
 def get_localized_text(text_key, language_code='en'):
@@ -316,9 +1064,9 @@ def get_localized_text(text_key, language_code='en'):
             'hi-en': "Hello! Main ek YouTube Video Processing Bot hoon. Mujhe ek YouTube video link bhejein, aur main AI ka use karke uska analysis karne ya use download karne mein aapki help karunga. URL paste karein aur main aapko options ke through guide karunga."
         },
         'help_message': {
-            'en': "How to use this bot:\n\n1. Send a YouTube video URL\n2. Select what you want to do with the video\n3. Wait for the AI to process your request or for the video to download\n\nAvailable commands:\n/start - Start the bot\n/help - Show this help message\n/language - Change your preferred language",
-            'hi': "इस बॉट का उपयोग कैसे करें:\n\n1. एक YouTube वीडियो URL भेजें\n2. चुनें कि आप वीडियो के साथ क्या करना चाहते हैं\n3. AI द्वारा आपके अनुरोध को प्रोसेस करने या वीडियो डाउनलोड होने का इंतज़ार करें\n\nउपलब्ध कमांड:\n/start - बॉट शुरू करें\n/help - यह सहायता संदेश दिखाएं\n/language - अपनी पसंदीदा भाषा बदलें",
-            'hi-en': "Is bot ko kaise use karein:\n\n1. Ek YouTube video URL bhejein\n2. Select karein ki aap video ke saath kya karna chahte hain\n3. AI ke dwara aapke request ko process karne ya video download hone ka wait karein\n\nAvailable commands:\n/start - Bot start karein\n/help - Yeh help message dikhayein\n/language - Apni preferred language change karein"
+            'en': "How to use this bot:\n\n1. Send a YouTube video URL\n2. Select what you want to do with the video\n3. Wait for the AI to process your request or for the video to download\n4. Type any question about the video to get an answer with timestamps\n\nAvailable commands:\n/start - Start the bot\n/help - Show this help message\n/language - Change your preferred language",
+            'hi': "इस बॉट का उपयोग कैसे करें:\n\n1. एक YouTube वीडियो URL भेजें\n2. चुनें कि आप वीडियो के साथ क्या करना चाहते हैं\n3. AI द्वारा आपके अनुरोध को प्रोसेस करने या वीडियो डाउनलोड होने का इंतज़ार करें\n4. वीडियो के बारे में कोई भी प्रश्न लिखें और समय के साथ उत्तर पाएं\n\nउपलब्ध कमांड:\n/start - बॉट शुरू करें\n/help - यह सहायता संदेश दिखाएं\n/language - अपनी पसंदीदा भाषा बदलें",
+            'hi-en': "Is bot ko kaise use karein:\n\n1. Ek YouTube video URL bhejein\n2. Select karein ki aap video ke saath kya karna chahte hain\n3. AI ke dwara aapke request ko process karne ya video download hone ka wait karein\n4. Video ke baare mein koi bhi question type karein aur timestamps ke saath answer paayein\n\nAvailable commands:\n/start - Bot start karein\n/help - Yeh help message dikhayein\n/language - Apni preferred language change karein"
         },
         'invalid_url': {
             'en': "Please provide a valid YouTube URL.",
@@ -370,26 +1118,116 @@ def get_localized_text(text_key, language_code='en'):
             'hi': "आपका वीडियो डाउनलोड किया जा रहा है। वीडियो की लंबाई और गुणवत्ता के आधार पर इसमें कुछ समय लग सकता है...",
             'hi-en': "Aapka video download kiya ja raha hai. Video ki length aur quality ke hisaab se isme kuch time lag sakta hai..."
         },
+        'download_progress': {
+            'en': "Downloading... {percent} ({size}) at {speed}, about {eta} left",
+            'hi': "डाउनलोड हो रहा है... {percent} ({size}) {speed} की गति से, लगभग {eta} बाकी",
+            'hi-en': "Download ho raha hai... {percent} ({size}) {speed} par, lagbhag {eta} baaki"
+        },
+        'processing_download': {
+            'en': "Download complete! Processing the file ({step})...",
+            'hi': "डाउनलोड पूरा हुआ! फ़ाइल प्रोसेस हो रही है ({step})...",
+            'hi-en': "Download complete! File process ho rahi hai ({step})..."
+        },
         'uploading_to_telegram': {
             'en': "Download complete! Uploading to Telegram...",
             'hi': "डाउनलोड पूरा हुआ! टेलीग्राम पर अपलोड हो रहा है...",
             'hi-en': "Download complete! Telegram par upload ho raha hai..."
         },
         'file_too_large': {
-            'en': "The file is too large to send via Telegram ({size}MB). Telegram has a 50MB file size limit. Please try a different format or a shorter video.",
-            'hi': "फ़ाइल टेलीग्राम के माध्यम से भेजने के लिए बहुत बड़ी है ({size}MB)। टेलीग्राम में 50MB फ़ाइल साइज की सीमा है। कृपया एक अलग फॉर्मेट या छोटे वीडियो का प्रयास करें।",
-            'hi-en': "File Telegram ke through send karne ke liye bahut badi hai ({size}MB). Telegram mein 50MB file size ki limit hai. Please ek different format ya chote video ka try karein."
+            'en': "The file is too large to send via Telegram ({size}MB). Telegram has a {limit}MB file size limit. Please try a different format or a shorter video.",
+            'hi': "फ़ाइल टेलीग्राम के माध्यम से भेजने के लिए बहुत बड़ी है ({size}MB)। टेलीग्राम में {limit}MB फ़ाइल साइज की सीमा है। कृपया एक अलग फॉर्मेट या छोटे वीडियो का प्रयास करें।",
+            'hi-en': "File Telegram ke through send karne ke liye bahut badi hai ({size}MB). Telegram mein {limit}MB file size ki limit hai. Please ek different format ya chote video ka try karein."
+        },
+        'fitting_file': {
+            'en': "The file is larger than Telegram's upload limit. Splitting or compressing it so it can be sent...",
+            'hi': "फ़ाइल टेलीग्राम की अपलोड सीमा से बड़ी है। इसे भेजने के लिए भागों में बांटा या छोटा किया जा रहा है...",
+            'hi-en': "File Telegram ki upload limit se badi hai. Ise bhejne ke liye parts mein split ya compress kiya ja raha hai..."
         },
         'download_failed': {
             'en': "Download failed. The file wasn't found after processing.",
             'hi': "डाउनलोड विफल। प्रोसेसिंग के बाद फ़ाइल नहीं मिली।",
             'hi-en': "Download fail ho gaya. Processing ke baad file nahi mili."
         },
+        'download_interrupted': {
+            'en': "The bot is restarting. Your download will continue automatically in a moment...",
+            'hi': "बॉट रीस्टार्ट हो रहा है। आपका डाउनलोड थोड़ी देर में अपने आप जारी रहेगा...",
+            'hi-en': "Bot restart ho raha hai. Aapka download thodi der mein apne aap continue hoga..."
+        },
+        'download_gave_up': {
+            'en': "Your download was interrupted too many times and has been stopped. Please send the link again to retry.",
+            'hi': "आपका डाउनलोड कई बार बाधित हुआ और रोक दिया गया है। दोबारा कोशिश करने के लिए कृपया लिंक फिर से भेजें।",
+            'hi-en': "Aapka download bahut baar interrupt hua aur rok diya gaya hai. Retry karne ke liye please link dobara bhejein."
+        },
+        'download_resuming': {
+            'en': "Resuming your download where it left off...",
+            'hi': "आपका डाउनलोड वहीं से फिर शुरू किया जा रहा है जहां वह रुका था...",
+            'hi-en': "Aapka download wahin se resume ho raha hai jahan ruka tha..."
+        },
         'download_error': {
             'en': "An error occurred during download: {error}",
             'hi': "डाउनलोड के दौरान एक त्रुटि हुई: {error}",
             'hi-en': "Download ke dauran ek error hua: {error}"
         },
+        'queue_position': {
+            'en': "The bot is busy right now. You are number {position} in the queue - your request will start soon...",
+            'hi': "बॉट अभी व्यस्त है। कतार में आपका नंबर {position} है - आपका अनुरोध जल्द ही शुरू होगा...",
+            'hi-en': "Bot abhi busy hai. Queue mein aapka number {position} hai - aapka request jaldi start hoga..."
+        },
+        'queue_full': {
+            'en': "The bot is handling too many requests right now. Please try again in a few minutes.",
+            'hi': "बॉट अभी बहुत सारे अनुरोध संभाल रहा है। कृपया कुछ मिनटों में फिर से प्रयास करें।",
+            'hi-en': "Bot abhi bahut saare requests handle kar raha hai. Please kuch minutes mein dobara try karein."
+        },
+        'batch_found': {
+            'en': "I found {count} videos in your message. What should I do with each of them?",
+            'hi': "आपके संदेश में {count} वीडियो मिले। मैं हर एक के साथ क्या करूं?",
+            'hi-en': "Aapke message mein {count} videos mile. Main har ek ke saath kya karun?"
+        },
+        'batch_playlist_found': {
+            'en': "That's a playlist. What should I do with each video in it?",
+            'hi': "यह एक प्लेलिस्ट है। मैं इसके हर वीडियो के साथ क्या करूं?",
+            'hi-en': "Yeh ek playlist hai. Main iske har video ke saath kya karun?"
+        },
+        'batch_started': {
+            'en': "Working through the videos - each result will be sent as soon as it's ready...",
+            'hi': "वीडियो प्रोसेस किए जा रहे हैं - हर परिणाम तैयार होते ही भेजा जाएगा...",
+            'hi-en': "Videos process ho rahe hain - har result ready hote hi bhej diya jayega..."
+        },
+        'batch_progress': {
+            'en': "Working through the videos - {finished} finished so far...",
+            'hi': "वीडियो प्रोसेस किए जा रहे हैं - अब तक {finished} पूरे हुए...",
+            'hi-en': "Videos process ho rahe hain - ab tak {finished} complete hue..."
+        },
+        'batch_finished': {
+            'en': "All done - {done} videos processed, {failed} without a usable transcript.",
+            'hi': "सब पूरा हुआ - {done} वीडियो प्रोसेस हुए, {failed} में उपयोगी ट्रांसक्रिप्ट नहीं था।",
+            'hi-en': "Sab ho gaya - {done} videos process hue, {failed} mein usable transcript nahi tha."
+        },
+        'batch_empty': {
+            'en': "I couldn't find any videos to process in that playlist.",
+            'hi': "उस प्लेलिस्ट में प्रोसेस करने के लिए कोई वीडियो नहीं मिला।",
+            'hi-en': "Us playlist mein process karne ke liye koi video nahi mila."
+        },
+        'ask_prompt': {
+            'en': "Send me your question about this video as a message and I'll answer it from the transcript, with timestamps.",
+            'hi': "इस वीडियो के बारे में अपना प्रश्न संदेश के रूप में भेजें, मैं ट्रांसक्रिप्ट से समय के साथ उत्तर दूंगा।",
+            'hi-en': "Is video ke baare mein apna question message mein bhejein, main transcript se timestamps ke saath answer dunga."
+        },
+        'ask_no_video': {
+            'en': "Send me a YouTube link first, then you can ask questions about that video.",
+            'hi': "पहले मुझे एक YouTube लिंक भेजें, फिर आप उस वीडियो के बारे में प्रश्न पूछ सकते हैं।",
+            'hi-en': "Pehle mujhe ek YouTube link bhejein, phir aap us video ke baare mein questions pooch sakte hain."
+        },
+        'processing_question': {
+            'en': "Looking through the video for the answer...",
+            'hi': "उत्तर के लिए वीडियो देखा जा रहा है...",
+            'hi-en': "Answer ke liye video dekha ja raha hai..."
+        },
+        'answer_intro': {
+            'en': "Answer from the video:",
+            'hi': "वीडियो से उत्तर:",
+            'hi-en': "Video se answer:"
+        },
         'select_option': {
             'en': "Please select an option:",
             'hi': "कृपया एक विकल्प चुनें:",
@@ -403,17 +1241,19 @@ def get_localized_text(text_key, language_code='en'):
 # Command handlers
 async def start(update: Update, context: CallbackContext) -> None:
     user_lang = detect_language(update.message.text)
-    context.user_data['language'] = user_lang
+    session = get_session(update)
+    session.language = user_lang
+    session_store.save(session)
     
     await update.message.reply_text(get_localized_text('welcome_message', user_lang))
 
 async def help_command(update: Update, context: CallbackContext) -> None:
-    user_lang = context.user_data.get('language', detect_language(update.message.text))
+    user_lang = get_session(update).language or detect_language(update.message.text)
     
     await update.message.reply_text(get_localized_text('help_message', user_lang))
 
 async def set_language(update: Update, context: CallbackContext) -> None:
-    user_lang = context.user_data.get('language', 'en')
+    user_lang = get_session(update).language or 'en'
     
     # Create keyboard with language options (only English, Hindi, and Hinglish)
     keyboard = [
@@ -429,26 +1269,172 @@ async def set_language(update: Update, context: CallbackContext) -> None:
         reply_markup=reply_markup
     )
 
+# Videos waiting for the user to pick what to do with the whole batch
+class Batch:
+    def __init__(self, video_ids, playlist_url):
+        self.video_ids = video_ids
+        self.playlist_url = playlist_url
+
+_pending_batches = {}
+
+# Store a fetched transcript for everyone, with its chunk index for free-text questions
+def store_transcript(video_id, language, transcript, title, line_starts):
+    chunk_index = TranscriptIndex.build(transcript.split('\n'), line_starts, RETRIEVAL_CHUNK_TOKENS)
+    transcript_store.put(video_id, language, transcript, title, chunk_index.to_json())
+
+# Ask what to run over a playlist or a message with several links
+async def offer_batch(update: Update, batch, user_lang):
+    _pending_batches[update.effective_user.id] = batch
+    if batch.playlist_url:
+        text = get_localized_text('batch_playlist_found', user_lang)
+    else:
+        text = get_localized_text('batch_found', user_lang).format(count=len(batch.video_ids))
+    
+    keyboard = [
+        [InlineKeyboardButton("Summary", callback_data='batch_summary')],
+        [InlineKeyboardButton("Key Points", callback_data='batch_key_points')],
+        [InlineKeyboardButton("Q&A", callback_data='batch_questions')],
+        [InlineKeyboardButton("Study Notes", callback_data='batch_study_notes')],
+    ]
+    await update.message.reply_text(text, reply_markup=InlineKeyboardMarkup(keyboard))
+
+# Transcript and analysis of one batch video, as a scheduler job. Returns (title, result),
+# with result None if the video has no usable transcript.
+async def _process_batch_video(video_id, choice, user_lang):
+    transcript, title, _, line_starts = await get_video_transcript(youtube_url_for(video_id), user_lang)
+    if not is_usable_transcript(transcript):
+        return title, None
+    store_transcript(video_id, user_lang, transcript, title, line_starts)
+    return title, await process_with_groq(transcript, title, choice, user_lang, video_id)
+
+# Run the chosen analysis over every video of a batch, at most BATCH_CONCURRENCY at a
+# time, posting each result as soon as it is ready
+async def run_batch(update: Update, batch, choice, user_lang):
+    user_id = update.effective_user.id
+    reply_text = update.callback_query.message.reply_text
+    status_message = await reply_text(get_localized_text('batch_started', user_lang))
+    
+    # Video IDs arrive through a queue, ended by None - playlists are listed in the background
+    video_ids = asyncio.Queue()
+    loop = asyncio.get_running_loop()
+    
+    async def list_playlist():
+        try:
+            await run_metadata_job(
+                _list_playlist, batch.playlist_url, BATCH_MAX_VIDEOS,
+                lambda video_id: loop.call_soon_threadsafe(video_ids.put_nowait, video_id)
+            )
+        except Exception as e:
+            logger.error(f"Error listing playlist {batch.playlist_url}: {e}")
+        finally:
+            loop.call_soon_threadsafe(video_ids.put_nowait, None)
+    
+    if batch.playlist_url:
+        lister = asyncio.ensure_future(list_playlist())
+    else:
+        lister = None
+        for video_id in batch.video_ids[:BATCH_MAX_VIDEOS]:
+            video_ids.put_nowait(video_id)
+        video_ids.put_nowait(None)
+    
+    counts = {'done': 0, 'failed': 0}
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY)
+    
+    async def process(number, video_id):
+        try:
+            title, result = await job_scheduler.submit(
+                user_id, 'text', lambda: _process_batch_video(video_id, choice, user_lang)
+            )
+        except Exception as e:
+            logger.error(f"Batch video {video_id} failed: {e}")
+            title, result = youtube_url_for(video_id), None
+        finally:
+            slots.release()
+        
+        header = f"{number}. {title}"
+        if result is None:
+            counts['failed'] += 1
+            await reply_text(f"{header}\n\n{get_localized_text('no_transcript', user_lang)}")
+        else:
+            counts['done'] += 1
+            message = await reply_text(header)
+            await StreamingMessage(message, header, reply_text).finish(result)
+        try:
+            await status_message.edit_text(
+                get_localized_text('batch_progress', user_lang).format(finished=counts['done'] + counts['failed'])
+            )
+        except Exception as e:
+            logger.debug(f"Could not update batch status: {e}")
+    
+    tasks = []
+    try:
+        while True:
+            video_id = await video_ids.get()
+            if video_id is None:
+                break
+            await slots.acquire()
+            tasks.append(asyncio.ensure_future(process(len(tasks) + 1, video_id)))
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, Exception):
+                logger.error(f"Error sending batch result: {result}")
+    finally:
+        if lister is not None:
+            lister.cancel()
+        for task in tasks:
+            task.cancel()
+    
+    if not tasks:
+        await status_message.edit_text(get_localized_text('batch_empty', user_lang))
+        return
+    await status_message.edit_text(
+        get_localized_text('batch_finished', user_lang).format(done=counts['done'], failed=counts['failed'])
+    )
+
 # Handle YouTube links
 async def handle_youtube_url(update: Update, context: CallbackContext) -> None:
     url = update.message.text
-    user_lang = context.user_data.get('language', detect_language(update.message.text))
+    session = get_session(update)
+    user_lang = session.language or detect_language(update.message.text)
+    
+    # Playlists and messages with several links are handled as one batch
+    video_ids, playlist_url = find_batch_targets(url)
+    if playlist_url or len(video_ids) > 1:
+        await offer_batch(update, Batch(video_ids, playlist_url), user_lang)
+        return
     
     if not is_valid_youtube_url(url):
         await update.message.reply_text(get_localized_text('invalid_url', user_lang))
         return
     
-    # Store the URL in user data for later use
-    context.user_data['youtube_url'] = url
+    # A new link means the user has left the previous video
+    cancel_prefetch(update.effective_user.id)
     
-    await update.message.reply_text(get_localized_text('processing_url', user_lang))
+    # Remember which video this user is looking at
+    video_id = extract_video_id(url)
+    session.video_id = video_id
+    session.transcript_language = user_lang
+    session_store.save(session)
+    
+    status_message = await update.message.reply_text(get_localized_text('processing_url', user_lang))
+    queue_status = QueueStatus(status_message, get_localized_text('processing_url', user_lang), user_lang)
     
     # Extract transcript in user's language
-    transcript, title, detected_lang = await get_video_transcript(url, user_lang)
+    try:
+        transcript, title, detected_lang, line_starts = await job_scheduler.submit(
+            update.effective_user.id, 'text',
+            lambda: queue_status.run(get_video_transcript(url, user_lang)),
+            on_position=queue_status.report
+        )
+    except QueueFullError:
+        await status_message.edit_text(get_localized_text('queue_full', user_lang))
+        return
     
-    # Store transcript and title in user data
-    context.user_data['transcript'] = transcript
-    context.user_data['title'] = title
+    # Store the transcript once per video so every user asking about it shares the same copy
+    if is_usable_transcript(transcript):
+        store_transcript(video_id, user_lang, transcript, title, line_starts)
+        if SPECULATIVE_PREFETCH:
+            # Same language the button handler will ask for
+            start_prefetch(update.effective_user.id, video_id, transcript, title, session.language or 'en')
     
     # Create keyboard with options
     if user_lang == 'en':
@@ -458,6 +1444,7 @@ async def handle_youtube_url(update: Update, context: CallbackContext) -> None:
             [InlineKeyboardButton("Detailed Analysis", callback_data='detailed_analysis')],
             [InlineKeyboardButton("Generate Q&A", callback_data='questions')],
             [InlineKeyboardButton("Create Study Notes", callback_data='study_notes')],
+            [InlineKeyboardButton("Ask a Question", callback_data='ask')],
             [InlineKeyboardButton("Download Video", callback_data='download_video')]
         ]
     elif user_lang == 'hi':
@@ -467,6 +1454,7 @@ async def handle_youtube_url(update: Update, context: CallbackContext) -> None:
             [InlineKeyboardButton("विस्तृत विश्लेषण", callback_data='detailed_analysis')],
             [InlineKeyboardButton("प्रश्न-उत्तर जनरेट करें", callback_data='questions')],
             [InlineKeyboardButton("अध्ययन नोट्स बनाएं", callback_data='study_notes')],
+            [InlineKeyboardButton("प्रश्न पूछें", callback_data='ask')],
             [InlineKeyboardButton("वीडियो डाउनलोड करें", callback_data='download_video')]
         ]
     else:  # Hinglish
@@ -476,6 +1464,7 @@ async def handle_youtube_url(update: Update, context: CallbackContext) -> None:
             [InlineKeyboardButton("Detailed Analysis", callback_data='detailed_analysis')],
             [InlineKeyboardButton("Q&A Generate Karein", callback_data='questions')],
             [InlineKeyboardButton("Study Notes Banayein", callback_data='study_notes')],
+            [InlineKeyboardButton("Question Poochhein", callback_data='ask')],
             [InlineKeyboardButton("Video Download Karein", callback_data='download_video')]
         ]
     
@@ -486,18 +1475,61 @@ async def handle_youtube_url(update: Update, context: CallbackContext) -> None:
         reply_markup=reply_markup
     )
 
+# Plain text without a link is a question about the user's current video
+async def handle_question(update: Update, context: CallbackContext) -> None:
+    question = update.message.text.strip()
+    session = get_session(update)
+    user_lang = session.language or detect_language(question)
+    
+    video_id = session.video_id
+    stored = transcript_store.get(video_id, session.transcript_language) if video_id else None
+    if stored is None:
+        await update.message.reply_text(get_localized_text('ask_no_video', user_lang))
+        return
+    transcript, title = stored
+    
+    # Asking something means the user didn't want the speculative answer
+    cancel_prefetch(update.effective_user.id)
+    index = get_transcript_index(video_id, session.transcript_language, transcript)
+    
+    processing_message = await update.message.reply_text(get_localized_text('processing_question', user_lang))
+    streamer = StreamingMessage(
+        processing_message,
+        get_localized_text('answer_intro', user_lang),
+        update.message.reply_text
+    )
+    
+    queue_status = QueueStatus(processing_message, processing_message.text, user_lang)
+    try:
+        result = await job_scheduler.submit(
+            update.effective_user.id, 'text',
+            lambda: queue_status.run(answer_question(index, title, question, user_lang, video_id, on_text=streamer.append)),
+            on_position=queue_status.report
+        )
+    except QueueFullError:
+        await processing_message.edit_text(get_localized_text('queue_full', user_lang))
+        return
+    
+    await streamer.finish(result)
+
 # Handle button callbacks
 async def button_callback(update: Update, context: CallbackContext) -> None:
     query = update.callback_query
     await query.answer()
     
     callback_data = query.data
-    user_lang = context.user_data.get('language', 'en')
+    session = get_session(update)
+    user_lang = session.language or 'en'
+    
+    # The user went another way - stop working on the speculative answer
+    if callback_data != PREFETCH_CHOICE:
+        cancel_prefetch(update.effective_user.id)
     
     # Handle language selection callback
     if callback_data.startswith('lang_'):
         selected_lang = callback_data.split('_')[1]
-        context.user_data['language'] = selected_lang
+        session.language = selected_lang
+        session_store.save(session)
         
         await query.message.reply_text(get_localized_text('language_set', selected_lang))
         return
@@ -535,23 +1567,35 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         )
         return
     
+    # Run the chosen analysis over the user's pending batch
+    if callback_data.startswith('batch_'):
+        batch = _pending_batches.pop(update.effective_user.id, None)
+        if batch is not None:
+            await run_batch(update, batch, callback_data.replace('batch_', ''), user_lang)
+        return
+    
+    # Questions are typed as normal messages - just tell the user how
+    if callback_data == 'ask':
+        await query.message.reply_text(get_localized_text('ask_prompt', user_lang))
+        return
+    
     # Handle download format selection
     if callback_data.startswith('download_'):
-        url = context.user_data.get('youtube_url')
         format_id = callback_data.replace('download_', '')
         
-        if url:
-            await download_youtube_video(update, context, url, format_id)
+        if session.video_id:
+            await download_youtube_video(update, context, youtube_url_for(session.video_id), format_id)
         return
     
     # Handle video processing options
     choice = callback_data
-    transcript = context.user_data.get('transcript')
-    title = context.user_data.get('title')
+    video_id = session.video_id
+    stored = transcript_store.get(video_id, session.transcript_language) if video_id else None
     
-    if not transcript or transcript.startswith("No transcript") or transcript.startswith("Error"):
+    if stored is None:
         await query.message.reply_text(get_localized_text('no_transcript', user_lang))
         return
+    transcript, title = stored
     
     choice_text = {
         'summary': 'summary',
@@ -566,30 +1610,143 @@ async def button_callback(update: Update, context: CallbackContext) -> None:
         get_localized_text('processing_request', user_lang).format(choice=choice_text.get(choice, choice))
     )
     
-    # Process with Groq AI
-    result = await process_with_groq(transcript, title, choice, user_lang)
+    # Stream the answer into the processing message as it is generated
+    streamer = StreamingMessage(
+        processing_message,
+        get_localized_text('result_intro', user_lang).format(choice=choice_text.get(choice, choice)),
+        query.message.reply_text
+    )
     
-    # Send the result, potentially split into multiple messages if too long
-    max_message_length = 4096  # Telegram message limit
+    # A prefetch of this exact answer may be nearly done - let it finish instead of starting over
+    await wait_for_prefetch(update.effective_user.id, video_id, user_lang, choice)
     
-    if len(result) <= max_message_length:
-        await processing_message.edit_text(
-            f"{get_localized_text('result_intro', user_lang).format(choice=choice_text.get(choice, choice))}\n\n{result}"
+    # Process with Groq AI once the scheduler admits the job
+    queue_status = QueueStatus(processing_message, processing_message.text, user_lang)
+    try:
+        result = await job_scheduler.submit(
+            update.effective_user.id, 'text',
+            lambda: queue_status.run(process_with_groq(transcript, title, choice, user_lang, video_id, on_text=streamer.append)),
+            on_position=queue_status.report
         )
-    else:
-        # Split into multiple messages
-        await processing_message.edit_text(
-            get_localized_text('result_intro', user_lang).format(choice=choice_text.get(choice, choice))
+    except QueueFullError:
+        await processing_message.edit_text(get_localized_text('queue_full', user_lang))
+        return
+    
+    # Make sure the complete result is shown, rolling over into extra messages if too long
+    await streamer.finish(result)
+
+# Serve metrics from this process (each webhook worker gets its own port)
+async def start_metrics_server(application: Application, port) -> None:
+    global metrics_server
+    metrics_server = MetricsServer(METRICS_LISTEN, port, profiler_enabled=PROFILER_ENABLED)
+    await metrics_server.start()
+
+# Keep this process's journal entries fresh, and take over downloads that were released
+# on shutdown or whose process died, for the users this process handles
+async def watch_download_journal(application: Application, worker_index):
+    def handles_job(job):
+        return not WEBHOOK_URL or worker_for_user(job.user_id, WEBHOOK_WORKERS) == worker_index
+    
+    # Resumed jobs are tracked by the application, so wait until it has started
+    while not application.running:
+        await asyncio.sleep(0.1)
+    
+    while True:
+        download_journal.touch(journal_owner)
+        if not draining:
+            claimed, given_up = download_journal.claim(journal_owner, JOURNAL_STALE_SECONDS, handles_job)
+            for job in claimed:
+                application.create_task(resume_download(application, job))
+            for job in given_up:
+                application.create_task(give_up_download(application, job))
+        await asyncio.sleep(JOURNAL_HEARTBEAT_SECONDS)
+
+# SIGTERM: stop starting downloads, give running ones DRAIN_TIMEOUT seconds to finish,
+# then interrupt the rest (keeping their .part files) and hand their journal entries
+# over to the next process. Uploads already under way are still waited for.
+async def drain_downloads(application: Application) -> None:
+    global draining
+    if draining:
+        return
+    draining = True
+    logger.info(f"Shutting down, waiting up to {DRAIN_TIMEOUT}s for {progress_board.stats()['active']} downloads")
+    
+    deadline = time.monotonic() + DRAIN_TIMEOUT
+    while progress_board.stats()['active'] and time.monotonic() < deadline:
+        await asyncio.sleep(1)
+    if progress_board.stats()['active']:
+        logger.info(f"Interrupting {progress_board.stats()['active']} downloads, they will resume after the restart")
+        progress_board.abort_all()
+        # yt-dlp stops at the next progress update
+        deadline = time.monotonic() + 10
+        while progress_board.stats()['active'] and time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+    
+    download_journal.release(journal_owner)
+    # Webhook workers are stopped by the front server instead
+    if application.updater is not None:
+        application.stop_running()
+
+# Metrics endpoint, SIGTERM draining and recovery of journaled downloads
+async def on_startup(application: Application, worker_index=0) -> None:
+    global journal_task
+    if METRICS_PORT:
+        await start_metrics_server(application, METRICS_PORT + worker_index)
+    try:
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, lambda: asyncio.ensure_future(drain_downloads(application))
         )
-        
-        # Send the content in chunks
-        for i in range(0, len(result), max_message_length):
-            chunk = result[i:i + max_message_length]
-            await query.message.reply_text(chunk)
+    except NotImplementedError:
+        logger.warning("SIGTERM handlers are not supported here - downloads will not be drained on shutdown")
+    journal_task = asyncio.ensure_future(watch_download_journal(application, worker_index))
+
+# Release the yt-dlp worker pool and caches when the bot stops
+async def on_shutdown(application: Application) -> None:
+    if journal_task is not None:
+        journal_task.cancel()
+    # Whatever is still journaled did not finish - let the next process have it right away
+    download_journal.release(journal_owner)
+    download_journal.close()
+    if metrics_server is not None:
+        await metrics_server.stop()
+    shutdown_workers(wait=False)
+    await close_http_client()
+    await llm_client.close()
+    if speech_client is not None:
+        await speech_client.close()
+    logger.info(f"Metadata cache stats: {metadata_cache.stats()}")
+    metadata_cache.close()
+    logger.info(f"Result cache stats: {result_cache.stats()}")
+    result_cache.close()
+    logger.info(f"Download progress stats: {progress_board.stats()}")
+    file_id_store.close()
+    session_store.close()
+    transcript_store.close()
 
 # Create application and add handlers
-def main() -> None:
-    application = Application.builder().token(TELEGRAM_TOKEN).build()
+def build_application(updater=True, worker_index=0) -> Application:
+    # Updates are handled concurrently so one long job doesn't hold up other chats;
+    # the heavy lifting is bounded by the worker pool limits instead
+    builder = (
+        Application.builder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(True)
+        .post_init(functools.partial(on_startup, worker_index=worker_index))
+        .post_shutdown(on_shutdown)
+    )
+    if TELEGRAM_API_SERVER:
+        # Self-hosted Bot API server: local file paths and the 2 GB limit
+        api_server = TELEGRAM_API_SERVER.rstrip('/')
+        builder = (
+            builder
+            .base_url(f"{api_server}/bot")
+            .base_file_url(f"{api_server}/file/bot")
+            .local_mode(True)
+        )
+    if not updater:
+        # Webhook workers are fed updates by the front server
+        builder = builder.updater(None)
+    application = builder.build()
     
     # Command handlers
     application.add_handler(CommandHandler("start", start))
@@ -602,11 +1759,40 @@ def main() -> None:
         handle_youtube_url
     ))
     
+    # Any other text is a question about the current video
+    application.add_handler(MessageHandler(
+        filters.TEXT & ~filters.COMMAND & ~filters.Regex(r'https?://'),
+        handle_question
+    ))
+    
     # Handle callback queries
     application.add_handler(CallbackQueryHandler(button_callback))
     
-    # Run the bot
-    application.run_polling()
+    return application
+
+def main() -> None:
+    # Clear out whatever a previous run left behind before any worker starts downloading,
+    # keeping the partial files of journaled downloads so they can resume
+    download_workspace.reconcile(download_journal.job_dirs())
+    
+    if WEBHOOK_URL:
+        # Webhook mode: an embedded HTTP server routes updates by chat to worker processes
+        WebhookServer(
+            TELEGRAM_TOKEN,
+            build_application,
+            WEBHOOK_URL,
+            WEBHOOK_LISTEN,
+            WEBHOOK_PORT,
+            WEBHOOK_PATH,
+            secret=WEBHOOK_SECRET,
+            workers=WEBHOOK_WORKERS,
+            api_server=TELEGRAM_API_SERVER,
+            drain_timeout=DRAIN_TIMEOUT
+        ).run()
+        return
+    
+    # Run the bot - SIGTERM is left to drain_downloads
+    build_application().run_polling(stop_signals=(signal.SIGINT, signal.SIGABRT))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,80 @@
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from language import detect_language, _classify
+
+# Compare the script/lexicon detector with langdetect on latency and determinism.
+# Run from the repository root: python benchmarks/bench_language.py
+
+SAMPLES = [
+    "Hello! Can you summarize this video for me?",
+    "नमस्ते, कृपया इस वीडियो का सारांश बताइए",
+    "bhai is video ka summary chahiye jaldi",
+    "kya aap mujhe yeh samjhao",
+    "What are the key points of this lecture?",
+    "yeh lecture bahut lamba hai, notes bana do",
+    "ok",
+    "/start",
+    "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+]
+ROUNDS = 200
+DETERMINISM_RUNS = 20
+
+def time_detector(detect, clear=None):
+    timings = []
+    for _ in range(ROUNDS):
+        for text in SAMPLES:
+            if clear is not None:
+                clear()
+            start = time.perf_counter()
+            try:
+                detect(text)
+            except Exception:
+                pass
+            timings.append(time.perf_counter() - start)
+    return timings
+
+def count_unstable(detect):
+    unstable = 0
+    for text in SAMPLES:
+        results = set()
+        for _ in range(DETERMINISM_RUNS):
+            try:
+                results.add(detect(text))
+            except Exception as e:
+                results.add(type(e).__name__)
+        if len(results) > 1:
+            unstable += 1
+    return unstable
+
+def report(name, timings, unstable):
+    timings = sorted(timings)
+    p50 = statistics.median(timings) * 1e6
+    p99 = timings[int(len(timings) * 0.99) - 1] * 1e6
+    print(f"{name:<22} p50 {p50:9.1f} us   p99 {p99:9.1f} us   unstable samples: {unstable}/{len(SAMPLES)}")
+
+def main():
+    report("script+lexicon", time_detector(detect_language, _classify.cache_clear), count_unstable(detect_language))
+    report("script+lexicon cached", time_detector(detect_language), 0)
+
+    try:
+        from langdetect import detect
+    except ImportError:
+        print("langdetect is not installed - skipping the comparison")
+        return
+
+    # The first call loads every language profile
+    start = time.perf_counter()
+    try:
+        detect(SAMPLES[0])
+    except Exception:
+        pass
+    print(f"langdetect first call (profile loading): {(time.perf_counter() - start) * 1e3:.1f} ms")
+    report("langdetect", time_detector(detect), count_unstable(detect))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,412 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import sys
+import tempfile
+import time
+import types
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+# Drive handle_youtube_url and button_callback with synthetic updates against local
+# stand-ins for YouTube (a fake YoutubeDL), Groq (a fake chat completions endpoint)
+# and Telegram (a fake Bot API that records every call), and report latency and
+# throughput as concurrency rises. Nothing leaves the machine.
+# Run from the repository root: python benchmarks/bench_load.py --concurrency 1,8,32
+
+BOT_TOKEN = "123456:BENCHMARK"
+BOT_USER = {"id": 123456, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+CAPTION_LINES = [
+    "welcome back to the channel",
+    "today we are looking at how caching changes the latency of a web service",
+    "first we measure the cold path without any cache",
+    "then we add an in-memory layer and compare the percentiles",
+    "finally we look at what happens when the cache is shared between processes",
+]
+
+QUESTIONS = [
+    "what happens when the cache is shared between processes?",
+    "how is the cold path measured?",
+]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Offline load test of the bot against local fakes")
+    parser.add_argument('--concurrency', default='1,4,16,64', help="comma separated concurrency levels")
+    parser.add_argument('--users-per-level', type=int, default=0, help="simulated users per level (default 4x concurrency)")
+    parser.add_argument('--scenario', choices=['summary', 'download', 'both', 'ask', 'batch', 'restart'], default='summary')
+    parser.add_argument('--batch-size', type=int, default=5, help="videos per batch in the batch scenario")
+    parser.add_argument('--playlist', action='store_true', help="send the batch as a playlist link instead of separate links")
+    parser.add_argument('--llm-latency', type=float, default=0.3, help="seconds before the fake LLM's first token")
+    parser.add_argument('--llm-tokens-per-second', type=float, default=400)
+    parser.add_argument('--reply-tokens', type=int, default=200)
+    parser.add_argument('--llm-prefill-tokens-per-second', type=float, default=20000, help="prompt processing rate of the fake LLM")
+    parser.add_argument('--bot-latency', type=float, default=0.02, help="seconds the fake Bot API takes per call")
+    parser.add_argument('--extract-latency', type=float, default=0.2, help="seconds the fake extract_info takes")
+    parser.add_argument('--caption-lines', type=int, default=400, help="length of the fixture transcript")
+    parser.add_argument('--rolling-captions', action='store_true', help="serve auto-caption style tracks that repeat each line")
+    parser.add_argument('--download-mb', type=float, default=2, help="size of the fixture download")
+    parser.add_argument('--think-time', type=float, default=0, help="seconds a user looks at the menu before clicking")
+    parser.add_argument('--speculative', action='store_true', help="turn on SPECULATIVE_PREFETCH")
+    parser.add_argument('--download-mbps', type=float, default=50, help="fake download speed in MB/s")
+    parser.add_argument('--restart-after', type=float, default=0.5, help="seconds into a level the restart scenario sends SIGTERM")
+    return parser.parse_args()
+
+ARGS = parse_args()
+FAKE_PORT = free_port()
+FAKE_URL = f"http://127.0.0.1:{FAKE_PORT}"
+WORK_DIR = tempfile.mkdtemp(prefix="ytbot-bench-")
+
+# The bot reads its settings at import time - keep its stores in a scratch directory
+# and lift the queue limits so the numbers show the bot itself
+os.environ.update({
+    'JOB_QUEUE_LIMIT': '100000',
+    'TEXT_JOB_CONCURRENCY': os.environ.get('TEXT_JOB_CONCURRENCY', '64'),
+    'RESULT_CACHE_DB': os.path.join(WORK_DIR, 'results.sqlite3'),
+    'FILE_ID_DB': os.path.join(WORK_DIR, 'media.sqlite3'),
+    'SESSION_DB': os.path.join(WORK_DIR, 'sessions.sqlite3'),
+    'JOB_JOURNAL_DB': os.path.join(WORK_DIR, 'jobs.sqlite3'),
+    'METADATA_CACHE_DB': os.path.join(WORK_DIR, 'metadata.sqlite3'),
+    'DOWNLOAD_DIR': os.path.join(WORK_DIR, 'downloads'),
+    'METRICS_PORT': '0',
+    'SPECULATIVE_PREFETCH': '1' if ARGS.speculative else '0',
+    'DRAIN_TIMEOUT': '0',  # the restart scenario interrupts downloads right away
+})
+
+import logging
+
+import yt_dlp
+from aiohttp import web
+from telegram import Bot, Update
+
+import app
+from llm import LLMClient, create_backend
+
+logging.getLogger().setLevel(logging.WARNING)
+
+# Stand-in for yt_dlp.YoutubeDL serving fixture metadata and writing fixture files.
+# Like yt-dlp it writes to a .part file and continues an existing one.
+class FakeYoutubeDL:
+    bytes_transferred = 0
+
+    def __init__(self, params=None):
+        self.params = params or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=True, process=True):
+        time.sleep(ARGS.extract_latency)
+        if 'list=' in url:
+            return {'_type': 'playlist', 'id': url.split('list=')[1], 'entries': self._playlist_entries(url)}
+        info = self._fixture_info(app.extract_video_id(url))
+        return self.process_ie_result(info, download) if download else info
+
+    def _playlist_entries(self, url):
+        # Listed lazily, one page of 3 entries per extract_latency
+        prefix = url.split('list=')[1]
+        for index in range(ARGS.batch_size):
+            if index and index % 3 == 0:
+                time.sleep(ARGS.extract_latency)
+            yield {'_type': 'url', 'id': f"{prefix}{index:02d}"}
+
+    def sanitize_info(self, info, remove_private_keys=False):
+        return info
+
+    def process_ie_result(self, info, download=True):
+        # Format selection, like yt-dlp: the picked format's fields go on top
+        info = dict(info, **info['formats'][0])
+        if download:
+            self._download(info)
+        return info
+
+    def prepare_filename(self, info):
+        return self.params['outtmpl'] % info
+
+    def _fixture_info(self, video_id):
+        size = int(ARGS.download_mb * 1024 * 1024)
+        return {
+            'id': video_id,
+            'title': f"Benchmark video {video_id}",
+            'ext': 'mp4',
+            'duration': 600,
+            'subtitles': {'en': [{'ext': 'json3', 'url': f"{FAKE_URL}/subtitles/{video_id}.json3"}]},
+            'automatic_captions': {},
+            'formats': [
+                {'format_id': '18', 'ext': 'mp4', 'height': 360, 'vcodec': 'avc1', 'acodec': 'mp4a', 'filesize': size},
+            ],
+        }
+
+    def _download(self, info):
+        path = self.prepare_filename(info)
+        total = int(ARGS.download_mb * 1024 * 1024)
+        chunk = 256 * 1024
+        hooks = self.params.get('progress_hooks', [])
+        started = time.monotonic()
+        resumed = os.path.getsize(path + '.part') if os.path.exists(path + '.part') else 0
+        with open(path + '.part', 'ab') as f:
+            for done in range(resumed, total, chunk):
+                f.write(b'\0' * min(chunk, total - done))
+                FakeYoutubeDL.bytes_transferred += min(chunk, total - done)
+                time.sleep(min(chunk, total - done) / (ARGS.download_mbps * 1024 * 1024))
+                elapsed = time.monotonic() - started
+                for hook in hooks:
+                    hook({
+                        'status': 'downloading', 'downloaded_bytes': done + chunk, 'total_bytes': total,
+                        'speed': (done + chunk - resumed) / elapsed, 'eta': 0,
+                    })
+        os.replace(path + '.part', path)
+        for hook in hooks:
+            hook({'status': 'finished', 'total_bytes': total, 'elapsed': time.monotonic() - started})
+
+# Fake Groq chat completions and subtitle tracks, plus a fake Bot API, on one local server
+class FakeServices:
+    def __init__(self):
+        self.bot_calls = Counter()
+        self.llm_calls = 0
+        self.prompt_tokens = 0
+        self._message_ids = defaultdict(int)
+
+    def web_app(self):
+        web_app = web.Application(client_max_size=1024 ** 3)
+        web_app.router.add_post('/openai/v1/chat/completions', self.chat_completions)
+        web_app.router.add_get('/subtitles/{name}', self.subtitles)
+        web_app.router.add_post('/bot{token}/{method}', self.bot_api)
+        return web_app
+
+    async def subtitles(self, request):
+        lines = [CAPTION_LINES[index % len(CAPTION_LINES)] for index in range(ARGS.caption_lines)]
+        if ARGS.rolling_captions:
+            # Each cue shows the previous line again above the new one, with sound annotations
+            lines = [
+                f"{lines[index - 1]}\n{line}" if index else f"[Music] {line}"
+                for index, line in enumerate(lines)
+            ]
+        events = [
+            {'tStartMs': index * 3000, 'dDurationMs': 3000, 'segs': [{'utf8': line}]}
+            for index, line in enumerate(lines)
+        ]
+        return web.json_response({'events': events})
+
+    async def chat_completions(self, request):
+        body = await request.json()
+        self.llm_calls += 1
+        reply_tokens = min(ARGS.reply_tokens, body.get('max_tokens') or ARGS.reply_tokens)
+        created = int(time.time())
+        base = {'id': f"bench-{self.llm_calls}", 'created': created, 'model': body['model']}
+        prompt_tokens = sum(len(message['content'].encode('utf-8')) for message in body['messages']) // 4
+        self.prompt_tokens += prompt_tokens
+        await asyncio.sleep(ARGS.llm_latency + prompt_tokens / ARGS.llm_prefill_tokens_per_second)
+
+        if not body.get('stream'):
+            await asyncio.sleep(reply_tokens / ARGS.llm_tokens_per_second)
+            return web.json_response(dict(
+                base,
+                object='chat.completion',
+                choices=[{'index': 0, 'message': {'role': 'assistant', 'content': "word " * reply_tokens}, 'finish_reason': 'stop'}],
+                usage={'prompt_tokens': prompt_tokens, 'completion_tokens': reply_tokens, 'total_tokens': prompt_tokens + reply_tokens},
+            ))
+
+        response = web.StreamResponse(headers={'Content-Type': 'text/event-stream'})
+        await response.prepare(request)
+        # Tokens are sent in small bursts at the configured rate
+        burst = 5
+        for sent in range(0, reply_tokens, burst):
+            chunk = dict(base, object='chat.completion.chunk', choices=[
+                {'index': 0, 'delta': {'content': "word " * min(burst, reply_tokens - sent)}, 'finish_reason': None}
+            ])
+            await response.write(f"data: {json.dumps(chunk)}\n\n".encode())
+            await asyncio.sleep(burst / ARGS.llm_tokens_per_second)
+        done = dict(base, object='chat.completion.chunk', choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}])
+        await response.write(f"data: {json.dumps(done)}\n\ndata: [DONE]\n\n".encode())
+        await response.write_eof()
+        return response
+
+    async def bot_api(self, request):
+        method = request.match_info['method']
+        self.bot_calls[method] += 1
+        params = dict(await request.post()) if request.can_read_body else {}
+        await asyncio.sleep(ARGS.bot_latency)
+
+        if method == 'getMe':
+            return web.json_response({'ok': True, 'result': BOT_USER})
+        if method in ('answerCallbackQuery', 'deleteMessage'):
+            return web.json_response({'ok': True, 'result': True})
+
+        chat_id = int(params.get('chat_id', 0))
+        message = {
+            'message_id': int(params['message_id']) if 'message_id' in params else self._next_message_id(chat_id),
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private'},
+            'from': BOT_USER,
+        }
+        if method == 'sendVideo':
+            message['video'] = {'file_id': f"video-{message['message_id']}", 'file_unique_id': 'v', 'width': 640, 'height': 360, 'duration': 600}
+        elif method == 'sendAudio':
+            message['audio'] = {'file_id': f"audio-{message['message_id']}", 'file_unique_id': 'a', 'duration': 600}
+        elif method == 'sendDocument':
+            message['document'] = {'file_id': f"document-{message['message_id']}", 'file_unique_id': 'd'}
+        else:
+            message['text'] = params.get('text', '')
+        return web.json_response({'ok': True, 'result': message})
+
+    def _next_message_id(self, chat_id):
+        self._message_ids[chat_id] += 1
+        return self._message_ids[chat_id]
+
+def user_json(user_id):
+    return {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}", 'language_code': 'en'}
+
+def message_update(bot, update_id, user_id, text):
+    return Update.de_json({
+        'update_id': update_id,
+        'message': {
+            'message_id': 1, 'date': int(time.time()),
+            'chat': {'id': user_id, 'type': 'private'}, 'from': user_json(user_id),
+            'text': text,
+        },
+    }, bot)
+
+def button_update(bot, update_id, user_id, data):
+    return Update.de_json({
+        'update_id': update_id,
+        'callback_query': {
+            'id': str(update_id), 'from': user_json(user_id), 'chat_instance': str(user_id), 'data': data,
+            'message': {
+                'message_id': 2, 'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'}, 'from': BOT_USER, 'text': "menu",
+            },
+        },
+    }, bot)
+
+# One simulated user: send a link, then ask for a summary and/or a download, or ask questions.
+# In the batch scenario the user sends several links (or a playlist) and asks for summaries.
+async def run_user(bot, context, level, index, latencies):
+    user_id = level * 100000 + index
+    video_id = f"bn{level:04d}{index:05d}"  # fresh video per user, so nothing is served from a cache
+
+    async def timed(stage, handler, update):
+        started = time.perf_counter()
+        await handler(update, context)
+        latencies[stage].append(time.perf_counter() - started)
+
+    if ARGS.scenario == 'batch':
+        # Fresh videos here too - a playlist's entries are named after the playlist
+        video_ids = [f"bt{level:02d}{index:05d}{number:02d}" for number in range(ARGS.batch_size)]
+        if ARGS.playlist:
+            text = f"https://www.youtube.com/playlist?list=bt{level:02d}{index:05d}"
+        else:
+            text = " ".join(app.youtube_url_for(video_id) for video_id in video_ids)
+        await timed('batch', app.handle_youtube_url, message_update(bot, index * 3, user_id, text))
+        await timed('batch_run', app.button_callback, button_update(bot, index * 3 + 1, user_id, 'batch_summary'))
+        return
+
+    await timed('link', app.handle_youtube_url, message_update(bot, index * 3, user_id, app.youtube_url_for(video_id)))
+    await asyncio.sleep(ARGS.think_time)
+    if ARGS.scenario in ('summary', 'both'):
+        await timed('summary', app.button_callback, button_update(bot, index * 3 + 1, user_id, 'summary'))
+    if ARGS.scenario in ('download', 'both', 'restart'):
+        await timed('download', app.button_callback, button_update(bot, index * 3 + 2, user_id, 'download_video_audio_360p'))
+    if ARGS.scenario == 'ask':
+        for question in QUESTIONS:
+            await timed('ask', app.handle_question, message_update(bot, index * 3 + 1, user_id, question))
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+# Send the bot a SIGTERM while `users` are downloading, then "restart" it: the journaled
+# downloads are claimed under a new owner and resumed from their .part files
+async def restart_during(users, bot, latencies):
+    application = types.SimpleNamespace(bot=bot, updater=None)
+    await asyncio.sleep(ARGS.restart_after)
+    await app.drain_downloads(application)
+    await users
+
+    app.draining = False
+    app.progress_board.aborting = False
+    app.journal_owner = f"restarted-{time.monotonic()}"
+    jobs, _ = app.download_journal.claim(app.journal_owner, app.JOURNAL_STALE_SECONDS)
+
+    async def resume(job):
+        started = time.perf_counter()
+        await app.resume_download(application, job)
+        latencies['resume'].append(time.perf_counter() - started)
+
+    await asyncio.gather(*[resume(job) for job in jobs])
+
+async def run_level(bot, context, services, level, concurrency):
+    users = ARGS.users_per_level or concurrency * 4
+    latencies = defaultdict(list)
+    calls_before = sum(services.bot_calls.values())
+    slots = asyncio.Semaphore(concurrency)
+
+    async def limited(index):
+        async with slots:
+            await run_user(bot, context, level, index, latencies)
+
+    started = time.perf_counter()
+    if ARGS.scenario == 'restart':
+        await restart_during(asyncio.gather(*[limited(index) for index in range(users)]), bot, latencies)
+    else:
+        await asyncio.gather(*[limited(index) for index in range(users)])
+    elapsed = time.perf_counter() - started
+
+    updates = sum(len(values) for values in latencies.values())
+    bot_calls = sum(services.bot_calls.values()) - calls_before
+    for stage, values in latencies.items():
+        print(
+            f"{concurrency:>11} {stage:<9} {len(values):>6} "
+            f"{statistics.median(values) * 1e3:>9.1f} {percentile(values, 0.99) * 1e3:>9.1f}"
+        )
+    print(f"{'':>11} {'total':<9} {updates:>6} updates in {elapsed:.2f}s - "
+          f"{updates / elapsed:.1f} updates/s, {bot_calls / elapsed:.1f} Bot API calls/s")
+
+async def main():
+    yt_dlp.YoutubeDL = FakeYoutubeDL
+    # Talk to the fake endpoint without the provider's rate limits
+    await app.llm_client.close()
+    app.llm_client = LLMClient(
+        create_backend('groq', api_key="benchmark", model=app.GROQ_MODEL, base_url=FAKE_URL),
+        requests_per_minute=1000000,
+        tokens_per_minute=1000000000,
+        concurrency=256,
+        max_retries=0
+    )
+    services = FakeServices()
+    runner = web.AppRunner(services.web_app())
+    await runner.setup()
+    await web.TCPSite(runner, '127.0.0.1', FAKE_PORT).start()
+
+    bot = Bot(BOT_TOKEN, base_url=f"{FAKE_URL}/bot")
+    await bot.initialize()
+    context = types.SimpleNamespace(bot=bot)
+
+    print(f"scenario={ARGS.scenario} llm_latency={ARGS.llm_latency}s llm_rate={ARGS.llm_tokens_per_second} tok/s "
+          f"bot_latency={ARGS.bot_latency}s extract_latency={ARGS.extract_latency}s")
+    print(f"{'concurrency':>11} {'stage':<9} {'count':>6} {'p50 ms':>9} {'p99 ms':>9}")
+    try:
+        for level, concurrency in enumerate(int(value) for value in ARGS.concurrency.split(',')):
+            await run_level(bot, context, services, level, concurrency)
+        print(f"Bot API calls by method: {dict(services.bot_calls)}")
+        print(f"LLM calls: {services.llm_calls}, prompt tokens: {services.prompt_tokens}")
+        if ARGS.scenario in ('download', 'both', 'restart'):
+            print(f"Download bytes transferred: {FakeYoutubeDL.bytes_transferred / (1024 * 1024):.1f} MB")
+    finally:
+        await bot.shutdown()
+        await app.on_shutdown(None)
+        await runner.cleanup()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,49 @@
+# Helpers for splitting long transcripts into pieces that fit the model context
+
+# Rough token estimate - about 4 bytes of UTF-8 per token holds up for both
+# English and Devanagari text without needing the model's tokenizer
+def estimate_tokens(text):
+    return len(text.encode('utf-8')) // 4 + 1
+
+# Split a transcript on segment (line) boundaries into chunks of at most max_tokens.
+# A single segment that is too long by itself is split on word boundaries.
+def split_transcript(transcript, max_tokens):
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for line in transcript.split('\n'):
+        line = line.strip()
+        if not line:
+            continue
+        for piece in _split_long_line(line, max_tokens):
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > max_tokens:
+                chunks.append('\n'.join(current))
+                current = []
+                current_tokens = 0
+            current.append(piece)
+            current_tokens += piece_tokens
+
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+def _split_long_line(line, max_tokens):
+    if estimate_tokens(line) <= max_tokens:
+        return [line]
+
+    pieces = []
+    words = []
+    words_tokens = 0
+    for word in line.split():
+        word_tokens = estimate_tokens(word)
+        if words and words_tokens + word_tokens > max_tokens:
+            pieces.append(' '.join(words))
+            words = []
+            words_tokens = 0
+        words.append(word)
+        words_tokens += word_tokens
+    if words:
+        pieces.append(' '.join(words))
+    return pieces
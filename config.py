@@ -0,0 +1,131 @@
+import os
+
+# Runtime tuning knobs, overridable through environment variables
+
+# Worker pool used for blocking yt-dlp / FFmpeg work - its size caps all the job kinds below together
+WORKER_POOL_SIZE = int(os.environ.get("WORKER_POOL_SIZE", "8"))
+
+# How many jobs of each kind may run at the same time inside the pool
+METADATA_CONCURRENCY = int(os.environ.get("METADATA_CONCURRENCY", "4"))
+DOWNLOAD_CONCURRENCY = int(os.environ.get("DOWNLOAD_CONCURRENCY", "2"))
+
+# Video metadata cache (keyed by YouTube video ID)
+METADATA_CACHE_SIZE = int(os.environ.get("METADATA_CACHE_SIZE", "256"))
+METADATA_CACHE_TTL = int(os.environ.get("METADATA_CACHE_TTL", "3600"))  # seconds - stream URLs expire after a few hours
+METADATA_CACHE_DB = os.environ.get("METADATA_CACHE_DB", "video_metadata.sqlite3")  # shared by webhook workers, empty keeps it in memory only
+
+# Shared HTTP client used to fetch subtitle tracks
+HTTP_MAX_CONNECTIONS = int(os.environ.get("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_TIMEOUT = float(os.environ.get("HTTP_TIMEOUT", "30"))
+
+# LLM calls - how many may run at once, provider rate limits and retries
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "4"))
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "groq")
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", "")  # point at a local fake server for benchmarks
+LLM_REQUESTS_PER_MINUTE = int(os.environ.get("LLM_REQUESTS_PER_MINUTE", "30"))
+LLM_TOKENS_PER_MINUTE = int(os.environ.get("LLM_TOKENS_PER_MINUTE", "6000"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "5"))
+
+# How transcripts too long for one prompt are chunked
+CHUNK_TOKEN_BUDGET = int(os.environ.get("CHUNK_TOKEN_BUDGET", "5000"))  # leaves room for the prompt and reply in an 8k context
+CHUNK_NOTES_MAX_TOKENS = int(os.environ.get("CHUNK_NOTES_MAX_TOKENS", "512"))
+
+# Persistent cache of LLM results per (video, choice, language, model, prompt version)
+RESULT_CACHE_DB = os.environ.get("RESULT_CACHE_DB", "llm_results.sqlite3")
+RESULT_CACHE_MAX_BYTES = int(os.environ.get("RESULT_CACHE_MAX_BYTES", str(50 * 1024 * 1024)))
+
+# Minimum seconds between edits of a message that is being streamed into
+STREAM_EDIT_INTERVAL = float(os.environ.get("STREAM_EDIT_INTERVAL", "1.5"))
+
+# Telegram file_ids of media we have already uploaded, keyed by (video ID, format)
+FILE_ID_DB = os.environ.get("FILE_ID_DB", "telegram_files.sqlite3")
+
+# Job scheduler - admission control for transcript, LLM and download work
+JOB_QUEUE_LIMIT = int(os.environ.get("JOB_QUEUE_LIMIT", "200"))  # queued jobs across all users before new ones are turned away
+JOB_PER_USER_LIMIT = int(os.environ.get("JOB_PER_USER_LIMIT", "2"))  # running jobs per user
+TEXT_JOB_CONCURRENCY = int(os.environ.get("TEXT_JOB_CONCURRENCY", "16"))
+DOWNLOAD_JOB_CONCURRENCY = int(os.environ.get("DOWNLOAD_JOB_CONCURRENCY", str(DOWNLOAD_CONCURRENCY)))
+
+# Per-user sessions and the shared per-video transcript store
+SESSION_DB = os.environ.get("SESSION_DB", "sessions.sqlite3")
+TRANSCRIPT_STORE_MAX_BYTES = int(os.environ.get("TRANSCRIPT_STORE_MAX_BYTES", str(200 * 1024 * 1024)))
+
+# Webhook mode - set WEBHOOK_URL to the public HTTPS base URL to enable it instead of polling
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_LISTEN = os.environ.get("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT = int(os.environ.get("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "telegram")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "4"))  # bot processes updates are spread across
+# Updates are routed to workers by user, so per-user state (sessions, prefetches, pending
+# batches) stays in one process. The SQLite stores are shared by all workers, but in-flight
+# work is only de-duplicated within a worker: two users in different workers asking for the
+# same video both run it, each in its own work directory.
+
+# Shared download workspace - finished files are kept for reuse up to a byte budget
+DOWNLOAD_DIR = os.environ.get("DOWNLOAD_DIR", "downloads")
+DOWNLOAD_CACHE_MAX_BYTES = int(os.environ.get("DOWNLOAD_CACHE_MAX_BYTES", str(5 * 1024 * 1024 * 1024)))
+DOWNLOAD_SCRATCH_DIR = os.environ.get("DOWNLOAD_SCRATCH_DIR", "")  # e.g. a tmpfs like /dev/shm/telegram_yt for partial files
+
+# Self-hosted Telegram Bot API server (e.g. http://localhost:8081). It must share the
+# filesystem with the bot: files are handed over by path and the upload limit is 2000 MB.
+TELEGRAM_API_SERVER = os.environ.get("TELEGRAM_API_SERVER", "")
+
+# Uploads larger than this are fitted by picking a smaller format, splitting or transcoding
+DEFAULT_UPLOAD_LIMIT_MB = 2000 if TELEGRAM_API_SERVER else 50
+UPLOAD_LIMIT_BYTES = int(os.environ.get("UPLOAD_LIMIT_BYTES", str(DEFAULT_UPLOAD_LIMIT_MB * 1024 * 1024)))
+MEDIA_FIT_MODE = os.environ.get("MEDIA_FIT_MODE", "split")  # 'split' (stream copy, no re-encode) or 'transcode'
+UPLOAD_CONCURRENCY = int(os.environ.get("UPLOAD_CONCURRENCY", "3"))  # parts uploaded at the same time
+
+# Download progress messages - each message is edited at most every PROGRESS_EDIT_INTERVAL
+# seconds, and all progress edits together stay under PROGRESS_EDITS_PER_SECOND
+PROGRESS_EDIT_INTERVAL = float(os.environ.get("PROGRESS_EDIT_INTERVAL", "5"))
+PROGRESS_EDITS_PER_SECOND = float(os.environ.get("PROGRESS_EDITS_PER_SECOND", "20"))
+
+# Queue position messages - coalesced so that only the latest position is shown, at most every
+# QUEUE_EDIT_INTERVAL seconds per message and QUEUE_EDITS_PER_SECOND across all of them
+QUEUE_EDIT_INTERVAL = float(os.environ.get("QUEUE_EDIT_INTERVAL", "10"))
+QUEUE_EDITS_PER_SECOND = float(os.environ.get("QUEUE_EDITS_PER_SECOND", "5"))
+
+# Prometheus-style metrics endpoint (0 disables it). In webhook mode worker N serves on METRICS_PORT + N.
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_LISTEN = os.environ.get("METRICS_LISTEN", "127.0.0.1")
+PROFILER_ENABLED = os.environ.get("PROFILER_ENABLED", "") == "1"  # exposes the sampling profiler on the metrics port
+
+# Clean up caption tracks (rolling repeats, markup, [Music] tags) before they reach the LLM
+TRANSCRIPT_NORMALIZE = os.environ.get("TRANSCRIPT_NORMALIZE", "1") == "1"
+
+# Speculative mode: precompute the most-clicked choice as soon as a link's transcript is ready,
+# at the lowest priority. Prefetches still queued after PREFETCH_MAX_WAIT seconds are dropped.
+SPECULATIVE_PREFETCH = os.environ.get("SPECULATIVE_PREFETCH", "") == "1"
+PREFETCH_CHOICE = os.environ.get("PREFETCH_CHOICE", "summary")
+PREFETCH_JOB_CONCURRENCY = int(os.environ.get("PREFETCH_JOB_CONCURRENCY", "4"))
+PREFETCH_MAX_WAIT = float(os.environ.get("PREFETCH_MAX_WAIT", "30"))
+
+# Free-text questions are answered from the RETRIEVAL_TOP_K transcript chunks (of about
+# RETRIEVAL_CHUNK_TOKENS each) that match the question best
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_CHUNK_TOKENS = int(os.environ.get("RETRIEVAL_CHUNK_TOKENS", "250"))
+
+# Batch mode for playlists and messages with several links
+BATCH_MAX_VIDEOS = int(os.environ.get("BATCH_MAX_VIDEOS", "25"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "3"))  # videos of one batch in flight at once
+
+# Speech-to-text fallback for videos without captions (an empty SPEECH_BACKEND disables it).
+# The audio is cut into SPEECH_CHUNK_SECONDS chunks overlapping by SPEECH_CHUNK_OVERLAP seconds,
+# and up to SPEECH_CONCURRENCY chunks are transcribed at once.
+SPEECH_BACKEND = os.environ.get("SPEECH_BACKEND", "groq")
+SPEECH_MODEL = os.environ.get("SPEECH_MODEL", "whisper-large-v3")
+SPEECH_CONCURRENCY = int(os.environ.get("SPEECH_CONCURRENCY", "4"))
+SPEECH_CHUNK_SECONDS = float(os.environ.get("SPEECH_CHUNK_SECONDS", "300"))
+SPEECH_CHUNK_OVERLAP = float(os.environ.get("SPEECH_CHUNK_OVERLAP", "5"))
+SPEECH_MAX_DURATION = int(os.environ.get("SPEECH_MAX_DURATION", str(3 * 3600)))  # longer videos are not transcribed
+AUDIO_CONCURRENCY = int(os.environ.get("AUDIO_CONCURRENCY", "4"))  # FFmpeg chunk cuts running in the worker pool
+
+# Journal of in-flight downloads, resumed from their partial files after a restart. Each
+# process refreshes its entries every JOURNAL_HEARTBEAT_SECONDS; entries of a process that
+# has been silent for JOURNAL_STALE_SECONDS are taken over by another one.
+JOB_JOURNAL_DB = os.environ.get("JOB_JOURNAL_DB", "jobs.sqlite3")
+JOURNAL_HEARTBEAT_SECONDS = float(os.environ.get("JOURNAL_HEARTBEAT_SECONDS", "30"))
+JOURNAL_STALE_SECONDS = float(os.environ.get("JOURNAL_STALE_SECONDS", "120"))
+DRAIN_TIMEOUT = float(os.environ.get("DRAIN_TIMEOUT", "120"))  # seconds running downloads get to finish on SIGTERM
@@ -0,0 +1,138 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# A download someone is waiting for - enough to pick it up again after a restart
+class JournaledDownload(NamedTuple):
+    job_id: int
+    chat_id: int
+    user_id: int
+    url: str
+    video_id: str
+    format_id: str
+    status_message_id: int
+    user_lang: str
+    attempts: int
+
+# Name of a journaled job's work directory - stable, so a resumed job finds its partial files
+def work_dir_name(job_id):
+    return f"job{job_id}"
+
+# SQLite journal of in-flight downloads. A job is added before it is queued and
+# removed once the user got a reply, so whatever is left after a restart was
+# interrupted. Each row is owned by one process, which keeps its heartbeat fresh;
+# rows that were released on shutdown or whose owner stopped beating are claimed
+# by the next process that looks.
+class DownloadJournal:
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._db = storage.connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS download_jobs ("
+            "job_id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, user_id INTEGER NOT NULL, "
+            "url TEXT NOT NULL, video_id TEXT NOT NULL, format_id TEXT NOT NULL, status_message_id INTEGER NOT NULL, "
+            "user_lang TEXT NOT NULL, owner TEXT, heartbeat REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "created_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    # Returns the new job ID, or None if it could not be written
+    def add(self, owner, chat_id, user_id, url, video_id, format_id, status_message_id, user_lang):
+        now = time.time()
+        with self._lock:
+            try:
+                cursor = self._db.execute(
+                    "INSERT INTO download_jobs (chat_id, user_id, url, video_id, format_id, status_message_id, "
+                    "user_lang, owner, heartbeat, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (chat_id, user_id, url, video_id, format_id, status_message_id, user_lang, owner, now, now),
+                )
+                self._db.commit()
+                return cursor.lastrowid
+            except sqlite3.Error as e:
+                logger.error(f"Error writing download journal: {e}")
+                return None
+
+    def remove(self, job_id):
+        with self._lock:
+            try:
+                self._db.execute("DELETE FROM download_jobs WHERE job_id = ?", (job_id,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing download journal: {e}")
+
+    # Mark every job of `owner` as still being worked on
+    def touch(self, owner):
+        with self._lock:
+            try:
+                self._db.execute("UPDATE download_jobs SET heartbeat = ? WHERE owner = ?", (time.time(), owner))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing download journal: {e}")
+
+    # Hand the jobs of `owner` over to whichever process starts next
+    def release(self, owner):
+        with self._lock:
+            try:
+                self._db.execute("UPDATE download_jobs SET owner = NULL WHERE owner = ?", (owner,))
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing download journal: {e}")
+
+    # Take over released jobs and jobs whose owner has not beaten for `stale_after`
+    # seconds, that `accept` says this process handles. Returns the jobs to resume
+    # and the jobs that were already resumed `max_attempts` times - the owner tells
+    # their users the download was given up, then removes them.
+    def claim(self, owner, stale_after, accept=lambda job: True, max_attempts=3):
+        now = time.time()
+        claimed = []
+        given_up = []
+        with self._lock:
+            try:
+                rows = self._db.execute(
+                    "SELECT job_id, chat_id, user_id, url, video_id, format_id, status_message_id, user_lang, attempts "
+                    "FROM download_jobs WHERE owner IS NULL OR heartbeat < ? ORDER BY job_id",
+                    (now - stale_after,),
+                ).fetchall()
+                for row in rows:
+                    job = JournaledDownload(*row)
+                    if not accept(job):
+                        continue
+                    resume = job.attempts < max_attempts
+                    # Another process may have claimed it since the SELECT
+                    cursor = self._db.execute(
+                        "UPDATE download_jobs SET owner = ?, heartbeat = ?, attempts = attempts + ? "
+                        "WHERE job_id = ? AND (owner IS NULL OR heartbeat < ?)",
+                        (owner, now, int(resume), job.job_id, now - stale_after),
+                    )
+                    if not cursor.rowcount:
+                        continue
+                    if resume:
+                        claimed.append(job._replace(attempts=job.attempts + 1))
+                    else:
+                        given_up.append(job)
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading download journal: {e}")
+                return [], []
+        return claimed, given_up
+
+    # (video ID, format_id, work directory name) of every journaled job - their
+    # partial files are worth keeping
+    def job_dirs(self):
+        with self._lock:
+            try:
+                rows = self._db.execute("SELECT job_id, video_id, format_id FROM download_jobs").fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading download journal: {e}")
+                return set()
+        return {(video_id, format_id, work_dir_name(job_id)) for job_id, video_id, format_id in rows}
+
+    def close(self):
+        with self._lock:
+            self._db.close()
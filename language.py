@@ -0,0 +1,75 @@
+import re
+from functools import lru_cache
+
+# Script-based language detection for the bot's three languages. Devanagari
+# text is Hindi; Latin text is Hinglish when enough of its words are common
+# romanized Hindi, otherwise English. Deterministic, no model to load.
+
+URL_REGEX = re.compile(r'(https?://|www\.)\S+', re.IGNORECASE)
+COMMAND_REGEX = re.compile(r'(^|\s)/\w+(@\w+)?')
+WORD_REGEX = re.compile(r'[a-z]+')
+
+DEVANAGARI_START = 0x0900
+DEVANAGARI_END = 0x097F
+
+# Share of letters that must be Devanagari for a message to count as Hindi
+DEVANAGARI_THRESHOLD = 0.5
+
+# Share of words (and minimum count) that must be romanized Hindi for Hinglish
+HINGLISH_THRESHOLD = 0.25
+HINGLISH_MIN_WORDS = 2
+
+# Common romanized Hindi words that are rarely English words
+HINGLISH_LEXICON = frozenset("""
+aap aapka aapke aapki aaj abhi acha accha achha agar apna apne apni aur
+bahut bata batao batayein bhai bhi bhejo bol bolo chahiye chahte chalo
+dekho dijiye diya dobara ek gaya gayi hai hain hoga hona hota hoti hua hum
+humein isko iska iske iski jaldi jab jo kab kaha kahan kaise kar karo karna
+karke karein karega kare kaun kya kyu kyun kyunki lekin liya liye matlab
+mera mere meri mein mujhe naam nahi nahin nahi hai pata raha rahe rahi sab
+sakta sakte sakti samajh samjhao samjha sirf tha thi theek thik tum tumhara
+unka unke usko uska uske vaise vo wala wale wali woh yaar yahan yeh
+ka ki ke ko se ne main hu hoon hun ho ja jaa jao jana jaana jata jaata jate jaate
+aa aana aaya aaye aayi ab phir kal kuch koi kitna kitne kitni bohot bahot thoda
+zyada jyada haan ji wahan waha yaha ghar kaam baat baatein sahi galat bilkul sach
+tera teri tere tujhe hamara hamare hamari unhe unko mujhko dekh dekha dekhna suna
+samjha samjhi padh padhna likh likhna khana pani logon kyonki
+""".split())
+
+# Default when there is nothing to go on (bare URLs, commands)
+DEFAULT_LANGUAGE = 'en'
+
+# Remove URLs and bot commands, which say nothing about the user's language
+def strip_non_language(text):
+    return COMMAND_REGEX.sub(' ', URL_REGEX.sub(' ', text)).strip()
+
+@lru_cache(maxsize=4096)
+def _classify(text):
+    devanagari = 0
+    latin = 0
+    for char in text:
+        code = ord(char)
+        if DEVANAGARI_START <= code <= DEVANAGARI_END:
+            devanagari += 1
+        elif char.isascii() and char.isalpha():
+            latin += 1
+
+    if devanagari + latin == 0:
+        return DEFAULT_LANGUAGE
+    if devanagari / (devanagari + latin) >= DEVANAGARI_THRESHOLD:
+        return 'hi'
+
+    words = WORD_REGEX.findall(text.lower())
+    hindi_words = sum(1 for word in words if word in HINGLISH_LEXICON)
+    if hindi_words >= HINGLISH_MIN_WORDS and hindi_words / len(words) >= HINGLISH_THRESHOLD:
+        return 'hi-en'
+    return 'en'
+
+# Detect the language of a user message as one of 'en', 'hi' or 'hi-en'
+def detect_language(text):
+    if not text:
+        return DEFAULT_LANGUAGE
+    text = strip_non_language(text)
+    if not text:
+        return DEFAULT_LANGUAGE
+    return _classify(text)
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import random
+import time
+
+import groq
+import httpx
+
+from chunking import estimate_tokens
+from config import HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Raised when a request still fails after all retries
+class LLMError(Exception):
+    pass
+
+# Token bucket that refills continuously up to `capacity` per minute
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds until `amount` is available (0 if it is available now)
+    def wait_time(self, amount):
+        self._refill()
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= amount
+
+    def give_back(self, amount):
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+# Admits requests in arrival order while keeping both requests-per-minute and
+# tokens-per-minute under the provider limits
+class RateLimitScheduler:
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens):
+        tokens = min(tokens, self.tokens.capacity)
+        async with self._lock:
+            while True:
+                delay = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if delay <= 0:
+                    self.requests.take(1)
+                    self.tokens.take(tokens)
+                    return tokens
+                await asyncio.sleep(delay)
+
+    # Return tokens that were reserved but not used by the response
+    def settle(self, reserved, used):
+        if used is not None and used < reserved:
+            self.tokens.give_back(reserved - used)
+
+# Backend interface - complete() returns (text, total_tokens or None),
+# stream() is an async generator of text deltas
+class LLMBackend:
+    model = None
+
+    async def complete(self, system_message, prompt, max_tokens, temperature=0.7):
+        raise NotImplementedError
+
+    async def stream(self, system_message, prompt, max_tokens, temperature=0.7):
+        text, _ = await self.complete(system_message, prompt, max_tokens, temperature)
+        yield text
+
+    async def close(self):
+        pass
+
+# Groq chat completions over a shared, pooled HTTP client. base_url lets the
+# same backend talk to any OpenAI-compatible server, such as a local fake.
+class GroqBackend(LLMBackend):
+    def __init__(self, api_key, model, base_url=None, max_connections=20):
+        self.model = model
+        self._http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT * 4,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._client = groq.AsyncGroq(
+            api_key=api_key,
+            base_url=base_url or None,
+            max_retries=0,  # retries are handled by LLMClient
+            http_client=self._http_client,
+        )
+
+    async def complete(self, system_message, prompt, max_tokens, temperature=0.7):
+        response = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens
+        )
+        usage = getattr(response, 'usage', None)
+        return response.choices[0].message.content, getattr(usage, 'total_tokens', None)
+
+    async def stream(self, system_message, prompt, max_tokens, temperature=0.7):
+        stream = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ],
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def close(self):
+        await self._client.close()
+        await self._http_client.aclose()
+
+BACKENDS = {
+    'groq': GroqBackend,
+}
+
+def create_backend(name, **kwargs):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown LLM backend: {name}")
+    return BACKENDS[name](**kwargs)
+
+# Rate limits and transient server errors are worth retrying, bad requests are not
+def is_retryable(error):
+    status = getattr(error, 'status_code', None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(error, (groq.APIConnectionError, httpx.TransportError, asyncio.TimeoutError))
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+# Async LLM client: a concurrency cap, rate-limit aware scheduling and jittered retries
+class LLMClient:
+    def __init__(self, backend, requests_per_minute, tokens_per_minute, concurrency=4, max_retries=5):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.scheduler = RateLimitScheduler(requests_per_minute, tokens_per_minute)
+        self._concurrency = concurrency
+        self._semaphore = None
+
+    @property
+    def model(self):
+        return self.backend.model
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        return self._semaphore
+
+    async def _backoff(self, error, attempt):
+        # Full jitter backoff, but never sooner than the server asked for
+        delay = random.uniform(0, min(30.0, 2 ** attempt))
+        delay = max(delay, _retry_after(error) or 0)
+        logger.warning(f"LLM request failed ({error}), retrying in {delay:.1f}s")
+        await asyncio.sleep(delay)
+
+    async def complete(self, system_message, prompt, max_tokens=1024):
+        estimate = estimate_tokens(system_message) + estimate_tokens(prompt) + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            reserved = await self.scheduler.acquire(estimate)
+            try:
+                async with self._get_semaphore():
+                    text, used = await self.backend.complete(system_message, prompt, max_tokens)
+                self.scheduler.settle(reserved, used)
+                return text
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise LLMError(str(e)) from e
+                await self._backoff(e, attempt)
+
+    # Stream a completion as text deltas. Failures are retried only until the
+    # first delta has been yielded - after that the error is raised to the caller.
+    async def stream(self, system_message, prompt, max_tokens=1024):
+        estimate = estimate_tokens(system_message) + estimate_tokens(prompt) + max_tokens
+
+        for attempt in range(self.max_retries + 1):
+            await self.scheduler.acquire(estimate)
+            started = False
+            try:
+                async with self._get_semaphore():
+                    async for delta in self.backend.stream(system_message, prompt, max_tokens):
+                        started = True
+                        yield delta
+                return
+            except Exception as e:
+                if started or not is_retryable(e) or attempt == self.max_retries:
+                    raise LLMError(str(e)) from e
+                await self._backoff(e, attempt)
+
+    async def close(self):
+        await self.backend.close()
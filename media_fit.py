@@ -0,0 +1,159 @@
+import logging
+import os
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+# Aim a little under the limit - container overhead and keyframe placement add a few percent
+SIZE_SAFETY = 0.9
+
+# Audio bitrate used when merging video-only formats, and the lowest mp3 quality we'll pick
+MERGE_AUDIO_KBPS = 128
+MIN_MP3_KBPS = 64
+MAX_MP3_KBPS = 192
+
+# Below this video bitrate transcoding looks too bad - split instead
+MIN_TRANSCODE_VIDEO_KBPS = 200
+
+MAX_SPLIT_ATTEMPTS = 4
+
+# Estimated size of a yt-dlp format in bytes, from filesize metadata or bitrate x duration
+def estimate_format_size(fmt, duration):
+    size = fmt.get('filesize') or fmt.get('filesize_approx')
+    if size:
+        return size
+    if fmt.get('tbr') and duration:
+        return int(fmt['tbr'] * 1000 / 8 * duration)
+    return None
+
+# Pick a yt-dlp format string for the video formats whose estimated size fits
+# in limit_bytes. Returns None when the usual choice already fits, or when
+# there isn't enough metadata to tell.
+def choose_video_format(info, max_height, limit_bytes):
+    duration = info.get('duration')
+    formats = info.get('formats') or []
+    budget = limit_bytes * SIZE_SAFETY
+
+    audio = [f for f in formats if f.get('vcodec') == 'none' and f.get('acodec') not in (None, 'none')]
+    videos = [f for f in formats if f.get('vcodec') not in (None, 'none') and (max_height is None or (f.get('height') or 0) <= max_height)]
+    if not videos:
+        return None
+
+    # Audio tracks to pair with video-only formats: the best one up to
+    # MERGE_AUDIO_KBPS, and the smallest one for when space is tight
+    sized_audio = [(estimate_format_size(f, duration), f) for f in audio]
+    sized_audio = [(size, f) for size, f in sized_audio if size]
+    audio_choices = []
+    if sized_audio:
+        near_target = [item for item in sized_audio if (item[1].get('abr') or 0) <= MERGE_AUDIO_KBPS] or sized_audio
+        audio_choices.append(max(near_target, key=lambda item: item[1].get('abr') or 0))
+        smallest = min(sized_audio, key=lambda item: item[0])
+        if smallest is not audio_choices[0]:
+            audio_choices.append(smallest)
+
+    candidates = []
+    for fmt in videos:
+        size = estimate_format_size(fmt, duration)
+        if size is None:
+            continue
+        if fmt.get('acodec') in (None, 'none'):
+            for audio_size, audio_fmt in audio_choices:
+                candidates.append((size + audio_size, fmt, f"{fmt['format_id']}+{audio_fmt['format_id']}", audio_fmt.get('abr') or 0))
+        else:
+            candidates.append((size, fmt, fmt['format_id'], fmt.get('abr') or 0))
+    if not candidates:
+        return None
+
+    # Best quality first: height, then video bitrate, then audio bitrate
+    candidates.sort(key=lambda item: (item[1].get('height') or 0, item[1].get('tbr') or 0, item[3]), reverse=True)
+    if candidates[0][0] <= budget:
+        return None
+    for size, fmt, selector, _ in candidates:
+        if size <= budget:
+            logger.info(f"Picked format {selector} (~{size / (1024 * 1024):.1f} MB) to stay under the upload limit")
+            return selector
+    return None
+
+# Highest mp3 quality (kbps) that keeps the audio under the limit
+def choose_mp3_quality(duration, limit_bytes):
+    if not duration:
+        return MAX_MP3_KBPS
+    kbps = int(limit_bytes * SIZE_SAFETY * 8 / duration / 1000)
+    return max(MIN_MP3_KBPS, min(MAX_MP3_KBPS, kbps))
+
+def probe_duration(path):
+    result = subprocess.run(
+        ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1', path],
+        capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip())
+
+# Split a file into parts under limit_bytes with stream copy (no re-encode).
+# Cuts land on keyframes, so parts vary in size - retry with shorter parts if needed.
+def split_media(path, limit_bytes, duration=None):
+    duration = duration or probe_duration(path)
+    size = os.path.getsize(path)
+    base, ext = os.path.splitext(path)
+    segment_time = max(1, int(duration * limit_bytes * SIZE_SAFETY / size))
+
+    for _ in range(MAX_SPLIT_ATTEMPTS):
+        pattern = f"{base}_part%03d{ext}"
+        _remove_parts(base, ext)
+        subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path,
+             '-map', '0', '-c', 'copy', '-f', 'segment', '-segment_time', str(segment_time),
+             '-reset_timestamps', '1', pattern],
+            check=True
+        )
+        parts = _list_parts(base, ext)
+        if parts and all(os.path.getsize(part) <= limit_bytes for part in parts):
+            return parts
+        segment_time = max(1, int(segment_time * 0.75))
+
+    _remove_parts(base, ext)
+    return []
+
+# Re-encode to the bitrate that fits the limit. Returns None if that bitrate would be unwatchable.
+def transcode_to_size(path, limit_bytes, duration=None):
+    duration = duration or probe_duration(path)
+    total_kbps = limit_bytes * SIZE_SAFETY * 8 / duration / 1000
+    video_kbps = int(total_kbps - MERGE_AUDIO_KBPS)
+    if video_kbps < MIN_TRANSCODE_VIDEO_KBPS:
+        return None
+
+    base, _ = os.path.splitext(path)
+    output = f"{base}_fit.mp4"
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-i', path,
+         '-c:v', 'libx264', '-preset', 'veryfast', '-b:v', f'{video_kbps}k',
+         '-maxrate', f'{video_kbps}k', '-bufsize', f'{video_kbps * 2}k',
+         '-c:a', 'aac', '-b:a', f'{MERGE_AUDIO_KBPS}k', '-movflags', '+faststart', output],
+        check=True
+    )
+    if os.path.getsize(output) <= limit_bytes:
+        return output
+    os.remove(output)
+    return None
+
+# Make a downloaded file deliverable: returns the list of files to upload
+# (just the original if it already fits, [] if it can't be made to fit)
+def fit_media_to_limit(path, limit_bytes, duration=None, mode='split', audio_only=False):
+    if os.path.getsize(path) <= limit_bytes:
+        return [path]
+    if mode == 'transcode' and not audio_only:
+        output = transcode_to_size(path, limit_bytes, duration)
+        if output is not None:
+            return [output]
+    return split_media(path, limit_bytes, duration)
+
+def _list_parts(base, ext):
+    directory = os.path.dirname(base) or '.'
+    prefix = os.path.basename(base) + '_part'
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.startswith(prefix) and name.endswith(ext)
+    )
+
+def _remove_parts(base, ext):
+    for part in _list_parts(base, ext):
+        os.remove(part)
@@ -0,0 +1,76 @@
+import logging
+import sqlite3
+import threading
+import time
+from typing import NamedTuple
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# A file Telegram already has - re-sending it by file_id needs no upload
+class StoredMedia(NamedTuple):
+    file_id: str
+    media_type: str  # 'audio', 'video' or 'document'
+    title: str
+
+# SQLite map of (video ID, format_id) -> Telegram file_ids. Downloads that had
+# to be split for the upload limit are stored as several ordered parts.
+class FileIdStore:
+    def __init__(self, db_path):
+        self._lock = threading.Lock()
+        self._db = storage.connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS telegram_media ("
+            "video_id TEXT NOT NULL, format_id TEXT NOT NULL, part INTEGER NOT NULL, file_id TEXT NOT NULL, "
+            "media_type TEXT NOT NULL, title TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (video_id, format_id, part))"
+        )
+        self._db.commit()
+
+    # Returns the list of StoredMedia parts in order ([] if unknown)
+    def get(self, video_id, format_id):
+        with self._lock:
+            try:
+                rows = self._db.execute(
+                    "SELECT file_id, media_type, title FROM telegram_media WHERE video_id = ? AND format_id = ? "
+                    "ORDER BY part",
+                    (video_id, format_id),
+                ).fetchall()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading file_id store: {e}")
+                return []
+        return [StoredMedia(*row) for row in rows]
+
+    def put(self, video_id, format_id, media_parts):
+        now = time.time()
+        with self._lock:
+            try:
+                self._db.execute(
+                    "DELETE FROM telegram_media WHERE video_id = ? AND format_id = ?", (video_id, format_id)
+                )
+                self._db.executemany(
+                    "INSERT INTO telegram_media "
+                    "(video_id, format_id, part, file_id, media_type, title, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (video_id, format_id, part, media.file_id, media.media_type, media.title, now)
+                        for part, media in enumerate(media_parts)
+                    ],
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing file_id store: {e}")
+
+    def delete(self, video_id, format_id):
+        with self._lock:
+            try:
+                self._db.execute(
+                    "DELETE FROM telegram_media WHERE video_id = ? AND format_id = ?", (video_id, format_id)
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing file_id store: {e}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
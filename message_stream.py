@@ -0,0 +1,87 @@
+import asyncio
+import logging
+import time
+
+from telegram.error import BadRequest, RetryAfter
+
+from config import STREAM_EDIT_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Find where to cut text so the first part fits in `limit` characters,
+# preferring a paragraph break, then a line break, then a space
+def find_split_point(text, limit):
+    if len(text) <= limit:
+        return len(text)
+    for separator in ('\n\n', '\n', ' '):
+        index = text.rfind(separator, 0, limit)
+        if index > limit // 4:
+            return index
+    return limit
+
+# Progressively edits a Telegram message as text streams in. Edits are throttled
+# to one per `min_interval` seconds, and once the text outgrows one message the
+# rest rolls over into new messages (created with `send_new_message`).
+class StreamingMessage:
+    def __init__(self, message, header, send_new_message, min_interval=STREAM_EDIT_INTERVAL, limit=TELEGRAM_MESSAGE_LIMIT):
+        self.min_interval = min_interval
+        self.limit = limit
+        self._message = message
+        self._send_new_message = send_new_message
+        self._prefix = f"{header}\n\n" if header else ""
+        self._text = ""       # text that belongs to the current message
+        self._streamed = ""   # everything appended so far
+        self._shown = None    # what the current message currently displays
+        self._last_edit = 0.0
+
+    async def append(self, delta):
+        self._text += delta
+        self._streamed += delta
+        if time.monotonic() - self._last_edit >= self.min_interval:
+            await self._flush(final=False)
+
+    # Show the final text. If it differs from what was streamed (a cached result
+    # or an error message), it replaces or extends the streamed text.
+    async def finish(self, final_text=None):
+        if final_text is not None and final_text != self._streamed:
+            if not self._streamed:
+                self._text = final_text
+            elif final_text.startswith(self._streamed):
+                self._text += final_text[len(self._streamed):]
+            else:
+                self._text += f"\n\n{final_text}"
+        await self._flush(final=True)
+
+    async def _flush(self, final):
+        while len(self._prefix) + len(self._text) > self.limit:
+            cut = find_split_point(self._text, self.limit - len(self._prefix))
+            head, self._text = self._text[:cut].rstrip(), self._text[cut:].lstrip()
+            await self._edit(self._prefix + head, final=True)
+            self._prefix = ""
+            self._message = await self._send_new_message("…")
+            self._shown = "…"
+
+        if self._text or self._prefix:
+            await self._edit(self._prefix + self._text, final=final)
+
+    async def _edit(self, text, final):
+        if text == self._shown or not text.strip():
+            return
+        while True:
+            try:
+                await self._message.edit_text(text)
+                break
+            except RetryAfter as e:
+                # Intermediate edits can simply be skipped, the next one catches up
+                if not final:
+                    return
+                retry_after = e.retry_after
+                await asyncio.sleep(getattr(retry_after, 'total_seconds', lambda: retry_after)())
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    raise
+                break
+        self._shown = text
+        self._last_edit = time.monotonic()
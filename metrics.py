@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+from contextlib import contextmanager
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (seconds) of the latency histogram buckets - stages range from
+# cached lookups to long downloads
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    pairs = ",".join(f'{name}="{value}"' for name, value in labels)
+    return '{' + pairs + '}'
+
+# Minimal Prometheus-style metric families. Values are keyed by a sorted tuple of
+# (label, value) pairs, and updates are locked since stages also run in worker threads.
+class _Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(labels)} {value}")
+        return lines
+
+class CounterMetric(_Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class GaugeMetric(_Metric):
+    kind = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+class HistogramMetric(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            counts, total, observations = self._values.get(key, ([0] * len(self.buckets), 0.0, 0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for labels, (counts, total, observations) in sorted(self._values.items()):
+                for bound, count in zip(self.buckets, counts):
+                    lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', bound),))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(labels + (('le', '+Inf'),))} {observations}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {round(total, 6)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {observations}")
+        return lines
+
+STAGE_SECONDS = HistogramMetric('ytbot_stage_duration_seconds', 'Time spent in each processing stage')
+STAGE_IN_FLIGHT = GaugeMetric('ytbot_stage_in_flight', 'Stages currently running')
+STAGE_ERRORS = CounterMetric('ytbot_stage_errors_total', 'Stages that ended with an exception')
+TRANSCRIPT_TOKENS = CounterMetric('ytbot_transcript_tokens_total', 'Estimated transcript tokens before and after normalization')
+
+_metrics = [STAGE_SECONDS, STAGE_IN_FLIGHT, STAGE_ERRORS, TRANSCRIPT_TOKENS]
+
+# Callables returning {metric name: (help, {label pairs tuple: value}, kind)}, read at
+# scrape time for values other modules already keep (queue depths, cache stats). The
+# kind is 'gauge' or 'counter'; counter names get the conventional _total suffix.
+_collectors = []
+
+def register_collector(collector):
+    _collectors.append(collector)
+
+# Timing of one stage run - started explicitly so it also works from yt-dlp hooks
+class StageTimer:
+    def __init__(self, stage, format_id=''):
+        self.labels = {'stage': stage, 'format_id': format_id}
+        self.started = time.perf_counter()
+        STAGE_IN_FLIGHT.inc(stage=stage)
+
+    def stop(self, error=False):
+        STAGE_IN_FLIGHT.dec(stage=self.labels['stage'])
+        STAGE_SECONDS.observe(time.perf_counter() - self.started, **self.labels)
+        if error:
+            STAGE_ERRORS.inc(**self.labels)
+
+# Time a block of code as a stage: latency, in-flight count and errors
+@contextmanager
+def track_stage(stage, format_id=''):
+    timer = StageTimer(stage, format_id)
+    try:
+        yield
+    except asyncio.CancelledError:
+        timer.stop()
+        raise
+    except Exception:
+        timer.stop(error=True)
+        raise
+    else:
+        timer.stop()
+
+def render_metrics():
+    lines = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            logger.warning(f"Metrics collector failed: {e}")
+            continue
+        for name, (help_text, samples, kind) in families.items():
+            if kind == 'counter' and not name.endswith('_total'):
+                name = f"{name}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples.items():
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+# Samples the stacks of every thread at a fixed interval and counts them in the
+# collapsed "frame;frame;frame count" format that flame graph tools read
+class SamplingProfiler:
+    def __init__(self):
+        self._stacks = Counter()
+        self._thread = None
+        self._stop = threading.Event()
+        self.samples = 0
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, interval=0.01):
+        if self.running:
+            return False
+        self._stacks.clear()
+        self.samples = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample, args=(interval,), name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if not self.running:
+            return ''
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        return "\n".join(f"{stack} {count}" for stack, count in self._stacks.most_common()) + "\n"
+
+    def _sample(self, interval):
+        own_id = threading.get_ident()
+        while not self._stop.wait(interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                frames = traceback.extract_stack(frame)
+                self._stacks[";".join(f"{entry.name} ({entry.filename}:{entry.lineno})" for entry in frames)] += 1
+            self.samples += 1
+
+# HTTP endpoint serving /metrics, plus /debug/profile/start and /debug/profile/stop
+# when the profiler is enabled
+class MetricsServer:
+    def __init__(self, listen, port, profiler_enabled=False):
+        self.listen = listen
+        self.port = port
+        self.profiler = SamplingProfiler() if profiler_enabled else None
+        self._runner = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle_metrics)
+        if self.profiler is not None:
+            app.router.add_post('/debug/profile/start', self._handle_profile_start)
+            app.router.add_post('/debug/profile/stop', self._handle_profile_stop)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.listen, self.port).start()
+        logger.info(f"Serving metrics on {self.listen}:{self.port}")
+
+    async def stop(self):
+        if self.profiler is not None:
+            self.profiler.stop()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=render_metrics(), content_type='text/plain', charset='utf-8')
+
+    async def _handle_profile_start(self, request):
+        interval = float(request.query.get('interval', '0.01'))
+        if not self.profiler.start(interval):
+            return web.Response(status=409, text="Profiler is already running\n")
+        logger.info(f"Sampling profiler started (every {interval}s)")
+        return web.Response(text="Profiler started\n")
+
+    async def _handle_profile_stop(self, request):
+        if not self.profiler.running:
+            return web.Response(status=409, text="Profiler is not running\n")
+        samples = self.profiler.samples
+        # Joining the sampler thread can take up to one interval
+        stacks = await asyncio.get_running_loop().run_in_executor(None, self.profiler.stop)
+        logger.info(f"Sampling profiler stopped after {samples} samples")
+        return web.Response(text=stacks, content_type='text/plain', charset='utf-8')
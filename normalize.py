@@ -0,0 +1,106 @@
+import html
+import re
+
+from chunking import estimate_tokens
+from subtitles import Segment
+
+# Clean-up of caption segments before they are sent to the LLM. Auto-generated
+# (rolling) captions repeat each line in the next cue and are full of markup and
+# sound annotations, which cost prompt tokens without adding any content.
+
+TAG_REGEX = re.compile(r'<[^>]*>')
+ANNOTATION_REGEX = re.compile(r'\[[^\]]*\]|\([^)]*\b(?:music|applause|laughter|laughs|inaudible)\b[^)]*\)', re.IGNORECASE)
+SYMBOL_REGEX = re.compile(r'[♪♫♬]+|^\s*>>\s*|\s>>\s')
+FILLER_REGEX = re.compile(r'\b(?:u+m+|u+h+|e+r+m+|h+m+)\b[,.]?\s*', re.IGNORECASE)
+WHITESPACE_REGEX = re.compile(r'\s+')
+
+# Sentence ends - Latin punctuation and the Devanagari danda
+SENTENCE_END_REGEX = re.compile(r'[.?!।]["\')]?$')
+
+# A cue starting with at least this many of the previous words is a rolling repeat
+MIN_OVERLAP_WORDS = 2
+
+# How far back (in words) a cue is compared for repeats
+RECENT_WORDS = 100
+
+# YouTube follows each rolling cue with a snapshot cue this short that only
+# repeats the line on screen
+SNAPSHOT_CUE_SECONDS = 0.05
+
+# Auto captions have no punctuation - a pause this long (seconds) or this many
+# words also ends a sentence
+SENTENCE_GAP = 1.5
+MAX_SENTENCE_WORDS = 40
+
+def clean_text(text):
+    text = html.unescape(TAG_REGEX.sub('', text))
+    text = ANNOTATION_REGEX.sub(' ', text)
+    text = SYMBOL_REGEX.sub(' ', text)
+    text = FILLER_REGEX.sub('', text)
+    return WHITESPACE_REGEX.sub(' ', text).strip()
+
+def _word_key(word):
+    return word.lower().strip('.,?!।"\'')
+
+# Number of words at the start of `words` that repeat the end of `tail`. A
+# single repeated word is only a repeat if the cue is `on_screen_repeat` (shown
+# while the previous one still was) - "no. no." are two words otherwise.
+def _overlap(tail, words, on_screen_repeat=False):
+    keys = [_word_key(word) for word in words]
+    tail_keys = [_word_key(word) for word in tail[-len(words):]]
+    for size in range(min(len(keys), len(tail_keys)), 0, -1):
+        if tail_keys[-size:] != keys[:size]:
+            continue
+        if size >= MIN_OVERLAP_WORDS or (size == len(keys) and on_screen_repeat):
+            return size
+    return 0
+
+# De-duplicate overlapping cues and merge what is left into one segment per sentence
+def normalize_segments(segments):
+    sentences = []
+    words = []
+    recent = []  # last words emitted, across sentence boundaries
+    start = end = None
+    previous_end = None
+
+    def flush():
+        if words:
+            sentences.append(Segment(start, end, ' '.join(words)))
+        words.clear()
+
+    for segment in segments:
+        cue_words = clean_text(segment.text).split()
+        if not cue_words:
+            continue
+
+        on_screen_repeat = previous_end is not None and (
+            segment.start < previous_end or segment.end - segment.start <= SNAPSHOT_CUE_SECONDS
+        )
+        cue_words = cue_words[_overlap(recent, cue_words, on_screen_repeat):]
+        recent = (recent + cue_words)[-RECENT_WORDS:]
+        gap = segment.start - previous_end if previous_end is not None else 0
+        previous_end = segment.end
+        if not cue_words:
+            continue
+
+        if words and gap > SENTENCE_GAP:
+            flush()
+        if not words:
+            start = segment.start
+
+        for word in cue_words:
+            words.append(word)
+            end = segment.end
+            if SENTENCE_END_REGEX.search(word) or len(words) >= MAX_SENTENCE_WORDS:
+                flush()
+                start = segment.start
+
+    flush()
+    return sentences
+
+# Normalize segments into sentences, returning them with the estimated token
+# count of the transcript text before and after
+def normalize_transcript(segments):
+    raw_tokens = estimate_tokens("\n".join(segment.text for segment in segments))
+    sentences = normalize_segments(segments)
+    return sentences, raw_tokens, estimate_tokens("\n".join(sentence.text for sentence in sentences))
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telegram.error import BadRequest, RetryAfter
+from yt_dlp.utils import DownloadCancelled
+
+from config import PROGRESS_EDIT_INTERVAL, PROGRESS_EDITS_PER_SECOND
+
+logger = logging.getLogger(__name__)
+
+# Progress of one download, fed by yt-dlp hooks from a worker thread.
+# `render` turns the latest state dict into the status message text.
+class ProgressJob:
+    def __init__(self, message, render, name=''):
+        self.message = message
+        self.render = render
+        self.name = name
+        self.state = None
+        self.dirty = False
+        self.closed = False
+        self.last_edit = 0.0
+        self.started = time.monotonic()
+        self.bytes_done = 0
+        self.aborted = False
+        self.lock = asyncio.Lock()
+
+    # yt-dlp progress_hooks callback (runs in the worker thread). Raising here is how
+    # a running download is stopped - yt-dlp keeps the .part file for a later resume.
+    def on_progress(self, d):
+        if self.aborted:
+            raise DownloadCancelled(f"Download of {self.name} interrupted")
+        status = d.get('status')
+        if status == 'downloading':
+            self.state = {
+                'stage': 'downloading',
+                'downloaded': d.get('downloaded_bytes') or 0,
+                'total': d.get('total_bytes') or d.get('total_bytes_estimate'),
+                'speed': d.get('speed'),
+                'eta': d.get('eta'),
+            }
+            self.dirty = True
+        elif status == 'finished':
+            self.bytes_done += d.get('total_bytes') or d.get('downloaded_bytes') or 0
+
+    # yt-dlp postprocessor_hooks callback (runs in the worker thread)
+    def on_postprocess(self, d):
+        if d.get('status') == 'started':
+            self.state = {'stage': 'processing', 'postprocessor': d.get('postprocessor')}
+            self.dirty = True
+
+    def ytdl_options(self):
+        return {'progress_hooks': [self.on_progress], 'postprocessor_hooks': [self.on_postprocess]}
+
+# Edits the status messages of all running downloads from one loop, so no
+# message is edited more than once per `min_interval` and the whole bot stays
+# under `edits_per_second` no matter how many downloads are running
+class ProgressBoard:
+    def __init__(self, edits_per_second=PROGRESS_EDITS_PER_SECOND, min_interval=PROGRESS_EDIT_INTERVAL):
+        self.edit_gap = 1.0 / edits_per_second
+        self.min_interval = min_interval
+        self.recent_rates = deque(maxlen=200)  # bytes per second of finished downloads
+        self._jobs = []
+        self._task = None
+        self.aborting = False
+
+    def track(self, message, render, name=''):
+        job = ProgressJob(message, render, name)
+        job.aborted = self.aborting
+        self._jobs.append(job)
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+        return job
+
+    # Stop updating the message (waiting for an edit in flight) and record the byte rate
+    async def finish(self, job):
+        async with job.lock:
+            job.closed = True
+        if job in self._jobs:
+            self._jobs.remove(job)
+
+        elapsed = time.monotonic() - job.started
+        if job.bytes_done and elapsed > 0:
+            rate = job.bytes_done / elapsed
+            self.recent_rates.append(rate)
+            logger.info(
+                f"Downloaded {job.name} - {job.bytes_done / (1024 * 1024):.1f} MB in {elapsed:.1f}s "
+                f"({rate / (1024 * 1024):.2f} MB/s)"
+            )
+
+    # Stop every running download at its next progress update, and any download
+    # started from now on - used when the bot shuts down
+    def abort_all(self):
+        self.aborting = True
+        for job in self._jobs:
+            job.aborted = True
+
+    def stats(self):
+        rates = sorted(self.recent_rates)
+        return {
+            'active': len(self._jobs),
+            'finished': len(rates),
+            'median_mb_per_s': round(rates[len(rates) // 2] / (1024 * 1024), 2) if rates else None,
+        }
+
+    async def _run(self):
+        while self._jobs:
+            now = time.monotonic()
+            # Most stale message first
+            due = [job for job in self._jobs if job.dirty and now - job.last_edit >= self.min_interval]
+            if not due:
+                await asyncio.sleep(self.edit_gap)
+                continue
+            job = min(due, key=lambda job: job.last_edit)
+            await self._edit(job)
+            await asyncio.sleep(self.edit_gap)
+
+    async def _edit(self, job):
+        async with job.lock:
+            if job.closed or job.state is None:
+                return
+            job.dirty = False
+            job.last_edit = time.monotonic()
+            try:
+                await job.message.edit_text(job.render(job.state))
+            except RetryAfter as e:
+                # Telegram wants us to slow down - push this message's next edit back
+                retry_after = e.retry_after
+                job.last_edit += getattr(retry_after, 'total_seconds', lambda: retry_after)()
+                job.dirty = True
+            except BadRequest as e:
+                if "not modified" not in str(e).lower():
+                    logger.debug(f"Progress edit failed: {e}")
+            except Exception as e:
+                logger.debug(f"Progress edit failed: {e}")
@@ -0,0 +1,96 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# SQLite-backed cache of LLM responses and speech-to-text transcripts. Entries
+# are evicted least recently used first once the stored text exceeds max_bytes.
+class ResultCache:
+    def __init__(self, db_path, max_bytes=50 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = storage.connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS llm_results ("
+            "video_id TEXT NOT NULL, choice TEXT NOT NULL, language TEXT NOT NULL, "
+            "model TEXT NOT NULL, prompt_version INTEGER NOT NULL, "
+            "result TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL, "
+            "PRIMARY KEY (video_id, choice, language, model, prompt_version))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS llm_results_last_used ON llm_results (last_used)")
+        self._db.commit()
+
+    def get(self, video_id, choice, language, model, prompt_version):
+        key = (video_id, choice, language, model, prompt_version)
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT result FROM llm_results WHERE video_id = ? AND choice = ? AND language = ? "
+                    "AND model = ? AND prompt_version = ?", key
+                ).fetchone()
+                if row is None:
+                    self.misses += 1
+                    return None
+                self._db.execute(
+                    "UPDATE llm_results SET last_used = ? WHERE video_id = ? AND choice = ? AND language = ? "
+                    "AND model = ? AND prompt_version = ?", (time.time(),) + key
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading result cache: {e}")
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, video_id, choice, language, model, prompt_version, result):
+        size = len(result.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO llm_results "
+                    "(video_id, choice, language, model, prompt_version, result, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (video_id, choice, language, model, prompt_version, result, size, time.time()),
+                )
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing result cache: {e}")
+
+    def stats(self):
+        with self._lock:
+            entries, total = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_results").fetchone()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': total,
+        }
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    # Drop least recently used rows until the cache is back under budget
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT rowid, size FROM llm_results ORDER BY last_used").fetchall()
+        for rowid, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM llm_results WHERE rowid = ?", (rowid,))
+            total -= size
+            self.evictions += 1
@@ -0,0 +1,105 @@
+import json
+import math
+import re
+from collections import Counter
+
+from chunking import estimate_tokens
+
+# Per-video BM25 index over transcript chunks, so a question only needs the few
+# chunks that are relevant to it instead of the whole transcript
+
+# Words in Latin or Devanagari script (the Devanagari block keeps vowel signs in the word)
+WORD_REGEX = re.compile(r'[\w\u0900-\u097F]+')
+
+# Common English and Hinglish words that match every chunk
+STOPWORDS = frozenset("""
+a an and are as at be but by can do does for from has have how i in is it its me my of on or so that the
+their them there these they this to was we what when where which who why will with you your
+hai hain ka ki ke ko se mein aur kya ye yeh woh bhi to nahi
+""".split())
+
+# BM25 parameters
+K1 = 1.5
+B = 0.75
+
+def tokenize(text):
+    return [word for word in WORD_REGEX.findall(text.lower()) if word not in STOPWORDS]
+
+# 83 -> "1:23", 3723 -> "1:02:03"
+def format_timestamp(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    if hours:
+        return f"{hours}:{rest // 60:02d}:{rest % 60:02d}"
+    return f"{rest // 60}:{rest % 60:02d}"
+
+class TranscriptIndex:
+    def __init__(self, chunks, term_counts):
+        self.chunks = chunks  # [(start seconds or None, text)] in transcript order
+        self.term_counts = term_counts  # one {term: count} per chunk
+        self.lengths = [sum(counts.values()) for counts in term_counts]
+        self.average_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0
+        self.doc_freqs = Counter(term for counts in term_counts for term in counts)
+
+    # Group transcript lines into chunks of about max_tokens. `starts` holds the
+    # start time of each line, when known.
+    @classmethod
+    def build(cls, lines, starts=None, max_tokens=250):
+        chunks = []
+        current = []
+        current_start = None
+        current_tokens = 0
+
+        for index, line in enumerate(lines):
+            line = line.strip()
+            if not line:
+                continue
+            line_tokens = estimate_tokens(line)
+            if current and current_tokens + line_tokens > max_tokens:
+                chunks.append((current_start, ' '.join(current)))
+                current = []
+                current_tokens = 0
+            if not current:
+                current_start = starts[index] if starts and index < len(starts) else None
+            current.append(line)
+            current_tokens += line_tokens
+
+        if current:
+            chunks.append((current_start, ' '.join(current)))
+        return cls(chunks, [dict(Counter(tokenize(text))) for _, text in chunks])
+
+    # The k best chunks for a query, returned in transcript order. Falls back to the
+    # opening chunks when nothing matches.
+    def search(self, query, k=4):
+        terms = set(tokenize(query))
+        count = len(self.chunks)
+        scores = []
+        for index, counts in enumerate(self.term_counts):
+            score = 0.0
+            for term in terms:
+                frequency = counts.get(term)
+                if not frequency:
+                    continue
+                idf = math.log(1 + (count - self.doc_freqs[term] + 0.5) / (self.doc_freqs[term] + 0.5))
+                norm = K1 * (1 - B + B * self.lengths[index] / (self.average_length or 1))
+                score += idf * frequency * (K1 + 1) / (frequency + norm)
+            if score > 0:
+                scores.append((score, index))
+
+        best = [index for _, index in sorted(scores, reverse=True)[:k]] or list(range(min(k, count)))
+        return [self.chunks[index] for index in sorted(best)]
+
+    def to_json(self):
+        return json.dumps({'chunks': self.chunks, 'term_counts': self.term_counts}, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, data):
+        data = json.loads(data)
+        return cls([tuple(chunk) for chunk in data['chunks']], data['term_counts'])
+
+# Excerpts as prompt text, each prefixed with its timestamp
+def format_excerpts(chunks):
+    return "\n\n".join(
+        f"[{format_timestamp(start)}] {text}" if start is not None else text
+        for start, text in chunks
+    )
@@ -0,0 +1,177 @@
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Raised by submit() when the global queue is full
+class QueueFullError(Exception):
+    pass
+
+class _Job:
+    __slots__ = ('user_id', 'job_class', 'factory', 'future', 'on_position', 'position', 'cancellable', 'task')
+
+    def __init__(self, user_id, job_class, factory, future, on_position, cancellable):
+        self.user_id = user_id
+        self.job_class = job_class
+        self.factory = factory
+        self.future = future
+        self.on_position = on_position
+        self.position = None
+        self.cancellable = cancellable
+        self.task = None
+
+# Central job queue. Jobs belong to a priority class (lower value runs first)
+# with its own concurrency limit; within a class users are served round-robin
+# and no user runs more than per_user_limit jobs at once.
+class JobScheduler:
+    def __init__(self, class_limits, priorities, max_queued=200, per_user_limit=2):
+        self.class_limits = dict(class_limits)
+        self.priorities = dict(priorities)
+        self.max_queued = max_queued
+        self.per_user_limit = per_user_limit
+        # job_class -> OrderedDict(user_id -> deque of jobs); the dict order is the round-robin order
+        self._queues = {job_class: OrderedDict() for job_class in self.class_limits}
+        self._running = {job_class: 0 for job_class in self.class_limits}
+        self._running_per_user = {}
+        self._queued = 0
+
+    # Queue a job and wait for its result. `factory` is called with no arguments
+    # to create the coroutine once the job is admitted. `on_position`, if given,
+    # is awaited with the 1-based queue position whenever it changes. A job that
+    # is already running keeps going when the caller gives up, unless `cancellable`.
+    async def submit(self, user_id, job_class, factory, on_position=None, cancellable=False):
+        if job_class not in self._queues:
+            raise ValueError(f"Unknown job class: {job_class}")
+        if self._queued >= self.max_queued:
+            raise QueueFullError("Job queue is full")
+
+        job = _Job(user_id, job_class, factory, asyncio.get_running_loop().create_future(), on_position, cancellable)
+        self._queues[job_class].setdefault(user_id, deque()).append(job)
+        self._queued += 1
+        self._dispatch()
+
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            # Caller gave up - drop the job if it hasn't started yet
+            if self._remove_queued(job):
+                self._notify_positions()
+            else:
+                job.future.cancel()
+                if job.cancellable and job.task is not None:
+                    job.task.cancel()
+            raise
+
+    def stats(self):
+        return {
+            'queued': self._queued,
+            'running': dict(self._running),
+            'queued_by_class': {
+                job_class: sum(len(jobs) for jobs in queues.values())
+                for job_class, queues in self._queues.items()
+            },
+        }
+
+    def _classes_by_priority(self):
+        return sorted(self._queues, key=lambda job_class: self.priorities.get(job_class, 0))
+
+    def _dispatch(self):
+        for job_class in self._classes_by_priority():
+            queues = self._queues[job_class]
+            while self._running[job_class] < self.class_limits[job_class]:
+                job = self._next_job(queues)
+                if job is None:
+                    break
+                self._start(job)
+        self._notify_positions()
+
+    # Pick the first user in round-robin order who is under their limit,
+    # then move that user to the back of the rotation
+    def _next_job(self, queues):
+        for user_id in list(queues):
+            if self._running_per_user.get(user_id, 0) >= self.per_user_limit:
+                continue
+            jobs = queues.pop(user_id)
+            job = jobs.popleft()
+            if jobs:
+                queues[user_id] = jobs
+            self._queued -= 1
+            return job
+        return None
+
+    def _start(self, job):
+        job.on_position = None  # started jobs report their own progress
+        self._running[job.job_class] += 1
+        self._running_per_user[job.user_id] = self._running_per_user.get(job.user_id, 0) + 1
+        job.task = asyncio.ensure_future(self._run(job))
+
+    async def _run(self, job):
+        try:
+            if not job.future.done():
+                result = await job.factory()
+                if not job.future.done():
+                    job.future.set_result(result)
+        except Exception as e:
+            if not job.future.done():
+                job.future.set_exception(e)
+        except asyncio.CancelledError:
+            job.future.cancel()
+        finally:
+            self._running[job.job_class] -= 1
+            remaining = self._running_per_user.get(job.user_id, 1) - 1
+            if remaining:
+                self._running_per_user[job.user_id] = remaining
+            else:
+                self._running_per_user.pop(job.user_id, None)
+            self._dispatch()
+
+    def _remove_queued(self, job):
+        queues = self._queues[job.job_class]
+        jobs = queues.get(job.user_id)
+        if not jobs or job not in jobs:
+            return False
+        jobs.remove(job)
+        if not jobs:
+            del queues[job.user_id]
+        self._queued -= 1
+        return True
+
+    # Estimated place in line: jobs queued in higher priority classes, plus the
+    # jobs that round-robin will serve before this one within its own class
+    def _position(self, job, index):
+        ahead = 0
+        for job_class in self._classes_by_priority():
+            if job_class == job.job_class:
+                break
+            ahead += sum(len(jobs) for jobs in self._queues[job_class].values())
+
+        # Users ahead of this one in the rotation get one more turn than those behind it
+        behind = False
+        for user_id, jobs in self._queues[job.job_class].items():
+            if user_id == job.user_id:
+                behind = True
+                ahead += index
+            else:
+                ahead += min(len(jobs), index if behind else index + 1)
+        return ahead + 1
+
+    def _notify_positions(self):
+        for queues in self._queues.values():
+            for jobs in queues.values():
+                for index, job in enumerate(jobs):
+                    if job.on_position is None:
+                        continue
+                    position = self._position(job, index)
+                    if position != job.position:
+                        job.position = position
+                        asyncio.ensure_future(self._send_position(job, position))
+
+    @staticmethod
+    async def _send_position(job, position):
+        if job.on_position is None or job.position != position:
+            return
+        try:
+            await job.on_position(position)
+        except Exception as e:
+            logger.debug(f"Could not report queue position: {e}")
@@ -0,0 +1,164 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Small per-user record - the transcript itself lives once per video in TranscriptStore
+class Session:
+    __slots__ = ('user_id', 'language', 'video_id', 'transcript_language')
+
+    def __init__(self, user_id, language=None, video_id=None, transcript_language=None):
+        self.user_id = user_id
+        self.language = language
+        self.video_id = video_id
+        self.transcript_language = transcript_language
+
+# User sessions written through to SQLite so they survive restarts. Every get()
+# re-reads the row, since webhook workers in other processes may have changed it;
+# the in-memory object is kept so concurrent handlers in this process share it.
+class SessionStore:
+    def __init__(self, db_path):
+        self._sessions = {}
+        self._lock = threading.Lock()
+        self._db = storage.connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "user_id INTEGER PRIMARY KEY, language TEXT, video_id TEXT, "
+            "transcript_language TEXT, updated_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, user_id):
+        with self._lock:
+            session = self._sessions.get(user_id)
+            try:
+                row = self._db.execute(
+                    "SELECT language, video_id, transcript_language FROM sessions WHERE user_id = ?", (user_id,)
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Error loading session for {user_id}: {e}")
+                # Serve what we have rather than forgetting the user
+                return session if session is not None else Session(user_id)
+            if session is None:
+                session = Session(user_id)
+                self._sessions[user_id] = session
+            if row is not None:
+                session.language, session.video_id, session.transcript_language = row
+            return session
+
+    def save(self, session):
+        with self._lock:
+            self._sessions[session.user_id] = session
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sessions (user_id, language, video_id, transcript_language, updated_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session.user_id, session.language, session.video_id, session.transcript_language, time.time()),
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error saving session for {session.user_id}: {e}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+# Transcripts shared by every user looking at the same video, keyed by
+# (video ID, language). Least recently used entries are evicted once the
+# stored text exceeds max_bytes.
+class TranscriptStore:
+    def __init__(self, db_path, max_bytes=200 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._db = storage.connect(db_path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS transcripts ("
+            "video_id TEXT NOT NULL, language TEXT NOT NULL, title TEXT NOT NULL, transcript TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL, PRIMARY KEY (video_id, language))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS transcripts_last_used ON transcripts (last_used)")
+        # Stores created before chunk indexes existed
+        columns = [row[1] for row in self._db.execute("PRAGMA table_info(transcripts)")]
+        if 'chunk_index' not in columns:
+            self._db.execute("ALTER TABLE transcripts ADD COLUMN chunk_index TEXT")
+        self._db.commit()
+
+    # Returns (transcript, title) or None
+    def get(self, video_id, language):
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT transcript, title FROM transcripts WHERE video_id = ? AND language = ?",
+                    (video_id, language),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute(
+                        "UPDATE transcripts SET last_used = ? WHERE video_id = ? AND language = ?",
+                        (time.time(), video_id, language),
+                    )
+                    self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading transcript store: {e}")
+                return None
+        return tuple(row) if row else None
+
+    # The serialized chunk index, or None if the transcript has none (or isn't stored)
+    def get_index(self, video_id, language):
+        with self._lock:
+            try:
+                row = self._db.execute(
+                    "SELECT chunk_index FROM transcripts WHERE video_id = ? AND language = ?",
+                    (video_id, language),
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Error reading transcript store: {e}")
+                return None
+        return row[0] if row else None
+
+    # Attach a chunk index to a transcript that is already stored
+    def put_index(self, video_id, language, chunk_index):
+        with self._lock:
+            try:
+                self._db.execute(
+                    "UPDATE transcripts SET chunk_index = ?, size = size + ? WHERE video_id = ? AND language = ?",
+                    (chunk_index, len(chunk_index.encode('utf-8')), video_id, language),
+                )
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing transcript store: {e}")
+
+    def put(self, video_id, language, transcript, title, chunk_index=None):
+        size = len(transcript.encode('utf-8')) + (len(chunk_index.encode('utf-8')) if chunk_index else 0)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO transcripts (video_id, language, title, transcript, size, last_used, chunk_index) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (video_id, language, title, transcript, size, time.time(), chunk_index),
+                )
+                self._evict()
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Error writing transcript store: {e}")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM transcripts").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT rowid, size FROM transcripts ORDER BY last_used").fetchall()
+        for rowid, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._db.execute("DELETE FROM transcripts WHERE rowid = ?", (rowid,))
+            total -= size
@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import os
+import random
+import re
+import subprocess
+
+import groq
+import httpx
+
+from config import HTTP_TIMEOUT
+from llm import is_retryable
+from subtitles import Segment
+
+logger = logging.getLogger(__name__)
+
+# Speech-to-text fallback for videos without captions. The audio track is cut into
+# overlapping chunks that are transcribed concurrently, then the timed segments of
+# every chunk are stitched back into one transcript.
+
+# Chunks are re-encoded to small mono mp3s - speech models resample to 16 kHz anyway
+CHUNK_SAMPLE_RATE = 16000
+CHUNK_AUDIO_KBPS = 48
+
+# Deprecated ISO-639 codes YouTube still reports, and their current form
+LEGACY_LANGUAGE_CODES = {'iw': 'he', 'in': 'id', 'ji': 'yi', 'jw': 'jv', 'mo': 'ro'}
+
+# Raised when a chunk still fails after all retries
+class SpeechError(Exception):
+    pass
+
+# Backend interface - transcribe() returns the segments of one audio file, with
+# times relative to the start of that file
+class SpeechBackend:
+    model = None
+
+    async def transcribe(self, path, duration, language=None):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+# Groq's OpenAI-compatible transcription endpoint, with segment timestamps
+class GroqSpeechBackend(SpeechBackend):
+    def __init__(self, api_key, model, base_url=None, max_connections=8):
+        self.model = model
+        self._http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT * 4,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self._client = groq.AsyncGroq(
+            api_key=api_key,
+            base_url=base_url or None,
+            max_retries=0,  # retries are handled by SpeechClient
+            http_client=self._http_client,
+        )
+
+    async def transcribe(self, path, duration, language=None):
+        with open(path, 'rb') as audio_file:
+            data = audio_file.read()
+        options = {'language': language} if language else {}
+        response = await self._client.audio.transcriptions.create(
+            model=self.model,
+            file=(os.path.basename(path), data),
+            response_format='verbose_json',
+            timestamp_granularities=['segment'],
+            **options
+        )
+        segments = getattr(response, 'segments', None)
+        if not segments:
+            text = (response.text or '').strip()
+            return [Segment(0.0, duration, text)] if text else []
+        return [
+            Segment(float(segment['start']), float(segment['end']), segment['text'].strip())
+            for segment in segments if segment.get('text', '').strip()
+        ]
+
+    async def close(self):
+        await self._client.close()
+        await self._http_client.aclose()
+
+# Offline backend for local runs and benchmarks - one placeholder segment per chunk
+class StubSpeechBackend(SpeechBackend):
+    model = 'stub'
+
+    def __init__(self, text="(speech)", delay=0.0, **kwargs):
+        self.text = text
+        self.delay = delay
+
+    async def transcribe(self, path, duration, language=None):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return [Segment(0.0, duration, self.text)]
+
+SPEECH_BACKENDS = {
+    'groq': GroqSpeechBackend,
+    'stub': StubSpeechBackend,
+}
+
+def create_speech_backend(name, **kwargs):
+    if name not in SPEECH_BACKENDS:
+        raise ValueError(f"Unknown speech backend: {name}")
+    return SPEECH_BACKENDS[name](**kwargs)
+
+# The ISO-639-1 code transcription APIs accept for a yt-dlp language tag
+# ('en-US' -> 'en', 'iw' -> 'he'), or None to let the model detect it
+def speech_language(language):
+    if not language:
+        return None
+    code = re.split(r'[-_]', str(language).strip().lower())[0]
+    code = LEGACY_LANGUAGE_CODES.get(code, code)
+    return code if re.fullmatch(r'[a-z]{2}', code) else None
+
+# (start, length) in seconds of every chunk. Neighbouring chunks share `overlap`
+# seconds so no word is lost to a cut.
+def plan_chunks(duration, chunk_seconds, overlap_seconds):
+    overlap_seconds = min(overlap_seconds, chunk_seconds / 2)
+    step = chunk_seconds - overlap_seconds
+    chunks = []
+    start = 0.0
+    while True:
+        length = min(chunk_seconds, duration - start)
+        chunks.append((start, length))
+        if start + length >= duration:
+            return chunks
+        start += step
+
+# Cut one chunk out of the downloaded audio (blocking, runs in the worker pool).
+# Seeking before the input keeps this fast even deep into long files.
+def cut_audio_chunk(path, output, start, length):
+    subprocess.run(
+        ['ffmpeg', '-hide_banner', '-loglevel', 'error', '-y', '-ss', f'{start:.3f}', '-t', f'{length:.3f}',
+         '-i', path, '-vn', '-ac', '1', '-ar', str(CHUNK_SAMPLE_RATE),
+         '-c:a', 'libmp3lame', '-b:a', f'{CHUNK_AUDIO_KBPS}k', output],
+        check=True
+    )
+    return output
+
+# Merge per-chunk results [(start, length, segments)] into one list of segments in
+# absolute time. Each overlap is split at its middle and a segment belongs to the
+# chunk its midpoint falls in, so words heard twice are kept once and words cut
+# off at a chunk edge come from the neighbour that heard them whole.
+def stitch_segments(chunk_results):
+    chunk_results = sorted(chunk_results, key=lambda result: result[0])
+    stitched = []
+    for index, (start, length, segments) in enumerate(chunk_results):
+        lower = 0.0
+        if index > 0:
+            previous_start, previous_length, _ = chunk_results[index - 1]
+            lower = (start + previous_start + previous_length) / 2
+        upper = float('inf')
+        if index + 1 < len(chunk_results):
+            upper = (chunk_results[index + 1][0] + start + length) / 2
+
+        for segment in segments:
+            absolute = Segment(start + segment.start, start + min(segment.end, length), segment.text)
+            if lower <= (absolute.start + absolute.end) / 2 < upper:
+                stitched.append(absolute)
+    return stitched
+
+# Concurrency cap and jittered retries around a speech backend
+class SpeechClient:
+    def __init__(self, backend, concurrency=4, max_retries=3):
+        self.backend = backend
+        self.max_retries = max_retries
+        self._concurrency = concurrency
+        self._semaphore = None
+
+    @property
+    def model(self):
+        return self.backend.model
+
+    def _get_semaphore(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._concurrency)
+        return self._semaphore
+
+    async def transcribe(self, path, duration, language=None):
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self._get_semaphore():
+                    return await self.backend.transcribe(path, duration, language)
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    raise SpeechError(str(e)) from e
+                delay = random.uniform(0, min(30.0, 2 ** attempt))
+                logger.warning(f"Transcription of {os.path.basename(path)} failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    async def close(self):
+        await self.backend.close()
@@ -0,0 +1,11 @@
+import sqlite3
+
+# Open a SQLite database that several bot processes can share safely:
+# WAL lets readers run alongside a writer, and the busy timeout makes
+# concurrent writers wait for each other instead of failing
+def connect(db_path):
+    db = sqlite3.connect(db_path, timeout=10, check_same_thread=False)
+    if db_path != ':memory:':
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+    return db
@@ -0,0 +1,189 @@
+import json
+import logging
+import re
+from typing import NamedTuple
+
+import httpx
+
+from config import HTTP_MAX_CONNECTIONS, HTTP_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# Subtitle formats we can parse, in order of preference
+PREFERRED_FORMATS = ('json3', 'vtt')
+
+VTT_TIMING_REGEX = re.compile(r'((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})\s+-->\s+((?:\d+:)?\d{1,2}:\d{2}[.,]\d{3})')
+TAG_REGEX = re.compile(r'<[^>]*>')
+
+# One caption cue - times are in seconds
+class Segment(NamedTuple):
+    start: float
+    end: float
+    text: str
+
+_http_client = None
+
+# Shared, connection-pooled client so subtitle fetches reuse TLS connections
+def get_http_client():
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=HTTP_TIMEOUT,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            ),
+        )
+    return _http_client
+
+async def close_http_client():
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+# Pick the best parseable track from a yt-dlp subtitle list
+def pick_subtitle_track(tracks):
+    for ext in PREFERRED_FORMATS:
+        for track in tracks:
+            if track.get('ext') == ext and track.get('url'):
+                return track
+    return None
+
+# Convert a VTT timestamp (HH:MM:SS.mmm or MM:SS.mmm) to seconds
+def parse_vtt_timestamp(value):
+    seconds = 0.0
+    for part in value.replace(',', '.').split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+# Incremental WebVTT parser - feed it lines, it yields segments as cues complete
+class VttParser:
+    def __init__(self):
+        self._timing = None
+        self._lines = []
+
+    def feed_line(self, line):
+        # Only a truly empty line ends a cue - YouTube auto captions start each
+        # cue's text with a line holding a single space
+        line = line.rstrip('\r\n')
+        if line == '':
+            return self._flush()
+
+        match = VTT_TIMING_REGEX.search(line)
+        if match:
+            segment = self._flush()
+            self._timing = (parse_vtt_timestamp(match.group(1)), parse_vtt_timestamp(match.group(2)))
+            return segment
+
+        if self._timing is not None:
+            text = TAG_REGEX.sub('', line).strip()
+            if text:
+                self._lines.append(text)
+        return None
+
+    def close(self):
+        return self._flush()
+
+    def _flush(self):
+        segment = None
+        if self._timing is not None and self._lines:
+            segment = Segment(self._timing[0], self._timing[1], ' '.join(self._lines))
+        self._timing = None
+        self._lines = []
+        return segment
+
+# Incremental json3 parser - decodes one event object at a time from the
+# "events" array so the full response is never held in memory
+class Json3Parser:
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._in_events = False
+        self._done = False
+
+    def feed(self, chunk):
+        segments = []
+        if self._done:
+            return segments
+        self._buffer += chunk
+
+        if not self._in_events:
+            key = self._buffer.find('"events"')
+            start = self._buffer.find('[', key) if key != -1 else -1
+            if key == -1:
+                # Keep just enough of the tail to match the key across chunks
+                self._buffer = self._buffer[-len('"events"'):]
+                return segments
+            if start == -1:
+                self._buffer = self._buffer[key:]
+                return segments
+            self._buffer = self._buffer[start + 1:]
+            self._in_events = True
+
+        pos = 0
+        buffer = self._buffer
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n,':
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if buffer[pos] == ']':
+                self._done = True
+                break
+            try:
+                event, pos = self._decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # incomplete object, wait for more data
+            segment = self._event_to_segment(event)
+            if segment is not None:
+                segments.append(segment)
+
+        self._buffer = '' if self._done else buffer[pos:]
+        return segments
+
+    def close(self):
+        if self._in_events and not self._done and self._buffer.strip():
+            raise ValueError("Truncated json3 subtitle track")
+        return []
+
+    @staticmethod
+    def _event_to_segment(event):
+        segs = event.get('segs')
+        if not segs:
+            return None
+        text = ''.join(seg.get('utf8', '') for seg in segs).replace('\n', ' ').strip()
+        if not text:
+            return None
+        start = event.get('tStartMs', 0) / 1000
+        end = start + event.get('dDurationMs', 0) / 1000
+        return Segment(start, end, text)
+
+# Stream a subtitle track and parse it into segments as it downloads
+async def fetch_subtitle_segments(url, ext, client=None):
+    client = client or get_http_client()
+    segments = []
+
+    async with client.stream('GET', url) as response:
+        response.raise_for_status()
+
+        if ext == 'json3':
+            parser = Json3Parser()
+            async for chunk in response.aiter_text():
+                segments.extend(parser.feed(chunk))
+            parser.close()
+        elif ext == 'vtt':
+            parser = VttParser()
+            async for line in response.aiter_lines():
+                segment = parser.feed_line(line)
+                if segment is not None:
+                    segments.append(segment)
+            segment = parser.close()
+            if segment is not None:
+                segments.append(segment)
+        else:
+            raise ValueError(f"Unsupported subtitle format: {ext}")
+
+    logger.info(f"Fetched {len(segments)} subtitle segments ({ext})")
+    return segments
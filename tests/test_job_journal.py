@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from job_journal import DownloadJournal, work_dir_name
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = DownloadJournal(str(tmp_path / 'jobs.sqlite3'))
+    yield journal
+    journal.close()
+
+def add(journal, owner, user_id=1):
+    return journal.add(owner, 100 + user_id, user_id, f"https://youtu.be/{VIDEO_ID}", VIDEO_ID, 'audio_only', 5, 'en')
+
+def test_live_jobs_are_not_claimed(journal):
+    add(journal, 'old')
+    assert journal.claim('new', stale_after=60) == ([], [])
+
+def test_released_jobs_are_claimed_once(journal):
+    job_id = add(journal, 'old')
+    journal.release('old')
+
+    claimed, given_up = journal.claim('new', stale_after=60)
+    assert [job.job_id for job in claimed] == [job_id]
+    assert claimed[0].attempts == 1
+    assert given_up == []
+    # Now owned by 'new', which is alive
+    assert journal.claim('other', stale_after=60) == ([], [])
+
+def test_stale_jobs_are_claimed(journal, monkeypatch):
+    add(journal, 'old')
+    later = time.time() + 120
+    monkeypatch.setattr('job_journal.time.time', lambda: later)
+
+    claimed, _ = journal.claim('new', stale_after=60)
+    assert len(claimed) == 1
+
+def test_touch_keeps_jobs_alive(journal, monkeypatch):
+    add(journal, 'old')
+    now = time.time() + 120
+    monkeypatch.setattr('job_journal.time.time', lambda: now)
+    journal.touch('old')
+
+    assert journal.claim('new', stale_after=60) == ([], [])
+
+def test_claim_skips_jobs_it_does_not_accept(journal):
+    add(journal, 'old', user_id=1)
+    add(journal, 'old', user_id=2)
+    journal.release('old')
+
+    claimed, _ = journal.claim('new', stale_after=60, accept=lambda job: job.user_id == 2)
+    assert [job.user_id for job in claimed] == [2]
+
+def test_jobs_are_given_up_after_max_attempts(journal):
+    job_id = add(journal, 'old')
+    for attempt in range(2):
+        journal.release('old')
+        claimed, given_up = journal.claim('old', stale_after=60, max_attempts=2)
+        assert len(claimed) == 1 and given_up == []
+
+    journal.release('old')
+    claimed, given_up = journal.claim('new', stale_after=60, max_attempts=2)
+    assert claimed == []
+    assert [job.job_id for job in given_up] == [job_id]
+    # Kept (and owned) until the user has been told
+    assert journal.job_dirs() == {(VIDEO_ID, 'audio_only', work_dir_name(job_id))}
+
+    journal.remove(job_id)
+    assert journal.job_dirs() == set()
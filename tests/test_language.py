@@ -0,0 +1,37 @@
+import pytest
+
+from language import detect_language, strip_non_language
+
+@pytest.mark.parametrize('text, expected', [
+    # Devanagari
+    ("यह वीडियो किस बारे में है?", 'hi'),
+    ("इस वीडियो का summary दो", 'hi'),
+    # Hinglish
+    ("main to ghar ja raha hoon", 'hi-en'),
+    ("is video ka summary bata do", 'hi-en'),
+    ("mujhe samajh nahi aaya, phir se samjhao", 'hi-en'),
+    ("yaar ye kya hai", 'hi-en'),
+    # English, including words that are also romanized Hindi
+    ("What is this video about?", 'en'),
+    ("Can you summarize the main points of the talk?", 'en'),
+    ("The main character goes home in the end", 'en'),
+    ("Give me the key points", 'en'),
+    # Nothing to go on
+    ("https://www.youtube.com/watch?v=dQw4w9WgXcQ", 'en'),
+    ("/start", 'en'),
+    ("/language@yt_bot", 'en'),
+    ("", 'en'),
+    ("👍 123", 'en'),
+    # URLs and commands don't count towards the language
+    ("https://youtu.be/dQw4w9WgXcQ iska summary chahiye", 'hi-en'),
+    ("/ask यह क्या है", 'hi'),
+])
+def test_detect_language(text, expected):
+    assert detect_language(text) == expected
+
+def test_detection_is_deterministic():
+    text = "kal main office jaunga aur video dekhunga"
+    assert len({detect_language(text) for _ in range(5)}) == 1
+
+def test_strip_non_language():
+    assert strip_non_language("/start@yt_bot see www.example.com/a?b=c now").split() == ["see", "now"]
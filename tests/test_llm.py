@@ -0,0 +1,163 @@
+import asyncio
+import types
+
+import pytest
+
+import llm
+from llm import LLMBackend, LLMClient, LLMError, RateLimitScheduler, TokenBucket
+
+# Monotonic clock that only moves when the code under test sleeps
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    async def sleep(self, delay):
+        self.sleeps.append(delay)
+        self.now += delay
+        await real_sleep(0)
+
+real_sleep = asyncio.sleep
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(llm.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(llm.asyncio, 'sleep', clock.sleep)
+    monkeypatch.setattr(llm.random, 'uniform', lambda low, high: 0)
+    return clock
+
+class APIError(Exception):
+    def __init__(self, status_code, retry_after=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        headers = {'retry-after': str(retry_after)} if retry_after is not None else {}
+        self.response = types.SimpleNamespace(headers=headers)
+
+# Backend that raises the queued errors first, then answers
+class FakeBackend(LLMBackend):
+    model = 'fake'
+
+    def __init__(self, errors=(), used=None, deltas=('Hello', ' world'), fail_after=None):
+        self.errors = list(errors)
+        self.used = used
+        self.deltas = deltas
+        self.fail_after = fail_after
+        self.calls = 0
+
+    async def complete(self, system_message, prompt, max_tokens, temperature=0.7):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'answer', self.used
+
+    async def stream(self, system_message, prompt, max_tokens, temperature=0.7):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        for index, delta in enumerate(self.deltas):
+            if index == self.fail_after:
+                raise APIError(503)
+            yield delta
+
+def collect(client):
+    async def main():
+        return [delta async for delta in client.stream('system', 'prompt', max_tokens=10)]
+    return asyncio.run(main())
+
+def test_bucket_refills_continuously(clock):
+    bucket = TokenBucket(60)
+    bucket.take(60)
+    assert bucket.wait_time(30) == 30.0
+    clock.now += 10
+    assert bucket.wait_time(30) == 20.0
+    clock.now += 1000
+    assert bucket.wait_time(60) == 0.0
+    assert bucket.tokens == 60  # never above capacity
+
+def test_requests_per_minute_are_spaced_out(clock):
+    scheduler = RateLimitScheduler(requests_per_minute=2, tokens_per_minute=10 ** 6)
+
+    async def main():
+        for _ in range(3):
+            await scheduler.acquire(1)
+
+    asyncio.run(main())
+    assert clock.sleeps == [30.0]
+
+def test_tokens_per_minute_wait_for_the_budget(clock):
+    scheduler = RateLimitScheduler(requests_per_minute=1000, tokens_per_minute=600)
+
+    async def main():
+        await scheduler.acquire(600)
+        await scheduler.acquire(300)
+
+    asyncio.run(main())
+    assert clock.sleeps == [30.0]
+
+def test_oversized_request_reserves_at_most_the_whole_budget(clock):
+    scheduler = RateLimitScheduler(requests_per_minute=1000, tokens_per_minute=600)
+    assert asyncio.run(scheduler.acquire(10 ** 6)) == 600
+    assert clock.sleeps == []
+
+def test_settle_refunds_unused_tokens(clock):
+    scheduler = RateLimitScheduler(requests_per_minute=1000, tokens_per_minute=600)
+
+    async def main():
+        reserved = await scheduler.acquire(600)
+        scheduler.settle(reserved, 100)
+        scheduler.settle(reserved, None)  # usage unknown - nothing to refund
+        scheduler.settle(reserved, 900)  # used more than reserved - nothing to refund
+        await scheduler.acquire(500)
+
+    asyncio.run(main())
+    assert clock.sleeps == []
+
+def test_complete_settles_with_reported_usage(clock):
+    client = LLMClient(FakeBackend(used=50), requests_per_minute=1000, tokens_per_minute=10 ** 6)
+    assert asyncio.run(client.complete('system', 'prompt', max_tokens=1000)) == 'answer'
+    assert client.scheduler.tokens.tokens == 10 ** 6 - 50
+
+def test_complete_honours_retry_after(clock):
+    backend = FakeBackend(errors=[APIError(429, retry_after=7), APIError(500)])
+    client = LLMClient(backend, requests_per_minute=1000, tokens_per_minute=10 ** 6)
+    assert asyncio.run(client.complete('system', 'prompt')) == 'answer'
+    assert backend.calls == 3
+    assert clock.sleeps == [7.0, 0]
+
+def test_complete_does_not_retry_bad_requests(clock):
+    backend = FakeBackend(errors=[APIError(400)])
+    client = LLMClient(backend, requests_per_minute=1000, tokens_per_minute=10 ** 6)
+    with pytest.raises(LLMError):
+        asyncio.run(client.complete('system', 'prompt'))
+    assert backend.calls == 1
+
+def test_complete_gives_up_after_max_retries(clock):
+    backend = FakeBackend(errors=[APIError(503)] * 3)
+    client = LLMClient(backend, requests_per_minute=1000, tokens_per_minute=10 ** 6, max_retries=2)
+    with pytest.raises(LLMError):
+        asyncio.run(client.complete('system', 'prompt'))
+    assert backend.calls == 3
+
+def test_stream_retries_before_the_first_delta(clock):
+    backend = FakeBackend(errors=[APIError(503)])
+    client = LLMClient(backend, requests_per_minute=1000, tokens_per_minute=10 ** 6)
+    assert collect(client) == ['Hello', ' world']
+    assert backend.calls == 2
+
+def test_stream_does_not_retry_after_the_first_delta(clock):
+    backend = FakeBackend(fail_after=1)
+    client = LLMClient(backend, requests_per_minute=1000, tokens_per_minute=10 ** 6)
+    received = []
+
+    async def main():
+        async for delta in client.stream('system', 'prompt'):
+            received.append(delta)
+
+    with pytest.raises(LLMError):
+        asyncio.run(main())
+    assert received == ['Hello']
+    assert backend.calls == 1
@@ -0,0 +1,42 @@
+import pytest
+
+import metrics
+from metrics import CounterMetric, HistogramMetric, register_collector, render_metrics
+
+@pytest.fixture(autouse=True)
+def no_collectors(monkeypatch):
+    monkeypatch.setattr(metrics, '_collectors', [])
+    monkeypatch.setattr(metrics, '_metrics', [])
+
+def test_collectors_declare_their_type():
+    register_collector(lambda: {
+        'ytbot_cache_hits': ("Cache hits", {(('cache', 'result'),): 3}, 'counter'),
+        'ytbot_jobs_queued': ("Jobs waiting", {(): 2}, 'gauge'),
+    })
+    lines = render_metrics().splitlines()
+    assert "# TYPE ytbot_cache_hits_total counter" in lines
+    assert 'ytbot_cache_hits_total{cache="result"} 3' in lines
+    assert "# TYPE ytbot_jobs_queued gauge" in lines
+    assert "ytbot_jobs_queued 2" in lines
+
+def test_failing_collector_is_skipped():
+    def broken():
+        raise RuntimeError("boom")
+    register_collector(broken)
+    register_collector(lambda: {'ytbot_up': ("Up", {(): 1}, 'gauge')})
+    assert "ytbot_up 1" in render_metrics().splitlines()
+
+def test_counter_and_histogram_render():
+    counter = CounterMetric('ytbot_errors_total', 'Errors')
+    counter.inc(stage='download')
+    counter.inc(2, stage='download')
+    histogram = HistogramMetric('ytbot_seconds', 'Latency', buckets=(1, 5))
+    histogram.observe(2, stage='llm')
+    metrics._metrics.extend([counter, histogram])
+
+    lines = render_metrics().splitlines()
+    assert 'ytbot_errors_total{stage="download"} 3' in lines
+    assert 'ytbot_seconds_bucket{stage="llm",le="1"} 0' in lines
+    assert 'ytbot_seconds_bucket{stage="llm",le="5"} 1' in lines
+    assert 'ytbot_seconds_bucket{stage="llm",le="+Inf"} 1' in lines
+    assert 'ytbot_seconds_count{stage="llm"} 1' in lines
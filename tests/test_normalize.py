@@ -0,0 +1,46 @@
+from normalize import clean_text, normalize_segments, normalize_transcript
+from subtitles import Segment
+
+def texts(segments):
+    return [segment.text for segment in segments]
+
+def test_clean_text_drops_markup_annotations_and_fillers():
+    assert clean_text('<c>so</c> [Music] um we &amp; you ♪ >> (laughs) right') == 'so we & you right'
+
+def test_rolling_cues_are_deduplicated():
+    segments = [
+        Segment(0.0, 2.0, 'hello world'),
+        Segment(2.0, 2.01, 'hello world'),
+        Segment(2.01, 4.0, 'hello world how are you'),
+        Segment(4.0, 4.01, 'how are you'),
+        Segment(4.01, 6.0, 'how are you doing today.'),
+    ]
+    assert texts(normalize_segments(segments)) == ['hello world how are you doing today.']
+
+def test_one_word_snapshot_cue_is_a_repeat():
+    segments = [Segment(0.0, 1.0, 'okay'), Segment(1.0, 1.01, 'okay'), Segment(1.01, 2.0, 'so.')]
+    assert texts(normalize_segments(segments)) == ['okay so.']
+
+def test_one_word_cue_shown_with_the_previous_one_is_a_repeat():
+    segments = [Segment(0.0, 1.0, 'we said okay'), Segment(0.8, 1.5, 'okay')]
+    assert texts(normalize_segments(segments)) == ['we said okay']
+
+def test_repeated_one_word_cues_are_kept():
+    segments = [Segment(0.0, 0.5, 'no'), Segment(0.5, 1.0, 'no'), Segment(1.0, 2.0, 'not again.')]
+    assert texts(normalize_segments(segments)) == ['no no not again.']
+
+def test_sentences_split_on_punctuation_and_pauses():
+    segments = [
+        Segment(0.0, 1.0, 'First one. Second'),
+        Segment(1.0, 2.0, 'part'),
+        Segment(5.0, 6.0, 'after a pause'),
+    ]
+    sentences = normalize_segments(segments)
+    assert texts(sentences) == ['First one.', 'Second part', 'after a pause']
+    assert [(sentence.start, sentence.end) for sentence in sentences] == [(0.0, 1.0), (0.0, 2.0), (5.0, 6.0)]
+
+def test_normalize_transcript_reports_token_savings():
+    segments = [Segment(0.0, 2.0, 'hello world'), Segment(2.0, 2.01, 'hello world')] * 20
+    sentences, raw_tokens, normalized_tokens = normalize_transcript(segments)
+    assert texts(sentences) == ['hello world']
+    assert normalized_tokens < raw_tokens
@@ -0,0 +1,52 @@
+from retrieval import TranscriptIndex, format_excerpts, format_timestamp, tokenize
+
+LINES = [
+    "Welcome to the channel, today we talk about bread.",
+    "Sourdough needs a starter made from flour and water.",
+    "Feed the starter every day to keep the yeast alive.",
+    "Then we move on to pizza dough and oven temperatures.",
+    "A pizza oven should reach four hundred degrees.",
+]
+STARTS = [0.0, 10.0, 20.0, 30.0, 40.0]
+
+def build(max_tokens=15):
+    return TranscriptIndex.build(LINES, STARTS, max_tokens)
+
+def test_tokenize_drops_stopwords_and_keeps_devanagari():
+    assert tokenize("What is the Starter made of?") == ['starter', 'made']
+    assert tokenize("यह वीडियो क्या है") == ['यह', 'वीडियो', 'क्या', 'है']
+
+def test_format_timestamp():
+    assert format_timestamp(83) == "1:23"
+    assert format_timestamp(3723) == "1:02:03"
+
+def test_chunks_keep_the_start_of_their_first_line():
+    index = build()
+    assert len(index.chunks) > 1
+    assert index.chunks[0][0] == 0.0
+    assert all(start in STARTS for start, _ in index.chunks)
+    assert ' '.join(text for _, text in index.chunks) == ' '.join(LINES)
+
+def test_search_ranks_matching_chunks():
+    index = build()
+    best = index.search("how hot should the pizza oven be", k=1)
+    assert 'pizza oven' in best[0][1]
+
+def test_search_returns_chunks_in_transcript_order():
+    index = build()
+    results = index.search("starter pizza", k=3)
+    starts = [start for start, _ in results]
+    assert starts == sorted(starts)
+
+def test_search_without_matches_falls_back_to_the_opening():
+    index = build()
+    assert index.search("quantum physics", k=2) == index.chunks[:2]
+
+def test_index_survives_json_round_trip():
+    index = build()
+    restored = TranscriptIndex.from_json(index.to_json())
+    assert restored.chunks == index.chunks
+    assert restored.search("yeast", k=1) == index.search("yeast", k=1)
+
+def test_excerpts_are_prefixed_with_timestamps():
+    assert format_excerpts([(83.0, "one"), (None, "two")]) == "[1:23] one\n\ntwo"
@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from scheduler import JobScheduler, QueueFullError
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+# A job that records when it starts and finishes once `release` is set
+def recorder(log, name, release):
+    async def job():
+        log.append(name)
+        await release.wait()
+        return name
+    return lambda: job()
+
+def test_round_robin_between_users():
+    async def main():
+        scheduler = JobScheduler({'text': 1}, {'text': 0}, per_user_limit=5)
+        log = []
+        release = asyncio.Event()
+        # Keep the only slot busy until both users have queued everything
+        blocker = asyncio.ensure_future(scheduler.submit('z', 'text', recorder(log, 'z', release)))
+        await asyncio.sleep(0)
+        jobs = [asyncio.ensure_future(scheduler.submit('a', 'text', recorder(log, f"a{index}", release))) for index in range(3)]
+        jobs += [asyncio.ensure_future(scheduler.submit('b', 'text', recorder(log, f"b{index}", release))) for index in range(2)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *jobs)
+        return log
+
+    assert run(main()) == ['z', 'a0', 'b0', 'a1', 'b1', 'a2']
+
+def test_class_and_per_user_limits():
+    async def main():
+        scheduler = JobScheduler({'text': 3}, {'text': 0}, per_user_limit=2)
+        log = []
+        release = asyncio.Event()
+        tasks = [asyncio.ensure_future(scheduler.submit('a', 'text', recorder(log, f"a{index}", release))) for index in range(3)]
+        tasks += [asyncio.ensure_future(scheduler.submit('b', 'text', recorder(log, f"b{index}", release))) for index in range(2)]
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        running = (list(log), scheduler.stats())
+        release.set()
+        await asyncio.gather(*tasks)
+        return running
+
+    started, stats = run(main())
+    assert started == ['a0', 'a1', 'b0']
+    assert stats['running'] == {'text': 3}
+    assert stats['queued'] == 2
+
+def test_higher_priority_class_runs_first():
+    async def main():
+        scheduler = JobScheduler({'text': 1, 'download': 1}, {'text': 0, 'download': 1}, per_user_limit=1)
+        log = []
+        release = asyncio.Event()
+        first = asyncio.ensure_future(scheduler.submit('a', 'text', recorder(log, 'blocker', release)))
+        await asyncio.sleep(0)
+        # The user's limit holds both queued jobs back until the blocker is done
+        jobs = [
+            asyncio.ensure_future(scheduler.submit('a', 'download', recorder(log, 'download', release))),
+            asyncio.ensure_future(scheduler.submit('a', 'text', recorder(log, 'text', release))),
+        ]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(first, *jobs)
+        return log
+
+    assert run(main()) == ['blocker', 'text', 'download']
+
+def test_queue_limit():
+    async def main():
+        scheduler = JobScheduler({'text': 1}, {'text': 0}, max_queued=1)
+        release = asyncio.Event()
+        running = asyncio.ensure_future(scheduler.submit('a', 'text', recorder([], 'a', release)))
+        queued = asyncio.ensure_future(scheduler.submit('b', 'text', recorder([], 'b', release)))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.submit('c', 'text', recorder([], 'c', release))
+        release.set()
+        return await asyncio.gather(running, queued)
+
+    assert run(main()) == ['a', 'b']
+
+def test_cancelled_queued_job_never_starts():
+    async def main():
+        scheduler = JobScheduler({'text': 1}, {'text': 0})
+        log = []
+        release = asyncio.Event()
+        running = asyncio.ensure_future(scheduler.submit('a', 'text', recorder(log, 'a', release)))
+        queued = asyncio.ensure_future(scheduler.submit('b', 'text', recorder(log, 'b', release)))
+        await asyncio.sleep(0)
+        queued.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        await running
+        return log, scheduler.stats()['queued']
+
+    assert run(main()) == (['a'], 0)
+
+def test_positions_reported_while_queued():
+    async def main():
+        scheduler = JobScheduler({'text': 1}, {'text': 0})
+        positions = []
+        release = asyncio.Event()
+
+        async def on_position(position):
+            positions.append(position)
+
+        running = asyncio.ensure_future(scheduler.submit('a', 'text', recorder([], 'a', release)))
+        queued = asyncio.ensure_future(scheduler.submit('b', 'text', recorder([], 'b', release), on_position=on_position))
+        await asyncio.sleep(0.01)
+        release.set()
+        await asyncio.gather(running, queued)
+        return positions
+
+    assert run(main()) == [1]
@@ -0,0 +1,56 @@
+import asyncio
+
+import pytest
+
+from speech import SpeechClient, SpeechError, StubSpeechBackend, plan_chunks, speech_language, stitch_segments
+from subtitles import Segment
+
+def test_plan_chunks_overlap_and_cover_the_audio():
+    assert plan_chunks(250, 100, 10) == [(0.0, 100), (90.0, 100), (180.0, 70.0)]
+    assert plan_chunks(60, 100, 10) == [(0.0, 60)]
+
+def test_plan_chunks_caps_overlap_at_half_a_chunk():
+    assert plan_chunks(20, 10, 8) == [(0.0, 10), (5.0, 10), (10.0, 10)]
+
+def test_stitch_keeps_each_overlapping_segment_once():
+    # Chunks [0, 100) and [90, 190) overlap in [90, 100); the cut is at 95
+    first = (0.0, 100.0, [Segment(0.0, 50.0, 'a'), Segment(88.0, 94.0, 'b'), Segment(94.0, 99.0, 'c')])
+    second = (90.0, 100.0, [Segment(0.0, 4.0, 'b'), Segment(4.0, 9.0, 'c'), Segment(9.0, 20.0, 'd')])
+    stitched = stitch_segments([second, first])
+    assert [segment.text for segment in stitched] == ['a', 'b', 'c', 'd']
+    assert stitched[-1] == Segment(99.0, 110.0, 'd')
+
+def test_stitch_clips_segments_to_their_chunk():
+    stitched = stitch_segments([(30.0, 10.0, [Segment(5.0, 12.0, 'end')])])
+    assert stitched == [Segment(35.0, 40.0, 'end')]
+
+@pytest.mark.parametrize('language, expected', [
+    ('en', 'en'), ('en-US', 'en'), ('pt_BR', 'pt'), ('iw', 'he'), ('in', 'id'), ('ZH-Hans', 'zh'),
+    ('fil', None), ('und', None), ('', None), (None, None),
+])
+def test_speech_language(language, expected):
+    assert speech_language(language) == expected
+
+def test_client_retries_transient_errors(monkeypatch):
+    monkeypatch.setattr('speech.random.uniform', lambda low, high: 0)
+
+    class FlakyBackend(StubSpeechBackend):
+        calls = 0
+
+        async def transcribe(self, path, duration, language=None):
+            FlakyBackend.calls += 1
+            if FlakyBackend.calls < 3:
+                raise TimeoutError("slow")
+            return await super().transcribe(path, duration, language)
+
+    client = SpeechClient(FlakyBackend(text='hi'), max_retries=3)
+    assert asyncio.run(client.transcribe('chunk.mp3', 5.0)) == [Segment(0.0, 5.0, 'hi')]
+    assert FlakyBackend.calls == 3
+
+def test_client_gives_up_on_permanent_errors():
+    class BrokenBackend(StubSpeechBackend):
+        async def transcribe(self, path, duration, language=None):
+            raise ValueError("bad audio")
+
+    with pytest.raises(SpeechError):
+        asyncio.run(SpeechClient(BrokenBackend(), max_retries=3).transcribe('chunk.mp3', 5.0))
@@ -0,0 +1,90 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from subtitles import Json3Parser, Segment, VttParser, fetch_subtitle_segments, parse_vtt_timestamp
+
+# Shaped like a YouTube auto-caption track: every cue starts with a " " line,
+# repeats the previous line and is followed by a 10 ms cue holding just that line
+AUTO_VTT = """WEBVTT
+Kind: captions
+Language: en
+
+00:00:00.000 --> 00:00:02.000 align:start position:0%
+ 
+hello<00:00:00.500><c> world</c>
+
+00:00:02.000 --> 00:00:02.010 align:start position:0%
+hello world
+ 
+
+00:00:02.010 --> 00:00:04.000 align:start position:0%
+hello world
+how<00:00:02.500><c> are</c><00:00:03.000><c> you</c>
+"""
+
+JSON3 = {
+    'wireMagic': 'pb3',
+    'events': [
+        {'tStartMs': 0, 'dDurationMs': 1500, 'segs': [{'utf8': 'first'}, {'utf8': ' line'}]},
+        {'tStartMs': 1500, 'dDurationMs': 500, 'aAppend': 1, 'segs': [{'utf8': '\n'}]},
+        {'tStartMs': 2000, 'dDurationMs': 1000},
+        {'tStartMs': 3000, 'dDurationMs': 2000, 'segs': [{'utf8': 'second\nline'}]},
+    ],
+}
+
+def parse_vtt(text):
+    parser = VttParser()
+    segments = [parser.feed_line(line) for line in text.splitlines()]
+    segments.append(parser.close())
+    return [segment for segment in segments if segment is not None]
+
+def test_vtt_timestamps():
+    assert parse_vtt_timestamp('00:01.500') == 1.5
+    assert parse_vtt_timestamp('01:02:03,250') == 3723.25
+
+def test_vtt_whitespace_line_does_not_end_cue():
+    segments = parse_vtt(AUTO_VTT)
+    assert segments[0] == Segment(0.0, 2.0, 'hello world')
+    assert segments[-1] == Segment(2.01, 4.0, 'hello world how are you')
+
+def test_vtt_blank_line_ends_cue():
+    segments = parse_vtt("WEBVTT\n\n00:00.000 --> 00:01.000\none\n\n00:01.000 --> 00:02.000\ntwo\n")
+    assert [segment.text for segment in segments] == ['one', 'two']
+
+def test_json3_events_split_across_chunks():
+    data = json.dumps(JSON3)
+    parser = Json3Parser()
+    segments = []
+    for start in range(0, len(data), 7):
+        segments.extend(parser.feed(data[start:start + 7]))
+    parser.close()
+    assert segments == [Segment(0.0, 1.5, 'first line'), Segment(3.0, 5.0, 'second line')]
+
+def test_json3_truncated_track():
+    parser = Json3Parser()
+    parser.feed('{"events": [{"tStartMs": 0, "segs": [{"utf8": "cut')
+    with pytest.raises(ValueError):
+        parser.close()
+
+# A local stand-in for YouTube's subtitle server
+def fetch(ext, body):
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text=body))
+
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await fetch_subtitle_segments(f"https://example.test/track.{ext}", ext, client)
+
+    return asyncio.run(run())
+
+def test_fetch_vtt_track():
+    assert [segment.text for segment in fetch('vtt', AUTO_VTT)] == ['hello world', 'hello world', 'hello world how are you']
+
+def test_fetch_json3_track():
+    assert len(fetch('json3', json.dumps(JSON3))) == 2
+
+def test_fetch_unsupported_format():
+    with pytest.raises(ValueError):
+        fetch('srv3', '<timedtext/>')
@@ -0,0 +1,61 @@
+import yt_dlp
+
+from video_cache import MetadataCache, reusable_info
+
+FORMATS = [
+    {'format_id': '18', 'url': 'https://example.com/18', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'mp4a',
+     'height': 360, 'protocol': 'https'},
+    {'format_id': '137', 'url': 'https://example.com/137', 'ext': 'mp4', 'vcodec': 'avc1', 'acodec': 'none',
+     'height': 1080, 'protocol': 'https'},
+    {'format_id': '140', 'url': 'https://example.com/140', 'ext': 'm4a', 'vcodec': 'none', 'acodec': 'mp4a',
+     'protocol': 'https'},
+]
+
+# Shaped like what _extract_info caches on a host with FFmpeg: the default
+# selection merged the best video and audio
+def cached_info():
+    info = {
+        'id': 'dQw4w9WgXcQ', 'title': 'Video', 'extractor': 'youtube', 'extractor_key': 'Youtube',
+        'webpage_url': 'https://www.youtube.com/watch?v=dQw4w9WgXcQ', 'formats': FORMATS,
+    }
+    with yt_dlp.YoutubeDL({'quiet': True, 'format': '137+140'}) as ydl:
+        return ydl.sanitize_info(ydl.process_ie_result(info, download=False))
+
+# Reprocess an info dict like _download_with_ytdlp does, returning what would be downloaded
+def selected(info, format_selector):
+    downloads = []
+    with yt_dlp.YoutubeDL({'quiet': True, 'format': format_selector}) as ydl:
+        ydl.process_info = lambda info: downloads.append(
+            (info['format_id'], [f['format_id'] for f in info.get('requested_formats') or []])
+        )
+        ydl.process_ie_result(info, download=True)
+    return downloads
+
+def test_single_format_selection_drops_the_cached_merge():
+    info = cached_info()
+    assert [f['format_id'] for f in info['requested_formats']] == ['137', '140']
+
+    assert selected(reusable_info(info), 'bestaudio/best') == [('140', [])]
+    assert selected(reusable_info(info), '18/best') == [('18', [])]
+    assert selected(reusable_info(info), '137+140') == [('137+140', ['137', '140'])]
+
+def test_reusable_info_keeps_video_fields_and_the_original():
+    info = cached_info()
+    reusable = reusable_info(info)
+    assert (reusable['id'], reusable['title']) == ('dQw4w9WgXcQ', 'Video')
+    assert reusable['formats'] == info['formats']
+    assert 'requested_formats' in info
+
+def test_cache_round_trip(tmp_path):
+    cache = MetadataCache(max_entries=2, ttl=60, db_path=str(tmp_path / 'metadata.sqlite3'))
+    cache.put('dQw4w9WgXcQ', {'id': 'dQw4w9WgXcQ', 'title': 'Video'})
+    assert MetadataCache(db_path=str(tmp_path / 'metadata.sqlite3')).get('dQw4w9WgXcQ')['title'] == 'Video'
+    assert cache.get('missing') is None
+    assert (cache.hits, cache.misses) == (0, 1)
+
+def test_least_recently_used_entries_are_evicted():
+    cache = MetadataCache(max_entries=2, ttl=60)
+    for video_id in ('a', 'b', 'c'):
+        cache.put(video_id, {'id': video_id})
+    assert cache.get('a') is None
+    assert cache.stats()['evictions'] == 1
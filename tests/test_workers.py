@@ -0,0 +1,73 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import workers
+
+@pytest.fixture
+def pool(monkeypatch):
+    # 4 threads: 1 reserved for metadata, downloads and audio share the other 3
+    monkeypatch.setattr(workers, 'POOL_SIZE', 4)
+    monkeypatch.setattr(workers, 'METADATA_THREADS', 1)
+    monkeypatch.setattr(workers, 'SHARED_THREADS', 3)
+    monkeypatch.setattr(workers, 'JOB_LIMITS', {'metadata': 1, 'download': 2, 'audio': 3})
+    workers.shutdown_workers()
+    yield
+    workers.shutdown_workers()
+
+# Blocking job that records how many jobs of each kind run at once
+def tracker():
+    lock = threading.Lock()
+    running = {'all': 0}
+    peaks = {}
+
+    def job(kind):
+        keys = (kind, 'all') if kind == 'metadata' else (kind, 'shared', 'all')
+        with lock:
+            for key in keys:
+                running[key] = running.get(key, 0) + 1
+                peaks[key] = max(peaks.get(key, 0), running[key])
+        time.sleep(0.05)
+        with lock:
+            for key in keys:
+                running[key] -= 1
+        return kind
+
+    return job, peaks
+
+def test_kinds_share_the_configured_pool(pool):
+    job, peaks = tracker()
+
+    async def main():
+        return await asyncio.gather(
+            *(workers.run_download_job(job, 'download') for _ in range(4)),
+            *(workers.run_audio_job(job, 'audio') for _ in range(4)),
+            *(workers.run_metadata_job(job, 'metadata') for _ in range(3)),
+        )
+
+    assert len(asyncio.run(main())) == 11
+    assert peaks['download'] <= 2
+    assert peaks['shared'] == 3
+    assert peaks['all'] <= 4
+    assert peaks['metadata'] == 1
+
+def test_metadata_does_not_wait_for_busy_pool(pool):
+    release = threading.Event()
+
+    async def main():
+        busy = [asyncio.ensure_future(workers.run_audio_job(release.wait)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        started = time.monotonic()
+        await workers.run_metadata_job(time.sleep, 0)
+        waited = time.monotonic() - started
+        release.set()
+        await asyncio.gather(*busy)
+        return waited
+
+    assert asyncio.run(main()) < 0.5
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        asyncio.run(workers.run_job('upload', print))
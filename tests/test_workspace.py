@@ -0,0 +1,129 @@
+import os
+import time
+
+from workspace import DownloadWorkspace
+
+VIDEO_ID = 'dQw4w9WgXcQ'
+
+def write(path, data=b'x'):
+    with open(path, 'wb') as output:
+        output.write(data)
+    return path
+
+def test_holders_of_the_same_job_do_not_touch_each_others_files(tmp_path):
+    workspace = DownloadWorkspace(str(tmp_path / 'downloads'), max_bytes=10 ** 9)
+    first = workspace.acquire(VIDEO_ID, 'audio_only')
+    second = workspace.acquire(VIDEO_ID, 'audio_only')
+    assert first != second
+    partial = write(os.path.join(second, 'song.webm.part'))
+
+    finished = workspace.release(first, keep=write(os.path.join(first, 'song.mp3')))
+
+    assert finished == os.path.join(workspace.job_dir(VIDEO_ID, 'audio_only'), 'song.mp3')
+    assert os.path.exists(finished)
+    assert os.path.exists(partial)
+    assert not os.path.exists(first)
+
+def test_finished_file_is_reused_by_the_next_holder(tmp_path):
+    workspace = DownloadWorkspace(str(tmp_path / 'downloads'), max_bytes=10 ** 9)
+    first = workspace.acquire(VIDEO_ID, 'audio_only')
+    workspace.release(first, keep=write(os.path.join(first, 'song.mp3'), b'audio'))
+
+    second = workspace.acquire(VIDEO_ID, 'audio_only')
+    linked = workspace.link_finished(second)
+    assert os.path.dirname(linked) == second
+    with open(linked, 'rb') as data:
+        assert data.read() == b'audio'
+
+    # Releasing it again keeps one copy in the job directory
+    kept = workspace.release(second, keep=linked)
+    assert os.listdir(os.path.dirname(kept)) == ['song.mp3']
+
+def test_release_removes_scratch_files_unless_interrupted(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    workspace = DownloadWorkspace('downloads', max_bytes=10 ** 9, scratch_dir='scratch')
+    failed = workspace.acquire(VIDEO_ID, 'video_audio_360p')
+    interrupted = workspace.acquire(VIDEO_ID, 'video_audio_360p', holder='job7')
+    for path in (failed, interrupted):
+        os.makedirs(os.path.join('scratch', path))
+        write(os.path.join('scratch', path, 'clip.mp4.part'))
+        write(os.path.join(path, 'clip.webp'))
+
+    workspace.release(failed)
+    workspace.release(interrupted, keep_partial=True)
+
+    assert not os.path.exists(failed)
+    assert not os.path.exists(os.path.join('scratch', failed))
+    assert os.listdir(interrupted) == []
+    assert os.listdir(os.path.join('scratch', interrupted)) == ['clip.mp4.part']
+
+# Make a file or directory tree look untouched for an hour
+def age(path):
+    old = time.time() - 3600
+    os.utime(path, (old, old))
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            os.utime(os.path.join(dirpath, name), (old, old))
+        os.utime(dirpath, (old, old))
+
+def test_reconcile_keeps_only_resumable_work_dirs(tmp_path):
+    root = tmp_path / 'downloads'
+    workspace = DownloadWorkspace(str(root), max_bytes=10 ** 9)
+    resumable = workspace.acquire(VIDEO_ID, 'audio_only', holder='job1')
+    abandoned = workspace.acquire(VIDEO_ID, 'audio_only', holder='job2')
+    write(os.path.join(resumable, 'song.webm.part'))
+    write(os.path.join(abandoned, 'song.webm.part'))
+    age(resumable)
+    age(abandoned)
+    os.makedirs(root / '123456789')  # old per-chat folder
+
+    DownloadWorkspace(str(root), max_bytes=10 ** 9).reconcile({(VIDEO_ID, 'audio_only', 'job1')})
+
+    assert os.path.exists(os.path.join(resumable, 'song.webm.part'))
+    assert not os.path.exists(abandoned)
+    assert not os.path.exists(root / '123456789')
+
+def test_reconcile_spares_work_of_a_draining_process(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    workspace = DownloadWorkspace('downloads', max_bytes=10 ** 9, scratch_dir='scratch')
+    active = workspace.acquire(VIDEO_ID, 'speech')
+    write(os.path.join(active, 'audio.webm'))
+    os.makedirs(os.path.join('scratch', active))
+    scratch_file = write(os.path.join('scratch', active, 'audio.webm.part'))
+    stale_file = write(os.path.join('scratch', 'left_over.part'))
+    age(stale_file)
+
+    DownloadWorkspace('downloads', max_bytes=10 ** 9, scratch_dir='scratch').reconcile()
+
+    assert os.path.exists(os.path.join(active, 'audio.webm'))
+    assert os.path.exists(scratch_file)
+    assert not os.path.exists(stale_file)
+
+def test_budget_evicts_least_recently_used_job(tmp_path):
+    workspace = DownloadWorkspace(str(tmp_path / 'downloads'), max_bytes=150)
+    for index, format_id in enumerate(('audio_only', 'video_audio_360p')):
+        path = workspace.acquire(VIDEO_ID, format_id)
+        kept = workspace.release(path, keep=write(os.path.join(path, 'file.bin'), b'x' * 100))
+        os.utime(kept, (index, index))
+
+    workspace.enforce_budget()
+
+    assert not os.path.exists(workspace.job_dir(VIDEO_ID, 'audio_only'))
+    assert os.path.exists(workspace.job_dir(VIDEO_ID, 'video_audio_360p'))
+
+def test_only_files_of_the_requested_kind_are_reused(tmp_path):
+    workspace = DownloadWorkspace(str(tmp_path / 'downloads'), max_bytes=10 ** 9)
+    first = workspace.acquire(VIDEO_ID, 'audio_only')
+    workspace.release(first, keep=write(os.path.join(first, 'song.mp4')))
+
+    second = workspace.acquire(VIDEO_ID, 'audio_only')
+    assert workspace.link_finished(second, '.mp3') is None
+    assert workspace.link_finished(second).endswith('song.mp4')
+
+def test_release_without_keep_leaves_nothing_to_reuse(tmp_path):
+    workspace = DownloadWorkspace(str(tmp_path / 'downloads'), max_bytes=10 ** 9)
+    path = workspace.acquire(VIDEO_ID, 'audio_only')
+    write(os.path.join(path, 'fallback.mp4'))
+
+    assert workspace.release(path) is None
+    assert not os.path.exists(workspace.job_dir(VIDEO_ID, 'audio_only'))
@@ -0,0 +1,120 @@
+import copy
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import storage
+
+logger = logging.getLogger(__name__)
+
+# Top-level fields yt-dlp copies from the format it selected. A cached info dict is
+# reprocessed with another format selector, which only overlays the newly picked
+# format - so whatever the first selection left behind (above all a
+# bestvideo+bestaudio `requested_formats`) would be downloaded instead.
+SELECTED_FORMAT_KEYS = (
+    'requested_formats', 'requested_downloads', 'format_id', 'format', 'format_note', 'url', 'manifest_url',
+    'ext', 'protocol', 'width', 'height', 'resolution', 'aspect_ratio', 'fps', 'dynamic_range', 'vcodec',
+    'acodec', 'vbr', 'abr', 'tbr', 'asr', 'audio_channels', 'filesize', 'filesize_approx', 'container',
+    'http_headers', 'downloader_options',
+)
+
+# Copy of a cached info dict that can go through format selection again
+def reusable_info(info):
+    info = copy.deepcopy(info)
+    if info.get('formats'):
+        for key in SELECTED_FORMAT_KEYS:
+            info.pop(key, None)
+    return info
+
+# LRU cache with a TTL for yt-dlp info dicts, optionally backed by SQLite
+# so that entries survive restarts and can be shared between processes
+class MetadataCache:
+    def __init__(self, max_entries=256, ttl=3600, db_path=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # video_id -> (expires_at, info)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = storage.connect(db_path)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS video_metadata ("
+                "video_id TEXT PRIMARY KEY, expires_at REAL NOT NULL, info TEXT NOT NULL)"
+            )
+            self._db.commit()
+
+    def get(self, video_id):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(video_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(video_id)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._entries[video_id]
+
+            row = self._load(video_id, now)
+            if row is not None:
+                expires_at, info = row
+                self._remember(video_id, info, expires_at)
+                self.hits += 1
+                return info
+
+            self.misses += 1
+            return None
+
+    def put(self, video_id, info):
+        now = time.time()
+        with self._lock:
+            self._remember(video_id, info, now + self.ttl)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO video_metadata (video_id, expires_at, info) VALUES (?, ?, ?)",
+                        (video_id, now + self.ttl, json.dumps(info)),
+                    )
+                    self._db.execute("DELETE FROM video_metadata WHERE expires_at <= ?", (now,))
+                    self._db.commit()
+                except (sqlite3.Error, TypeError, ValueError) as e:
+                    logger.error(f"Error storing metadata for {video_id}: {e}")
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0.0,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, video_id, info, expires_at):
+        self._entries[video_id] = (expires_at, info)
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, video_id, now):
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT expires_at, info FROM video_metadata WHERE video_id = ? AND expires_at > ?", (video_id, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error loading metadata for {video_id}: {e}")
+            return None
+        return (row[0], json.loads(row[1])) if row else None
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+
+from aiohttp import web
+from telegram import Bot, Update
+
+logger = logging.getLogger(__name__)
+
+# Updates waiting per worker before the front server starts refusing them
+WORKER_QUEUE_SIZE = 1000
+
+UPDATE_CHAT_KEYS = (
+    'message', 'edited_message', 'channel_post', 'edited_channel_post',
+    'my_chat_member', 'chat_member', 'chat_join_request',
+)
+
+# Find the chat an update belongs to
+def chat_id_of(update_data):
+    for key in UPDATE_CHAT_KEYS:
+        if key in update_data:
+            return update_data[key]['chat']['id']
+
+    callback_query = update_data.get('callback_query')
+    if callback_query is not None:
+        message = callback_query.get('message')
+        if message is not None:
+            return message['chat']['id']
+        return callback_query['from']['id']
+
+    # Inline queries, polls and the like only carry the sender
+    for value in update_data.values():
+        if isinstance(value, dict) and 'from' in value:
+            return value['from']['id']
+    return 0
+
+# Find the user an update comes from, falling back to its chat for updates without a
+# sender (like channel posts). Updates are routed by user since sessions, prefetches and
+# pending batches are all kept per user.
+def user_id_of(update_data):
+    for value in update_data.values():
+        if isinstance(value, dict) and isinstance(value.get('from'), dict):
+            return value['from']['id']
+    return chat_id_of(update_data)
+
+def worker_for_user(user_id, workers):
+    return abs(user_id) % workers
+
+def worker_index(update_data, workers):
+    return worker_for_user(user_id_of(update_data), workers)
+
+# Worker process: runs a full bot Application without an updater and feeds it
+# the updates the front server routes to it
+def run_worker(build_application, updates, index):
+    # Ctrl+C reaches the whole process group - let the front server stop us cleanly
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.getLogger(__name__).info(f"Webhook worker {index} starting")
+    asyncio.run(_worker_main(build_application, updates, index))
+
+async def _worker_main(build_application, updates, index):
+    application = build_application(updater=False, worker_index=index)
+    loop = asyncio.get_running_loop()
+
+    async with application:
+        # run_polling/run_webhook would call the lifecycle hooks - we have to do it ourselves
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        while True:
+            data = await loop.run_in_executor(None, updates.get)
+            if data is None:
+                break
+            await application.update_queue.put(Update.de_json(data, application.bot))
+        await application.stop()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+# Front process: an aiohttp server that receives webhook calls from Telegram and
+# hands each update to the worker that owns its user
+class WebhookServer:
+    def __init__(self, token, build_application, url, listen, port, path, secret='', workers=4, api_server='', drain_timeout=120):
+        self.token = token
+        self.api_server = api_server.rstrip('/')
+        self.build_application = build_application
+        self.url = f"{url.rstrip('/')}/{path}"
+        self.listen = listen
+        self.port = port
+        self.path = f"/{path}"
+        self.secret = secret
+        self.workers = max(1, workers)
+        self.drain_timeout = drain_timeout
+        self._context = multiprocessing.get_context('spawn')  # fresh interpreters, no inherited connections
+        self._queues = []
+        self._processes = []
+
+    def run(self):
+        app = web.Application()
+        app.router.add_post(self.path, self._handle_update)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
+        web.run_app(app, host=self.listen, port=self.port)
+
+    async def _handle_update(self, request):
+        if self.secret and request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret:
+            return web.Response(status=403)
+        try:
+            data = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self._queues[worker_index(data, self.workers)].put_nowait(data)
+        except queue.Full:
+            # Telegram retries updates that are not acknowledged
+            return web.Response(status=503)
+        return web.Response()
+
+    async def _on_startup(self, app):
+        for index in range(self.workers):
+            updates = self._context.Queue(WORKER_QUEUE_SIZE)
+            process = self._context.Process(
+                target=run_worker, args=(self.build_application, updates, index), name=f"bot-worker-{index}"
+            )
+            process.start()
+            self._queues.append(updates)
+            self._processes.append(process)
+
+        bot_kwargs = {'base_url': f"{self.api_server}/bot"} if self.api_server else {}
+        async with Bot(self.token, **bot_kwargs) as bot:
+            await bot.set_webhook(self.url, secret_token=self.secret or None)
+        logger.info(f"Webhook set to {self.url} with {self.workers} workers")
+
+    async def _on_cleanup(self, app):
+        # SIGTERM first, so each worker drains its downloads before it stops
+        for process in self._processes:
+            process.terminate()
+        for updates in self._queues:
+            updates.put(None)
+        loop = asyncio.get_running_loop()
+        for process in self._processes:
+            await loop.run_in_executor(None, process.join, self.drain_timeout + 30)
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in time, killing it")
+                process.kill()
@@ -0,0 +1,73 @@
+import asyncio
+import contextlib
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from config import WORKER_POOL_SIZE, METADATA_CONCURRENCY, DOWNLOAD_CONCURRENCY, AUDIO_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# WORKER_POOL_SIZE threads are shared by every job kind. Metadata lookups get a
+# share of their own so they never queue behind downloads; the other kinds take
+# turns on the rest, each under its own limit as well.
+POOL_SIZE = max(WORKER_POOL_SIZE, 2)
+METADATA_THREADS = min(METADATA_CONCURRENCY, POOL_SIZE - 1)
+SHARED_THREADS = POOL_SIZE - METADATA_THREADS
+
+# Job kinds and how many of each may hold a pool thread at once
+JOB_LIMITS = {
+    'metadata': METADATA_THREADS,
+    'download': min(DOWNLOAD_CONCURRENCY, SHARED_THREADS),
+    'audio': min(AUDIO_CONCURRENCY, SHARED_THREADS),
+}
+
+_executor = None
+_semaphores = {}
+
+# Lazily create the shared thread pool (yt-dlp and FFmpeg release the GIL while waiting on I/O)
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="yt-worker")
+        logger.info(f"Started worker pool with {POOL_SIZE} threads ({METADATA_THREADS} for metadata)")
+    return _executor
+
+# Semaphores are bound to the running loop, so create them on first use
+def _get_semaphore(kind):
+    if kind not in JOB_LIMITS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    if kind not in _semaphores:
+        _semaphores[kind] = asyncio.Semaphore(JOB_LIMITS[kind])
+    return _semaphores[kind]
+
+# The threads left over once metadata has its share
+def _get_shared_semaphore(kind):
+    if kind == 'metadata':
+        return contextlib.nullcontext()
+    if None not in _semaphores:
+        _semaphores[None] = asyncio.Semaphore(SHARED_THREADS)
+    return _semaphores[None]
+
+# Run a blocking function in the worker pool under the limit for its job kind
+async def run_job(kind, func, *args, **kwargs):
+    async with _get_semaphore(kind), _get_shared_semaphore(kind):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor(), functools.partial(func, *args, **kwargs))
+
+async def run_metadata_job(func, *args, **kwargs):
+    return await run_job('metadata', func, *args, **kwargs)
+
+async def run_download_job(func, *args, **kwargs):
+    return await run_job('download', func, *args, **kwargs)
+
+async def run_audio_job(func, *args, **kwargs):
+    return await run_job('audio', func, *args, **kwargs)
+
+# Stop the pool when the bot shuts down
+def shutdown_workers(wait=True):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+    _semaphores.clear()
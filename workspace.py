@@ -0,0 +1,274 @@
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+# Files yt-dlp leaves behind while a download is unfinished
+PARTIAL_FILE_REGEX = re.compile(r'(\.part(-Frag\d+)?|\.ytdl|\.temp|\.f\d+\.\w+)$')
+
+# Work directories touched this recently may belong to another process's active download
+ACTIVE_GRACE_SECONDS = 600
+
+VIDEO_ID_REGEX = re.compile(r'^[A-Za-z0-9_-]{11}$')
+
+# Download directory shared by all chats, laid out as <root>/<video_id>/<format_id>/.
+# Every holder downloads into its own work directory below that, so two requests
+# (or two worker processes) fetching the same video never touch each other's files.
+# On release the finished file is moved up into the job directory, where it stays
+# for identical requests until the total size passes max_bytes; then the least
+# recently used job directories are removed.
+# Partial files can optionally live on a separate scratch directory (e.g. tmpfs).
+class DownloadWorkspace:
+    def __init__(self, root, max_bytes, scratch_dir=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.scratch_dir = scratch_dir or None
+        self._pinned = {}
+        self._lock = threading.Lock()
+        os.makedirs(self.root, exist_ok=True)
+        if self.scratch_dir:
+            os.makedirs(self.scratch_dir, exist_ok=True)
+
+    def job_dir(self, video_id, format_id):
+        return os.path.join(self.root, video_id, format_id)
+
+    # Extra yt-dlp options that put intermediate files in the scratch directory
+    def ytdl_options(self):
+        if not self.scratch_dir:
+            return {}
+        return {'paths': {'temp': os.path.abspath(self.scratch_dir)}}
+
+    # Reserve a work directory for one download - its job directory won't be evicted
+    # until released. A resumable job passes a stable `holder` name so that it finds
+    # its partial files again after a restart; otherwise the name is random.
+    def acquire(self, video_id, format_id, holder=None):
+        job_path = self.job_dir(video_id, format_id)
+        path = os.path.join(job_path, holder or uuid.uuid4().hex)
+        os.makedirs(path, exist_ok=True)
+        with self._lock:
+            self._pinned[job_path] = self._pinned.get(job_path, 0) + 1
+        return path
+
+    # Link the finished file of an earlier identical download into a work directory,
+    # returning its path there (None if there is none). Only files ending in `suffix`
+    # count, when given.
+    def link_finished(self, path, suffix=None):
+        job_path = os.path.dirname(path)
+        finished = [name for name in self._finished_files(job_path) if not suffix or name.endswith(suffix)]
+        if not finished:
+            return None
+        source = max(finished, key=os.path.getmtime)
+        target = os.path.join(path, os.path.basename(source))
+        try:
+            os.link(source, target)
+        except FileExistsError:
+            pass
+        except OSError:
+            shutil.copy2(source, target)
+        os.utime(source)  # mark as recently used
+        return target
+
+    # Finish with a work directory. The file worth keeping is moved up into the job
+    # directory (replacing older finished files) and its new path returned; everything
+    # else goes, including this holder's files in the scratch directory. An interrupted
+    # job keeps its partial files so it can be resumed. Then the byte budget is enforced.
+    def release(self, path, keep=None, keep_partial=False):
+        job_path = os.path.dirname(path)
+        kept = None
+        try:
+            if keep and os.path.exists(keep):
+                kept = os.path.join(job_path, os.path.basename(keep))
+                for finished in self._finished_files(job_path):
+                    if finished != kept:
+                        self._remove(finished)
+                os.replace(keep, kept)
+                os.utime(kept)
+
+            for directory in (path, self._scratch_path(path)):
+                if directory is None or not os.path.isdir(directory):
+                    continue
+                if keep_partial:
+                    for name in os.listdir(directory):
+                        if not PARTIAL_FILE_REGEX.search(name):
+                            self._remove(os.path.join(directory, name))
+                else:
+                    self._remove(directory)
+        finally:
+            with self._lock:
+                remaining = self._pinned.get(job_path, 1) - 1
+                if remaining:
+                    self._pinned[job_path] = remaining
+                else:
+                    self._pinned.pop(job_path, None)
+        if not remaining:
+            self._remove_if_empty(job_path)
+            self._remove_if_empty(os.path.dirname(job_path))
+        self.enforce_budget()
+        return kept
+
+    # Evict least recently used job directories until under budget
+    def enforce_budget(self, skip=()):
+        entries = self._job_dirs()
+        total = sum(size for _, size, _ in entries)
+        if total <= self.max_bytes:
+            return
+
+        now = time.time()
+        for path, size, last_used in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            with self._lock:
+                pinned = path in self._pinned
+            if pinned or os.path.normpath(path) in skip:
+                continue
+            if now - last_used < ACTIVE_GRACE_SECONDS and self._has_work_dirs(path):
+                continue
+            logger.info(f"Evicting {path} ({size / (1024 * 1024):.1f} MB) from download cache")
+            self._remove(path)
+            self._remove_if_empty(os.path.dirname(path))
+            total -= size
+
+    # Startup cleanup: drop work directories, partial files and anything that doesn't
+    # fit the <video_id>/<format_id>/ layout (like old per-chat folders), clear the
+    # scratch directory, then enforce the budget. The work directories of the
+    # (video_id, format_id, holder) jobs in `resumable` are kept for the jobs to resume.
+    # So is anything touched in the last ACTIVE_GRACE_SECONDS - during a rolling
+    # deploy the previous process may still be draining its own downloads.
+    def reconcile(self, resumable=()):
+        resumable_dirs = {
+            os.path.normpath(os.path.join(self.job_dir(video_id, format_id), holder))
+            for video_id, format_id, holder in resumable
+        }
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not VIDEO_ID_REGEX.match(name) or not os.path.isdir(path):
+                self._remove(path)
+                removed += 1
+                continue
+            for format_id in os.listdir(path):
+                job_path = os.path.join(path, format_id)
+                if not os.path.isdir(job_path):
+                    self._remove(job_path)
+                    removed += 1
+                    continue
+                for entry in os.listdir(job_path):
+                    entry_path = os.path.join(job_path, entry)
+                    if os.path.normpath(entry_path) in resumable_dirs or self._recently_used(entry_path, now):
+                        continue
+                    if os.path.isdir(entry_path) or PARTIAL_FILE_REGEX.search(entry):
+                        self._remove(entry_path)
+                        removed += 1
+                self._remove_if_empty(job_path)
+            self._remove_if_empty(path)
+
+        if self.scratch_dir:
+            removed += self._clear_scratch(resumable_dirs, now)
+
+        logger.info(
+            f"Download workspace reconciled, removed {removed} orphaned entries, "
+            f"kept {len(resumable_dirs)} resumable jobs"
+        )
+        self.enforce_budget(skip={os.path.dirname(path) for path in resumable_dirs})
+
+    # Where yt-dlp puts a work directory's intermediate files - it mirrors the
+    # output path under the scratch directory
+    def _scratch_path(self, path):
+        if not self.scratch_dir or os.path.isabs(path):
+            return None
+        return os.path.join(os.path.abspath(self.scratch_dir), path)
+
+    # Empty the scratch directory, except for the files of resumable jobs and
+    # files that may still be in use
+    def _clear_scratch(self, resumable_dirs, now):
+        removed = 0
+        for dirpath, dirnames, filenames in os.walk(self.scratch_dir, topdown=False):
+            relative = os.path.normpath(os.path.relpath(dirpath, self.scratch_dir))
+            if relative in resumable_dirs:
+                continue
+            for file_name in filenames:
+                path = os.path.join(dirpath, file_name)
+                if self._recently_used(path, now):
+                    continue
+                self._remove(path)
+                removed += 1
+            if dirpath != self.scratch_dir:
+                self._remove_if_empty(dirpath)
+        return removed
+
+    # (path, size in bytes, last used) for every job directory
+    def _job_dirs(self):
+        entries = []
+        for video_id in os.listdir(self.root):
+            video_path = os.path.join(self.root, video_id)
+            if not os.path.isdir(video_path):
+                continue
+            for format_id in os.listdir(video_path):
+                path = os.path.join(video_path, format_id)
+                size = 0
+                last_used = 0.0
+                for dirpath, _, filenames in os.walk(path):
+                    for file_name in filenames:
+                        try:
+                            stat = os.stat(os.path.join(dirpath, file_name))
+                        except FileNotFoundError:
+                            continue
+                        size += stat.st_size
+                        last_used = max(last_used, stat.st_mtime)
+                entries.append((path, size, last_used))
+        return entries
+
+    # Finished downloads sit directly in the job directory, work directories below it
+    @staticmethod
+    def _finished_files(job_path):
+        try:
+            names = os.listdir(job_path)
+        except FileNotFoundError:
+            return []
+        return [
+            os.path.join(job_path, name) for name in names
+            if os.path.isfile(os.path.join(job_path, name)) and not PARTIAL_FILE_REGEX.search(name)
+        ]
+
+    # Whether a file, or anything in a directory, changed in the last ACTIVE_GRACE_SECONDS
+    @staticmethod
+    def _recently_used(path, now):
+        try:
+            paths = [path]
+            if os.path.isdir(path):
+                paths += [os.path.join(dirpath, name) for dirpath, _, names in os.walk(path) for name in names]
+            return any(now - os.path.getmtime(item) < ACTIVE_GRACE_SECONDS for item in paths if os.path.exists(item))
+        except OSError:
+            return False
+
+    @staticmethod
+    def _has_work_dirs(path):
+        try:
+            return any(os.path.isdir(os.path.join(path, name)) for name in os.listdir(path))
+        except FileNotFoundError:
+            return False
+
+    @staticmethod
+    def _remove(path):
+        try:
+            if os.path.isdir(path) and not os.path.islink(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Error removing {path}: {e}")
+
+    @staticmethod
+    def _remove_if_empty(path):
+        try:
+            os.rmdir(path)
+        except OSError:
+            pass